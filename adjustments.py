@@ -0,0 +1,180 @@
+"""Non-destructive per-layer adjustments
+
+A layer holds a stack of Adjustment nodes that are applied to its pixels whenever they are
+shown or exported; the source image is never modified. Node parameters are integers in the
+units of the sliders that edit them. Distances (blur and sharpen radii) are in pixels of the
+full-resolution image and are scaled down when the stack is evaluated on a reduced image,
+so a preview looks like the export at the size it is shown. The pixel work is in filters.py,
+imported where a stack is first evaluated.
+"""
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QGroupBox, QComboBox, QPushButton, QSlider, QLabel
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QPoint, QRect, QSize, Qt, Signal
+import math
+import threading
+
+def blurHalo(scale: float, radius: int, **_) -> int:
+    """Pixels around a tile that its blurred result depends on"""
+    sigma = radius * scale / 2
+    return 0 if sigma < 0.3 else max(1, math.ceil(3 * sigma))
+
+# kind -> (label, [(parameter, label, minimum, maximum, default)], halo function or None)
+ADJUSTMENTS = {
+    "brightness_contrast": ("Brightness/Contrast", [("brightness", "Brightness", -100, 100, 0), ("contrast", "Contrast", -100, 100, 0)], None),
+    "levels": ("Levels", [("black", "Black", 0, 254, 0), ("white", "White", 1, 255, 255), ("gamma", "Gamma %", 10, 400, 100)], None),
+    "hue_saturation": ("Hue/Saturation", [("hue", "Hue", -180, 180, 0), ("saturation", "Saturation", -100, 100, 0), ("lightness", "Lightness", -100, 100, 0)], None),
+    "gaussian_blur": ("Gaussian Blur", [("radius", "Radius", 0, 100, 4)], blurHalo),
+    "sharpen": ("Sharpen", [("amount", "Amount %", 0, 300, 100), ("radius", "Radius", 1, 20, 2)], blurHalo),
+}
+
+class Adjustment():
+    """One node of a layer's adjustment stack"""
+    def __init__(self, kind: str, params: dict | None = None):
+        self.kind = kind
+        self.params = {name: default for name, _, _, _, default in ADJUSTMENTS[kind][1]}
+        if params:
+            self.params.update(params)
+
+    def signature(self) -> tuple:
+        """Identifies the node's output given the same input, for memoization"""
+        return (self.kind,) + tuple(sorted(self.params.items()))
+
+    def copy(self) -> "Adjustment":
+        return Adjustment(self.kind, self.params)
+
+    def halo(self, scale: float) -> int:
+        halo_function = ADJUSTMENTS[self.kind][2]
+        return halo_function(scale, **self.params) if halo_function is not None else 0
+
+def readAdjustedRegion(read, rect: QRect, size: QSize, image_size: QSize, adjustments: list[Adjustment]) -> QImage:
+    """Adjusted pixels of rect resampled to size, where read(rect, size) gives unadjusted ones
+
+    Reads a margin around rect as wide as the adjustments' halo, so that neighbouring
+    regions (tiles) line up without seams.
+    """
+    scale = size.width() / rect.width()
+    halo = sum(adjustment.halo(scale) for adjustment in adjustments)
+    margin = math.ceil(halo / scale)
+    expanded = rect.adjusted(-margin, -margin, margin, margin).intersected(QRect(QPoint(0, 0), image_size))
+    scale_x, scale_y = size.width() / rect.width(), size.height() / rect.height()
+    expanded_size = QSize(max(1, round(expanded.width() * scale_x)), max(1, round(expanded.height() * scale_y)))
+    from filters import applyAdjustments
+    adjusted = applyAdjustments(read(expanded, expanded_size), adjustments, scale)
+    offset_x, offset_y = round((rect.x() - expanded.x()) * scale_x), round((rect.y() - expanded.y()) * scale_y)
+    return adjusted.copy(offset_x, offset_y, size.width(), size.height())
+
+class AdjustmentPipeline():
+    """Memoized evaluation of an adjustment stack, per input image
+
+    The output of every node is kept, keyed by the signatures of the nodes up to it, so
+    changing a node re-evaluates only from that node on. Evaluations can run on pool
+    threads; they take turns, and clear() leaves one that is running to finish on its own.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: dict[tuple, list[tuple]] = {}  # input key -> [(signatures so far, NumPy pixels)]
+        self.outputs: dict[tuple, tuple[tuple, QImage]] = {}  # input key -> (all signatures, adjusted image)
+
+    def evaluate(self, key: tuple, image: QImage, adjustments: list[Adjustment], scale: float) -> QImage:
+        signatures = tuple(adjustment.signature() for adjustment in adjustments)
+        with self.lock:
+            stages_by_key, outputs = self.stages, self.outputs
+            output = outputs.get(key)
+            if output is not None and output[0] == signatures:
+                return output[1]
+            from filters import applyNode, arrayToImage, imageToArray
+            stages = stages_by_key.setdefault(key, [])
+            # Keep the longest prefix of stages whose nodes are unchanged
+            reused = 0
+            while reused < len(stages) and reused < len(signatures) and stages[reused][0] == signatures[:reused + 1]:
+                reused += 1
+            del stages[reused:]
+            pixels = stages[-1][1] if stages else imageToArray(image)
+            for index in range(reused, len(adjustments)):
+                pixels = applyNode(adjustments[index], pixels, scale)
+                stages.append((signatures[:index + 1], pixels))
+            result = arrayToImage(pixels)
+            outputs[key] = (signatures, result)
+            return result
+
+    def memoryUsage(self) -> int:
+        # Copied first, since an evaluation on a pool thread may be adding to them
+        usage = sum(pixels.nbytes for stages in list(self.stages.values()) for _, pixels in list(stages))
+        return usage + sum(image.sizeInBytes() for _, image in list(self.outputs.values()))
+
+    def clear(self):
+        self.stages, self.outputs = {}, {}
+
+class AdjustmentsWindow(QWidget):
+    """Adjustment stack of the selected layer, with a slider per parameter"""
+    adjustmentAdded = Signal(str)
+    adjustmentRemoved = Signal(int)
+    paramChanged = Signal(int, str, int, bool)  # Node index, parameter, value, whether the edit is finished
+    paramCommitted = Signal()  # A parameter slider was released
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Adjustments")
+        self.layout: QVBoxLayout = QVBoxLayout()
+        self.setLayout(self.layout)
+
+        add_row = QHBoxLayout()
+        self.kindBox = QComboBox()
+        for kind, (label, _, _) in ADJUSTMENTS.items():
+            self.kindBox.addItem(label, kind)
+        add_row.addWidget(self.kindBox, 1)
+        self.addButton = QPushButton("Add")
+        self.addButton.clicked.connect(lambda: self.adjustmentAdded.emit(self.kindBox.currentData()))
+        add_row.addWidget(self.addButton)
+        self.layout.addLayout(add_row)
+
+        self.nodesLayout = QVBoxLayout()
+        self.layout.addLayout(self.nodesLayout)
+        self.layout.addStretch(1)
+        self.emptyLabel = QLabel("Select a layer to adjust it")
+        self.nodesLayout.addWidget(self.emptyLabel)
+        self.shownStack = None  # (layer, kinds) the node widgets were built for
+        self.sliders: list[dict[str, QSlider]] = []
+        self.showLayer(None)
+
+    def showLayer(self, layer):
+        """Show the stack of layer (None for no selection); rebuilt only when its nodes change"""
+        self.addButton.setEnabled(layer is not None)
+        stack = (layer, tuple(adjustment.kind for adjustment in layer.adjustments)) if layer is not None else None
+        if stack != self.shownStack or layer is None:
+            self.shownStack = stack
+            self.buildNodes(layer)
+            return
+        for sliders, adjustment in zip(self.sliders, layer.adjustments):
+            for name, slider in sliders.items():
+                if not slider.isSliderDown():
+                    slider.blockSignals(True)
+                    slider.setValue(adjustment.params[name])
+                    slider.blockSignals(False)
+
+    def buildNodes(self, layer):
+        while self.nodesLayout.count() > 1:
+            self.nodesLayout.takeAt(1).widget().deleteLater()
+        self.sliders = []
+        self.emptyLabel.setVisible(layer is None or not layer.adjustments)
+        if layer is None:
+            return
+        for index, adjustment in enumerate(layer.adjustments):
+            label, params, _ = ADJUSTMENTS[adjustment.kind]
+            box = QGroupBox(label)
+            form = QFormLayout(box)
+            sliders = {}
+            for name, param_label, minimum, maximum, _ in params:
+                slider = QSlider(Qt.Orientation.Horizontal)
+                slider.setRange(minimum, maximum)
+                slider.setValue(adjustment.params[name])
+                slider.valueChanged.connect(lambda value, index=index, name=name, slider=slider:
+                                            self.paramChanged.emit(index, name, value, not slider.isSliderDown()))
+                slider.sliderReleased.connect(self.paramCommitted)
+                form.addRow(param_label, slider)
+                sliders[name] = slider
+            remove_button = QPushButton("Remove")
+            remove_button.clicked.connect(lambda checked=False, index=index: self.adjustmentRemoved.emit(index))
+            form.addRow(remove_button)
+            self.nodesLayout.addWidget(box)
+            self.sliders.append(sliders)
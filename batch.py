@@ -0,0 +1,97 @@
+"""Headless batch renderer: composites layer jobs to PNG files on a process pool.
+
+Usage: python batch.py jobs.json [--workers N] [--compress-level L]
+
+The job file holds a list of jobs (or {"jobs": [...]}), each one like:
+
+    {"output": "out.png",
+     "layers": [{"path": "a.jpg", "x": 0, "y": 0, "scale_x": 1.0, "scale_y": 1.0,
+                 "opacity": 1.0, "blend_mode": "normal", "visible": true}]}
+
+blend_mode is one of normal, multiply, screen, overlay, add and difference.
+Relative paths are resolved against the directory of the job file. Layers are listed
+bottom to top, like Composition.layers.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+app = None  # Per-process QGuiApplication, created by initWorker
+
+def initWorker():
+    """Set up a display-less Qt in each worker process"""
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PySide6.QtGui import QGuiApplication
+    global app
+    app = QGuiApplication.instance() or QGuiApplication([])
+
+def renderJob(job: dict, base_dir: str, compress_level: int):
+    """Render one job; returns (output path, seconds, megapixels, error message)"""
+    from PySide6.QtGui import QImage
+    from compositor import RenderLayer, TiledCompositor
+
+    start = time.perf_counter()
+    output = "(job without output)"  # Reported instead when the job names no output
+    try:
+        if "output" not in job:
+            raise ValueError("job has no output")
+        output = os.path.join(base_dir, job["output"])
+        render_layers = []
+        for spec in job["layers"]:
+            if not spec.get("visible", True):
+                continue
+            path = os.path.join(base_dir, spec["path"])
+            image = QImage(path)
+            if image.isNull():
+                raise ValueError(f"cannot decode {path}")
+            render_layers.append(RenderLayer.fromImage(
+                image, spec.get("x", 0), spec.get("y", 0),
+                spec.get("scale_x", 1.0), spec.get("scale_y", 1.0), spec.get("opacity", 1.0),
+                spec.get("blend_mode", "normal")))
+        if not render_layers:
+            raise ValueError("job has no visible layers")
+        # Each process renders one job at a time, so parallelism comes from the pool
+        compositor = TiledCompositor(render_layers, workers=1)
+        compositor.exportPNG(output, compress_level)
+        megapixels = compositor.rect.width() * compositor.rect.height() / 1e6
+        return output, time.perf_counter() - start, megapixels, ""
+    except Exception as e:
+        return output, time.perf_counter() - start, 0.0, str(e)
+
+def loadJobs(path: str) -> list[dict]:
+    with open(path) as f:
+        data = json.load(f)
+    return data["jobs"] if isinstance(data, dict) else data
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render photo editor layer jobs without a GUI.")
+    parser.add_argument("jobfile", help="JSON file describing the jobs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--compress-level", type=int, default=6, help="PNG zlib level (0-9)")
+    args = parser.parse_args(argv)
+
+    jobs = loadJobs(args.jobfile)
+    base_dir = os.path.dirname(os.path.abspath(args.jobfile))
+    failures = 0
+    total_megapixels = 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=initWorker) as executor:
+        futures = [executor.submit(renderJob, job, base_dir, args.compress_level) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            output, seconds, megapixels, error = future.result()
+            total_megapixels += megapixels
+            if error:
+                failures += 1
+                print(f"[{done}/{len(jobs)}] FAILED {output}: {error}", file=sys.stderr)
+            else:
+                print(f"[{done}/{len(jobs)}] {output} {seconds:.3f}s {megapixels:.1f}MP")
+    elapsed = time.perf_counter() - start
+    print(f"{len(jobs)} jobs ({failures} failed) in {elapsed:.2f}s: "
+          f"{len(jobs) / elapsed:.2f} jobs/s, {total_megapixels / elapsed:.1f} MP/s")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Headless benchmarks for the editor's hot paths.
+
+Usage: python benchmark.py [--layers N] [--width W] [--height H] [--moves M]
+                           [--repeat R] [--cases render,drag,...] [--output results.json]
+
+The "encode" case is not run by default: it exports the canvas once per ENCODE_SETTINGS entry
+and reports the time and file size of each, to compare encoder speed against size.
+
+Runs on the offscreen Qt platform with synthetic images, so results are reproducible on
+machines without a display. Each case is timed --repeat times; the JSON report holds every
+sample plus min/median, and the configuration and revision it was measured on.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6 import __version__ as pyside_version
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QImage, QPainter, QColor, QMouseEvent
+from PySide6.QtCore import Qt, QEvent, QPointF, QEventLoop
+
+from composition import Composition
+from layers import Layer
+from compositor import RenderLayer, TiledCompositor
+from importer import ImageImporter
+from exporter import FORMATS, ExportSettings, exportCanvas
+
+CASES = ["render", "drag", "scale", "pick", "import", "export", "encode"]
+DEFAULT_CASES = ["render", "drag", "scale", "pick", "import", "export"]
+
+# From fastest to smallest within each format
+ENCODE_SETTINGS = [
+    ExportSettings("PNG", compress_level=1),
+    ExportSettings("PNG", compress_level=6),
+    ExportSettings("PNG", compress_level=9),
+    ExportSettings("TIFF", compress_level=0),
+    ExportSettings("TIFF", compress_level=1),
+    ExportSettings("TIFF", compress_level=6),
+    ExportSettings("JPEG", quality=75, effort=0),
+    ExportSettings("JPEG", quality=90, effort=0),
+    ExportSettings("JPEG", quality=90, effort=4),
+    ExportSettings("WebP", quality=75, effort=0),
+    ExportSettings("WebP", quality=75, effort=4),
+    ExportSettings("WebP", quality=90, effort=6),
+]
+
+def makeImage(width: int, height: int, seed: int) -> QImage:
+    """Deterministic test image: a translucent ellipse over a transparent background"""
+    rng = random.Random(seed)
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setBrush(QColor.fromHsv(rng.randrange(360), 200, 220, 230))
+    painter.drawEllipse(0, 0, width, height)
+    painter.end()
+    return image
+
+def sendMouse(view, kind: QEvent.Type, scene_pos: QPointF):
+    """Deliver a synthetic left-button mouse event to a PreviewWindow"""
+    pos = QPointF(view.mapFromScene(scene_pos))
+    button = Qt.MouseButton.NoButton if kind == QEvent.Type.MouseMove else Qt.MouseButton.LeftButton
+    buttons = Qt.MouseButton.NoButton if kind == QEvent.Type.MouseButtonRelease else Qt.MouseButton.LeftButton
+    event = QMouseEvent(kind, pos, pos, button, buttons, Qt.KeyboardModifier.NoModifier)
+    if kind == QEvent.Type.MouseButtonPress:
+        view.mousePressEvent(event)
+    elif kind == QEvent.Type.MouseMove:
+        view.mouseMoveEvent(event)
+    else:
+        view.mouseReleaseEvent(event)
+
+class Benchmark():
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(args.layers):
+            path = os.path.join(self.tempdir.name, f"layer{i}.png")
+            makeImage(args.width, args.height, args.seed + i).save(path)
+            self.paths.append(path)
+
+    def buildComposition(self) -> Composition:
+        composition = Composition()
+        composition.previewWindow.resize(1280, 800)
+        composition.previewWindow.show()
+        spread = self.args.width * 4
+        for path in self.paths:
+            layer = Layer(path)
+            layer.setPosition(self.rng.randrange(spread), self.rng.randrange(spread))
+            composition.addLayer(layer)
+        composition.scheduler.flush()
+        composition.previewWindow.fitToWindow()
+        return composition
+
+    def selectTopLayer(self, composition: Composition) -> Layer:
+        layer = composition.layers[-1]
+        composition.selectLayer(layer, False)
+        composition.scheduler.flush()
+        return layer
+
+    def caseRender(self, composition: Composition):
+        view = composition.previewWindow
+        start = time.perf_counter()
+        view.render(composition.layers)
+        view.viewport().repaint()
+        return time.perf_counter() - start
+
+    def caseDrag(self, composition: Composition):
+        view = composition.previewWindow
+        layer = self.selectTopLayer(composition)
+        origin = layer.boundingRect().center()
+        start = time.perf_counter()
+        sendMouse(view, QEvent.Type.MouseButtonPress, origin)
+        for i in range(self.args.moves):
+            sendMouse(view, QEvent.Type.MouseMove, origin + QPointF(i * 3, i * 2))
+            view.viewport().repaint()
+        sendMouse(view, QEvent.Type.MouseButtonRelease, origin + QPointF(self.args.moves * 3, self.args.moves * 2))
+        composition.scheduler.flush()
+        return time.perf_counter() - start
+
+    def caseScale(self, composition: Composition):
+        view = composition.previewWindow
+        self.selectTopLayer(composition)
+        corner = view.getSelectedLayersBounds().bottomRight()
+        start = time.perf_counter()
+        sendMouse(view, QEvent.Type.MouseButtonPress, corner)
+        for i in range(self.args.moves):
+            sendMouse(view, QEvent.Type.MouseMove, corner - QPointF(i * 4, i * 3))
+            view.viewport().repaint()
+        sendMouse(view, QEvent.Type.MouseButtonRelease, corner - QPointF(self.args.moves * 4, self.args.moves * 3))
+        composition.scheduler.flush()
+        return time.perf_counter() - start
+
+    def casePick(self, composition: Composition):
+        view = composition.previewWindow
+        scene_rect = view.scene.sceneRect()
+        points = [QPointF(scene_rect.left() + self.rng.random() * scene_rect.width(),
+                          scene_rect.top() + self.rng.random() * scene_rect.height()) for _ in range(1000)]
+        start = time.perf_counter()
+        for point in points:
+            view.layerAt(point)
+        return (time.perf_counter() - start) / len(points)
+
+    def caseImport(self, composition: Composition):
+        loop = QEventLoop()
+        importer = ImageImporter(self.paths)
+        imported = []
+        importer.layerCreated.connect(imported.append)
+        importer.finished.connect(loop.quit)
+        start = time.perf_counter()
+        importer.start()
+        if importer.pending:
+            loop.exec()
+        elapsed = time.perf_counter() - start
+        # The memory budget tracks every layer; keep the imported ones from evicting the composition's
+        for layer in imported:
+            layer.release()
+        return elapsed
+
+    def caseExport(self, composition: Composition):
+        render_layers = [RenderLayer.fromLayer(layer) for layer in composition.layers if layer.visible]
+        path = os.path.join(self.tempdir.name, "export.png")
+        start = time.perf_counter()
+        TiledCompositor(render_layers).exportPNG(path)
+        return time.perf_counter() - start
+
+    def runEncode(self, composition: Composition) -> dict:
+        """Time and file size of exporting the canvas with each of ENCODE_SETTINGS
+
+        Every sample includes compositing, which is the same for all settings.
+        """
+        render_layers = [RenderLayer.fromLayer(layer) for layer in composition.layers if layer.visible]
+        compositor = TiledCompositor(render_layers)
+        results = {}
+        for settings in ENCODE_SETTINGS:
+            path = os.path.join(self.tempdir.name, "encode" + FORMATS[settings.format][1])
+            samples = []
+            for _ in range(self.args.repeat):
+                start = time.perf_counter()
+                exportCanvas(compositor, path, settings)
+                samples.append(time.perf_counter() - start)
+            name = settings.describe()
+            results[name] = {
+                "samples": samples,
+                "min": min(samples),
+                "median": statistics.median(samples),
+                "bytes": os.path.getsize(path),
+            }
+            print(f"{name:>32}: median {results[name]['median'] * 1000:.2f} ms, {results[name]['bytes'] / 2**20:.2f} MB", file=sys.stderr)
+        return results
+
+    def run(self, cases: list[str]) -> dict:
+        results = {}
+        composition = self.buildComposition()
+        for case in cases:
+            if case == "encode":
+                results[case] = self.runEncode(composition)
+                continue
+            method = getattr(self, "case" + case.capitalize())
+            method(composition)  # Warm-up run, not recorded
+            samples = [method(composition) for _ in range(self.args.repeat)]
+            results[case] = {
+                "samples": samples,
+                "min": min(samples),
+                "median": statistics.median(samples),
+            }
+            print(f"{case:>8}: median {results[case]['median'] * 1000:.2f} ms, min {results[case]['min'] * 1000:.2f} ms", file=sys.stderr)
+        return results
+
+def gitRevision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the photo editor's hot paths headlessly.")
+    parser.add_argument("--layers", type=int, default=50)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=768)
+    parser.add_argument("--moves", type=int, default=50, help="mouse moves per drag/scale gesture")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", default=",".join(DEFAULT_CASES), help="comma-separated subset of " + ", ".join(CASES))
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error("unknown cases: " + ", ".join(sorted(unknown)))
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    benchmark = Benchmark(args)
+    report = {
+        "revision": gitRevision(),
+        "timestamp": time.time(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "pyside": pyside_version,
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": benchmark.run(cases),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
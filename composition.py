@@ -1,25 +1,61 @@
-from PySide6.QtWidgets import QFileDialog, QGraphicsScene, QGraphicsPixmapItem
-from PySide6.QtGui import QPixmap, QPainter, QPainter
+from PySide6.QtWidgets import QDialog, QFileDialog, QProgressDialog, QMessageBox
+from PySide6.QtGui import QPixmap
 from PySide6.QtCore import Qt
+import os
 
 from preview import PreviewWindow
 from layers import Layer, LayersWindow
+from importer import ImageImporter
+from compositor import RenderLayer, TiledCompositor
+from exporter import FORMATS, ExportSettings, ExportSettingsDialog, Exporter, formatForPath
+from scheduler import Dirty, UpdateScheduler
+from memory import memoryBudget
+from project import ProjectFile
+from adjustments import Adjustment, AdjustmentsWindow
+from history import AdjustmentsCommand, AppearanceCommand, History, LayersCommand, SelectionCommand, TransformCommand
+
+THUMBNAIL_SIZE = 64
 
 class Composition():
     def __init__(self):
         self.layers = []
         self.selectedLayers = []  # Changed to list for multiple selection
+        self.project: ProjectFile | None = None  # Project file the composition was last opened from or saved to
+        self.hibernated = False  # Inactive tab: no scene items or display pixmaps, pixels only in mapped files
+        self.thumbnail: QPixmap | None = None  # What the view showed when it was hibernated
         self.previewWindow = PreviewWindow()
         self.layersWindow = LayersWindow()
+        self.adjustmentsWindow = AdjustmentsWindow()
+        # flushUpdates is looked up on every flush so the profiler can wrap it
+        self.scheduler = UpdateScheduler(lambda dirty, layers: self.flushUpdates(dirty, layers), parent=self.previewWindow)
+        self.history = History(self, parent=self.previewWindow)
+        self.appearanceBefore: list[tuple[Layer, tuple]] | None = None  # Selected layers' (opacity, blend mode) as an edit started
+        self.adjustmentsBefore: tuple[Layer, list[Adjustment]] | None = None  # Adjusted layer and its stack as a slider drag started
+        self.exportSettings: dict[str, ExportSettings] = {}  # Last settings used per format
         
         # Connect layer selection signal
         self.previewWindow.layerClicked.connect(self.selectLayer)
+        self.layersWindow.layerClicked.connect(self.selectLayer)
+        memoryBudget.addView(self.previewWindow)
 
         # Connect layer transformed signal
-        self.previewWindow.layerTransformed.connect(self.update)
+        self.previewWindow.layerTransformed.connect(self.onLayersTransformed)
+        self.previewWindow.transformCommitted.connect(lambda changes: self.history.push(TransformCommand(changes)))
+
+        # Opacity and blend mode edits from the layers panel
+        self.layersWindow.opacityChanged.connect(self.setSelectedOpacity)
+        self.layersWindow.opacityCommitted.connect(self.commitAppearance)
+        self.layersWindow.blendModeChanged.connect(self.setSelectedBlendMode)
+
+        # Adjustment edits apply to the first selected layer, the one the panel shows
+        self.adjustmentsWindow.adjustmentAdded.connect(self.addAdjustment)
+        self.adjustmentsWindow.adjustmentRemoved.connect(self.removeAdjustment)
+        self.adjustmentsWindow.paramChanged.connect(self.setAdjustmentParam)
+        self.adjustmentsWindow.paramCommitted.connect(self.commitAdjustments)
 
     def selectLayer(self, layer: Layer, ctrl_pressed: bool):
         """Select a layer, with Ctrl+click for multiple selection"""
+        before = list(self.selectedLayers)
         if ctrl_pressed:
             # Ctrl+click: toggle selection of the clicked layer
             if layer.selected:
@@ -43,53 +79,291 @@ class Composition():
             if layer is not None:
                 layer.setSelected(True)
                 self.selectedLayers.append(layer)
-        
-        self.update()
+        # Each setSelected call marked its layer dirty; they are flushed together
+        if self.selectedLayers != before:
+            self.history.push(SelectionCommand(before, list(self.selectedLayers)))
+
+    def setSelection(self, layers: list[Layer]):
+        """Select exactly the given layers, in the given order"""
+        selected = set(layers)
+        for layer in self.layers:
+            layer.setSelected(layer in selected)
+        self.selectedLayers = [layer for layer in layers if layer in self.layers]
 
     def update(self):
-        self.previewWindow.render(self.layers)
-        self.layersWindow.update(self.layers)
+        """Schedule a full refresh of the preview and layers panel"""
+        self.scheduler.markDirty(Dirty.ALL)
+
+    def onLayersTransformed(self):
+        self.scheduler.markDirty(Dirty.TRANSFORM, self.selectedLayers)
+
+    def flushUpdates(self, dirty: Dirty, layers: set[Layer]):
+        """Hand each subsystem only the parts that changed since the last flush"""
+        if self.hibernated:
+            return  # wake() refreshes everything
+        if dirty & Dirty.LAYERS:
+            self.previewWindow.render(self.layers)
+            self.layersWindow.update(self.layers)
+            self.layersWindow.showLayerSettings(self.selectedLayers)
+            self.adjustmentsWindow.showLayer(self.adjustedLayer())
+            return
+        self.previewWindow.render(self.layers, layers)
+        if dirty & (Dirty.SELECTION | Dirty.VISIBILITY | Dirty.CONTENT):
+            self.layersWindow.refreshLayers(layers)  # Content changes the row's thumbnail
+        if dirty & (Dirty.SELECTION | Dirty.APPEARANCE):
+            self.layersWindow.showLayerSettings(self.selectedLayers)
+        if dirty & (Dirty.SELECTION | Dirty.CONTENT):
+            self.adjustmentsWindow.showLayer(self.adjustedLayer())
+
+    def setSelectedOpacity(self, opacity: float, finished: bool):
+        """Apply an opacity to the selected layers; slider drags become one undo step when released"""
+        if self.appearanceBefore is None:
+            self.appearanceBefore = [(layer, (layer.opacity, layer.blendMode)) for layer in self.selectedLayers]
+        for layer in self.selectedLayers:
+            layer.setOpacity(opacity)
+        if finished:
+            self.commitAppearance()
+
+    def setSelectedBlendMode(self, mode: str):
+        self.appearanceBefore = [(layer, (layer.opacity, layer.blendMode)) for layer in self.selectedLayers]
+        for layer in self.selectedLayers:
+            layer.setBlendMode(mode)
+        self.commitAppearance()
+
+    def commitAppearance(self):
+        if self.appearanceBefore is None:
+            return
+        changes = [(layer, before, (layer.opacity, layer.blendMode)) for layer, before in self.appearanceBefore
+                   if before != (layer.opacity, layer.blendMode)]
+        self.appearanceBefore = None
+        if changes:
+            self.history.push(AppearanceCommand(changes))
+
+    def adjustedLayer(self) -> Layer | None:
+        return self.selectedLayers[0] if self.selectedLayers else None
+
+    def editAdjustments(self, edit):
+        """Apply edit(layer) to the adjusted layer's stack as one undo step"""
+        layer = self.adjustedLayer()
+        if layer is None:
+            return
+        before = [adjustment.copy() for adjustment in layer.adjustments]
+        edit(layer)
+        self.history.push(AdjustmentsCommand(layer, before, [adjustment.copy() for adjustment in layer.adjustments]))
+
+    def addAdjustment(self, kind: str):
+        self.editAdjustments(lambda layer: layer.setAdjustments(layer.adjustments + [Adjustment(kind)]))
+
+    def removeAdjustment(self, index: int):
+        self.editAdjustments(lambda layer: layer.setAdjustments(layer.adjustments[:index] + layer.adjustments[index + 1:]))
+
+    def setAdjustmentParam(self, index: int, name: str, value: int, finished: bool):
+        """Slider edits are shown live at reduced resolution and become one undo step when released"""
+        layer = self.adjustedLayer()
+        if layer is None:
+            return
+        if self.adjustmentsBefore is None:
+            self.adjustmentsBefore = (layer, [adjustment.copy() for adjustment in layer.adjustments])
+        layer.setAdjustmentParam(index, name, value, live=not finished)
+        if finished:
+            self.commitAdjustments()
+
+    def commitAdjustments(self):
+        if self.adjustmentsBefore is None:
+            return
+        layer, before = self.adjustmentsBefore
+        self.adjustmentsBefore = None
+        if layer.adjustmentsLive:
+            layer.setAdjustments(layer.adjustments)  # Evaluate at full preview resolution again
+        after = [adjustment.copy() for adjustment in layer.adjustments]
+        if [adjustment.signature() for adjustment in before] != [adjustment.signature() for adjustment in after]:
+            self.history.push(AdjustmentsCommand(layer, before, after))
+
+    def title(self) -> str:
+        return os.path.basename(self.project.path) if self.project is not None else "Untitled"
+
+    def hibernate(self):
+        """Release the view's items and all decoded pixels while the composition is not shown
+
+        Layers keep their metadata, and their pixels stay in mapped spill or project files
+        (or are re-read from their source files), so waking up needs no decoding.
+        """
+        if self.hibernated:
+            return
+        self.scheduler.flush()
+        self.thumbnail = self.previewWindow.thumbnail(THUMBNAIL_SIZE)
+        self.hibernated = True
+        self.previewWindow.releaseScene()
+        memoryBudget.removeView(self.previewWindow)
+        for layer in self.layers:
+            layer.evictImage(spill=True)
+            memoryBudget.update(layer)
+
+    def wake(self):
+        if not self.hibernated:
+            return
+        self.hibernated = False
+        self.thumbnail = None
+        memoryBudget.addView(self.previewWindow)
+        self.update()
+        self.scheduler.flush()
+
+    def close(self):
+        """Release everything the composition holds; it cannot be used afterwards"""
+        self.history.clear()
+        for layer in list(self.layers):
+            self.removeLayer(layer)
+        memoryBudget.removeView(self.previewWindow)
+        for widget in (self.previewWindow, self.layersWindow, self.adjustmentsWindow):
+            widget.deleteLater()
 
     def importImage(self):
         file_dialog = QFileDialog()
         file_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
         file_dialog.setNameFilter("Image Files (*.png *.jpg *.jpeg)")
         if file_dialog.exec():
-            for selectedFile in file_dialog.selectedFiles():
-                layer = Layer(selectedFile)
-                self.layers.append(layer)
-                layer.visibilityChanged.connect(self.update)
-                layer.selectionChanged.connect(self.update)
-        self.update()
+            self.importFiles(file_dialog.selectedFiles())
+
+    def importFiles(self, paths: list[str]):
+        """Add the files as layers right away and decode them in the background"""
+        importer = ImageImporter(paths, self.previewWindow)
+        progress = QProgressDialog("Importing images...", "Cancel", 0, len(paths), self.previewWindow)
+        progress.setWindowModality(Qt.WindowModality.NonModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(importer.cancel)
+        importer.progress.connect(lambda done, total: progress.setValue(done))
+        imported = []
+        importer.layerCreated.connect(self.addLayer)
+        importer.layerCreated.connect(imported.append)
+        # A placeholder deleted while loading is filled in all the same, in case it is undeleted
+        importer.layerLoaded.connect(lambda layer: self.scheduler.markDirty(Dirty.CONTENT, (layer,)) if layer in self.layers else None)
+        importer.layerDiscarded.connect(self.removeLayer)
+        importer.finished.connect(progress.reset)
+        importer.finished.connect(lambda: self.recordLayersAdded(imported))
+        importer.finished.connect(importer.deleteLater)
+        importer.start()
+
+    def recordLayersAdded(self, layers: list[Layer]):
+        """Make the layers of a finished import one undoable step"""
+        entries = [(self.layers.index(layer), layer) for layer in layers if layer in self.layers]
+        if entries:
+            self.history.push(LayersCommand(entries, added=True))
+
+    def addLayer(self, layer: Layer):
+        self.insertLayer(len(self.layers), layer)
+
+    def insertLayer(self, index: int, layer: Layer):
+        self.layers.insert(index, layer)
+        if layer.selected:
+            self.selectedLayers.append(layer)
+        layer.visibilityChanged.connect(self.scheduler.onVisibilityChanged)
+        layer.visibilityChanged.connect(self.history.onVisibilityChanged)
+        layer.selectionChanged.connect(self.scheduler.onSelectionChanged)
+        layer.appearanceChanged.connect(self.scheduler.onAppearanceChanged)
+        layer.adjustmentsChanged.connect(self.scheduler.onContentChanged)
+        layer.pixmapReady.connect(self.scheduler.onContentChanged)
+        self.scheduler.markDirty(Dirty.LAYERS)
+
+    def detachLayer(self, layer: Layer):
+        """Take a layer out of the composition but keep it usable, e.g. for undo"""
+        if layer in self.selectedLayers:
+            self.selectedLayers.remove(layer)
+        self.layers.remove(layer)
+        layer.visibilityChanged.disconnect(self.scheduler.onVisibilityChanged)
+        layer.visibilityChanged.disconnect(self.history.onVisibilityChanged)
+        layer.selectionChanged.disconnect(self.scheduler.onSelectionChanged)
+        layer.appearanceChanged.disconnect(self.scheduler.onAppearanceChanged)
+        layer.adjustmentsChanged.disconnect(self.scheduler.onContentChanged)
+        layer.pixmapReady.disconnect(self.scheduler.onContentChanged)
+        memoryBudget.untrack(layer)
+        self.scheduler.markDirty(Dirty.LAYERS)
+
+    def removeLayer(self, layer: Layer):
+        """Remove a layer for good; it may already have been detached, e.g. deleted while importing"""
+        if layer in self.layers:
+            self.detachLayer(layer)
+        self.history.forgetLayer(layer)
+        layer.release()
+
+    def deleteSelectedLayers(self):
+        if self.selectedLayers:
+            command = LayersCommand([(self.layers.index(layer), layer) for layer in self.selectedLayers], added=False)
+            command.redo(self)
+            self.history.push(command)
+
+    def undo(self):
+        self.history.undo()
+
+    def redo(self):
+        self.history.redo()
 
     def exportImage(self):
-        if self.layers:
-            # Get the scene rect for export size
-            scene_rect = self.previewWindow.scene.sceneRect()
-            combined_pixmap = QPixmap(scene_rect.size().toSize())
-            combined_pixmap.fill(Qt.GlobalColor.transparent)
-            
-            # Create a temporary scene with only exportable items
-            temp_scene = QGraphicsScene()
-            temp_scene.setSceneRect(scene_rect)
-            
-            # Add only layer items (not UI elements) to temp scene
-            for item in self.previewWindow.scene.items()[::-1]:
-                if item.data(0) == "layer":
-                    # Clone the item for the temp scene
-                    if isinstance(item, QGraphicsPixmapItem):
-                        cloned_item = QGraphicsPixmapItem(item.pixmap())
-                        cloned_item.setPos(item.pos())
-                        cloned_item.setOpacity(item.opacity())
-                        temp_scene.addItem(cloned_item)
-            
-            # Render the temp scene to the pixmap
-            painter = QPainter(combined_pixmap)
-            temp_scene.render(painter)
-            painter.end()
-
-            # Save the combined_pixmap to a file
-            file_dialog = QFileDialog()
-            save_path, _ = file_dialog.getSaveFileName(self.previewWindow, "Save Image File", "", "PNG Files (*.png)")
-            if save_path:
-                combined_pixmap.save(save_path, "PNG")
\ No newline at end of file
+        if not self.layers:
+            return
+        file_filters = [file_filter for file_filter, _, _, _ in FORMATS.values()]
+        save_path, selected_filter = QFileDialog.getSaveFileName(self.previewWindow, "Export Image", "", ";;".join(file_filters))
+        if not save_path:
+            return
+        format = formatForPath(save_path)
+        if format is None:
+            # No or an unknown extension: use the chosen filter's format
+            format = next(format for format, (file_filter, _, _, _) in FORMATS.items() if file_filter == selected_filter)
+            save_path += FORMATS[format][1]
+        settings = self.exportSettings.setdefault(format, ExportSettings(format))
+        if ExportSettingsDialog(settings, self.previewWindow).exec() != QDialog.DialogCode.Accepted:
+            return
+        # Composite from the original images rather than the preview pixmaps; they are loaded
+        # and adjusted on the export thread
+        render_layers = [RenderLayer.deferred(layer) for layer in self.layers if layer.visible]
+        if not render_layers:
+            return
+        exporter = Exporter(TiledCompositor(render_layers), save_path, settings, self.previewWindow)
+        progress = QProgressDialog(f"Exporting {os.path.basename(save_path)}...", "Cancel", 0, 1, self.previewWindow)
+        progress.setWindowModality(Qt.WindowModality.NonModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(exporter.cancel)
+        exporter.progress.connect(lambda done, total: progress.setMaximum(total))
+        exporter.progress.connect(lambda done, total: progress.setValue(done))
+        exporter.finished.connect(progress.reset)
+        exporter.finished.connect(lambda error: QMessageBox.warning(self.previewWindow, "Export Image", f"Could not export {save_path}: {error}") if error else None)
+        exporter.finished.connect(exporter.deleteLater)
+        exporter.start()
+
+    def openProject(self):
+        open_path, _ = QFileDialog.getOpenFileName(self.previewWindow, "Open Project", "", "Photo Editor Projects (*.pep)")
+        if open_path:
+            self.loadProject(open_path)
+
+    def loadProject(self, path: str):
+        """Replace the layers with those of a project file; pixels are paged in as they are shown"""
+        project = ProjectFile(path)
+        try:
+            layers = project.load()
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self.previewWindow, "Open Project", f"Could not open {path}: {e}")
+            return
+        self.history.clear()  # First, so removing the layers has no steps to go through
+        for layer in list(self.layers):
+            self.removeLayer(layer)
+        for layer in layers:
+            self.addLayer(layer)
+        self.project = project
+        if project.missing:
+            QMessageBox.warning(self.previewWindow, "Open Project", "Missing source files:\n" + "\n".join(project.missing))
+
+    def saveProject(self):
+        if self.project is None:
+            self.saveProjectAs()
+            return
+        try:
+            self.project.save(self.layers)
+        except OSError as e:
+            QMessageBox.warning(self.previewWindow, "Save Project", f"Could not save {self.project.path}: {e}")
+
+    def saveProjectAs(self):
+        save_path, _ = QFileDialog.getSaveFileName(self.previewWindow, "Save Project", "", "Photo Editor Projects (*.pep)")
+        if save_path:
+            if not save_path.endswith(".pep"):
+                save_path += ".pep"
+            self.project = ProjectFile(save_path)
+            self.saveProject()
@@ -0,0 +1,257 @@
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtCore import QPoint, QRect, QRectF, QSize, Qt
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+
+from adjustments import Adjustment, readAdjustedRegion
+from layers import Layer
+from pngwriter import PngWriter
+from tiles import readImageRegion
+
+TILE_SIZE = 512
+
+def halvedImage(image: QImage, width: int, height: int) -> QImage:
+    """Halve image like the layer mip pyramid, to the smallest level still at least width x height"""
+    while image.width() // 2 >= max(width, 1) and image.height() // 2 >= max(height, 1):
+        image = image.scaled(image.width() // 2, image.height() // 2, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    return image
+
+class RenderLayer():
+    """What the compositor needs from a layer, detached from the GUI objects
+
+    Either holds a decoded image, or for tiled layers that are decoded region by region, the
+    path and size of the source file, so each tile decodes only the part it covers.
+    """
+    def __init__(self, image: QImage | None, x: float, y: float, width: float, height: float, opacity: float = 1.0,
+                 path: str | None = None, source_size: QSize | None = None, blend_mode: str = "normal",
+                 adjustments: list[Adjustment] = ()):
+        self.image = image
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.opacity = opacity
+        self.path = path
+        self.sourceSize = source_size if source_size is not None else (image.size() if image is not None else QSize())
+        self.blendMode = blend_mode
+        self.adjustments = adjustments  # Still to be applied to regions decoded from path, or by prepare()
+        self.source: QImage | str | None = None  # Unadjusted image or file a deferred snapshot loads in prepare()
+
+    @classmethod
+    def fromLayer(cls, layer: Layer, scale: float = 1.0) -> "RenderLayer":
+        """Snapshot of a layer; scale < 1 renders the canvas reduced, as the preview does when zoomed out"""
+        size = layer.scaledSize()
+        x, y = layer.position['x'] * scale, layer.position['y'] * scale
+        width, height = size.width() * scale, size.height() * scale
+        if layer.decodesRegionsFromFile():
+            return cls(None, x, y, width, height, layer.opacity, path=layer.path, source_size=layer.imageSize, blend_mode=layer.blendMode,
+                       adjustments=[adjustment.copy() for adjustment in layer.adjustments])
+        # Start from the nearest mip level so strong downscaling does not alias
+        image = layer.displayImage(math.ceil(width), math.ceil(height))
+        return cls(image, x, y, width, height, layer.opacity, blend_mode=layer.blendMode)
+
+    @classmethod
+    def deferred(cls, layer: Layer) -> "RenderLayer":
+        """Full-size snapshot of a layer that does not touch its pixels yet
+
+        Only references the decoded image, the mapped spill or the source file; prepare()
+        loads it and applies the adjustments later, e.g. on an export thread.
+        """
+        if layer.decodesRegionsFromFile():
+            return cls.fromLayer(layer)
+        size = layer.scaledSize()
+        render_layer = cls(None, layer.position['x'], layer.position['y'], size.width(), size.height(), layer.opacity,
+                           source_size=layer.imageSize, blend_mode=layer.blendMode,
+                           adjustments=[adjustment.copy() for adjustment in layer.adjustments])
+        if layer.cachedImage is not None:
+            render_layer.source = layer.cachedImage
+        elif layer.spill is not None:
+            render_layer.source = layer.spill.image()  # Maps the pixels without reading them
+        else:
+            render_layer.source = layer.path
+        return render_layer
+
+    def prepare(self):
+        """Load and adjust the image of a deferred snapshot, as Layer.displayImage would"""
+        if self.source is None:
+            return
+        image = QImage(self.source) if isinstance(self.source, str) else self.source
+        image = halvedImage(image, math.ceil(self.width), math.ceil(self.height))
+        if self.adjustments:
+            from filters import applyAdjustments
+            image = applyAdjustments(image, self.adjustments, image.width() / self.sourceSize.width())
+        self.image, self.source, self.adjustments = image, None, []
+
+    @classmethod
+    def fromImage(cls, image: QImage, x: float, y: float, scale_x: float, scale_y: float, opacity: float = 1.0,
+                  blend_mode: str = "normal") -> "RenderLayer":
+        """Snapshot for an image that has no Layer, using the same sizing rules as Layer.setScale"""
+        width = max(1, int(image.width() * scale_x))
+        height = max(1, int(image.height() * scale_y))
+        return cls(halvedImage(image, width, height), x, y, width, height, opacity, blend_mode=blend_mode)
+
+    def rect(self) -> QRectF:
+        return QRectF(self.x, self.y, self.width, self.height)
+
+    def drawRegion(self, painter: QPainter, clip: QRectF):
+        """Decode and draw just the part of a file-backed layer that falls inside clip (canvas coordinates)"""
+        target = self.rect()
+        scale_x = self.sourceSize.width() / self.width
+        scale_y = self.sourceSize.height() / self.height
+        visible = target.intersected(clip)
+        source_rect = QRectF((visible.x() - self.x) * scale_x, (visible.y() - self.y) * scale_y,
+                             visible.width() * scale_x, visible.height() * scale_y).toAlignedRect()
+        source_rect = source_rect.intersected(QRect(QPoint(0, 0), self.sourceSize))
+        if source_rect.isEmpty():
+            return
+        # Canvas area of the whole source pixels read, so neighbouring tiles line up exactly
+        region_target = QRectF(self.x + source_rect.x() / scale_x, self.y + source_rect.y() / scale_y,
+                               source_rect.width() / scale_x, source_rect.height() / scale_y)
+        size = QSize(min(source_rect.width(), max(1, math.ceil(region_target.width()))),
+                     min(source_rect.height(), max(1, math.ceil(region_target.height()))))
+        if self.adjustments:
+            region = readAdjustedRegion(lambda rect, size: readImageRegion(self.path, rect, size), source_rect, size, self.sourceSize, self.adjustments)
+        else:
+            region = readImageRegion(self.path, source_rect, size)
+        painter.drawImage(region_target, region)
+
+def canvasRect(layers: list[RenderLayer]) -> QRect:
+    """Union of the layer bounds, matching the preview's scene rect"""
+    rect = QRectF()
+    for layer in layers:
+        rect = rect.united(layer.rect())
+    return rect.toAlignedRect()
+
+class TiledCompositor():
+    """Composites layers from their source images tile by tile, without a display
+
+    Tiles are rendered in parallel, one band of tile rows at a time, so memory use depends
+    on the canvas width and tile size rather than on the full canvas area.
+    """
+    def __init__(self, layers: list[RenderLayer], rect: QRect | None = None, tile_size: int = TILE_SIZE, workers: int | None = None):
+        self.layers = layers
+        self.rect = rect if rect is not None else canvasRect(layers)
+        self.tileSize = tile_size
+        self.workers = workers or os.cpu_count() or 1
+
+    def tilePainter(self, image: QImage, tile_rect: QRect) -> QPainter:
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.translate(-tile_rect.x(), -tile_rect.y())
+        return painter
+
+    def drawLayer(self, painter: QPainter, layer: RenderLayer, tile_rect: QRect):
+        if layer.image is None:
+            layer.drawRegion(painter, QRectF(tile_rect))
+        else:
+            # Drawing the whole image and letting the painter clip avoids seams between tiles
+            painter.drawImage(layer.rect(), layer.image)
+
+    def renderTile(self, tile_rect: QRect) -> QImage:
+        """Composite every layer overlapping tile_rect (canvas coordinates) into a new image
+
+        Normal layers are drawn straight onto the tile. A layer with another blend mode is
+        drawn onto a scratch tile first and then blended in with NumPy over the area it covers.
+        """
+        tile = QImage(tile_rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        tile.fill(Qt.GlobalColor.transparent)
+        painter = None
+        for layer in self.layers:
+            target = layer.rect()
+            if not target.intersects(QRectF(tile_rect)):
+                continue
+            if layer.blendMode == "normal":
+                if painter is None:
+                    painter = self.tilePainter(tile, tile_rect)
+                painter.setOpacity(layer.opacity)
+                self.drawLayer(painter, layer, tile_rect)
+                continue
+            if painter is not None:
+                painter.end()  # The tile's pixels are about to be read and written directly
+                painter = None
+            source = QImage(tile_rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+            source.fill(Qt.GlobalColor.transparent)
+            source_painter = self.tilePainter(source, tile_rect)
+            self.drawLayer(source_painter, layer, tile_rect)
+            source_painter.end()
+            covered = target.translated(-tile_rect.x(), -tile_rect.y()).toAlignedRect()
+            from blending import blendInto  # Only layers with a blend mode need NumPy
+            blendInto(tile, source, layer.blendMode, layer.opacity, covered)
+        if painter is not None:
+            painter.end()
+        return tile
+
+    def bands(self, executor: ThreadPoolExecutor):
+        """Yield (y, band image) for each row of tiles, top to bottom"""
+        rect = self.rect
+        for band_y in range(rect.top(), rect.top() + rect.height(), self.tileSize):
+            band_height = min(self.tileSize, rect.top() + rect.height() - band_y)
+            tile_rects = [
+                QRect(tile_x, band_y, min(self.tileSize, rect.left() + rect.width() - tile_x), band_height)
+                for tile_x in range(rect.left(), rect.left() + rect.width(), self.tileSize)
+            ]
+            band = QImage(rect.width(), band_height, QImage.Format.Format_ARGB32_Premultiplied)
+            painter = QPainter(band)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            for tile_rect, tile in zip(tile_rects, executor.map(self.renderTile, tile_rects)):
+                painter.drawImage(tile_rect.x() - rect.left(), 0, tile)
+            painter.end()
+            yield band_y - rect.top(), band
+
+    def rows(self):
+        """Yield the composited canvas one RGBA8888 scanline at a time"""
+        row_bytes = self.rect.width() * 4
+        with ThreadPoolExecutor(self.workers) as executor:
+            for _, band in self.bands(executor):
+                band = band.convertToFormat(QImage.Format.Format_RGBA8888)
+                bits = band.constBits()
+                bytes_per_line = band.bytesPerLine()
+                for y in range(band.height()):
+                    yield bits[y * bytes_per_line:y * bytes_per_line + row_bytes]
+
+    def exportPNG(self, path: str, compress_level: int = 6):
+        writer = PngWriter(path, self.rect.width(), self.rect.height(), compress_level)
+        try:
+            for row in self.rows():
+                writer.writeRow(row)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+class TileCache():
+    """Composited tiles at several zoom levels, dropped only where layers changed
+
+    Tiles are keyed by (level, column, row) on a grid anchored at canvas (0, 0); a tile at
+    level n covers tile_size << n canvas pixels and holds them reduced by 2^n.
+    """
+    def __init__(self, tile_size: int = TILE_SIZE, max_tiles: int = 64):
+        self.tileSize = tile_size
+        self.maxTiles = max_tiles
+        self.tiles: dict[tuple[int, int, int], QImage] = {}  # In least recently used order
+
+    def canvasRect(self, key: tuple[int, int, int]) -> QRectF:
+        level, col, row = key
+        span = self.tileSize << level
+        return QRectF(col * span, row * span, span, span)
+
+    def tile(self, key: tuple[int, int, int], layers: list[RenderLayer]) -> QImage:
+        """Cached tile, composited from layers (already reduced to the key's level) when missing"""
+        image = self.tiles.pop(key, None)
+        if image is None:
+            _, col, row = key
+            tile_rect = QRect(col * self.tileSize, row * self.tileSize, self.tileSize, self.tileSize)
+            image = TiledCompositor(layers, tile_rect, self.tileSize, workers=1).renderTile(tile_rect)
+            while len(self.tiles) >= self.maxTiles:
+                del self.tiles[next(iter(self.tiles))]
+        self.tiles[key] = image
+        return image
+
+    def invalidate(self, rect: QRectF):
+        """Drop the tiles of every level that overlap rect (canvas coordinates)"""
+        for key in [key for key in self.tiles if self.canvasRect(key).intersects(rect)]:
+            del self.tiles[key]
+
+    def clear(self):
+        self.tiles.clear()
@@ -0,0 +1,197 @@
+"""Exporting the composited canvas to image files
+
+PNG and TIFF are streamed to disk one band of tiles at a time. JPEG and WebP are encoded by
+Pillow, which needs the whole canvas in memory, so they are limited to the sizes those formats
+allow; Pillow is only imported once one of them is exported. Every format runs on a pool thread and can be cancelled between bands.
+"""
+from PySide6.QtWidgets import QDialog, QDialogButtonBox, QFormLayout, QSpinBox
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from compositor import TiledCompositor
+from pngwriter import PngWriter
+from tiffwriter import TiffWriter
+from workers import WorkerSignals
+
+# format -> (file dialog filter, extension, largest width or height, settings it uses)
+FORMATS = {
+    "PNG": ("PNG Files (*.png)", ".png", 2**31 - 1, ("compressLevel",)),
+    "JPEG": ("JPEG Files (*.jpg *.jpeg)", ".jpg", 65500, ("quality", "effort")),
+    "WebP": ("WebP Files (*.webp)", ".webp", 16383, ("quality", "effort")),
+    "TIFF": ("Tiled BigTIFF Files (*.tif *.tiff)", ".tif", 2**32 - 1, ("compressLevel",)),
+}
+
+# setting -> (label, minimum, maximum)
+SETTINGS = {
+    "quality": ("Quality", 1, 100),  # Lossy formats; higher is larger and closer to the canvas
+    "compressLevel": ("Compression level", 0, 9),  # zlib level of the lossless formats; 0 is uncompressed
+    "effort": ("Effort", 0, 6),  # WebP method; JPEG optimizes its Huffman tables from 4 up
+}
+
+# Exporters are deleted with deleteLater when they finish; a pool deleted with one would wait,
+# holding the GIL, for its task to return from run(), which needs the GIL
+exportPool = QThreadPool()
+
+class ExportCancelled(Exception):
+    pass
+
+class ExportSettings():
+    """Encoder settings of an export; each format uses only some of them (see FORMATS)"""
+    def __init__(self, format: str = "PNG", quality: int = 90, compress_level: int = 6, effort: int = 4):
+        self.format = format
+        self.quality = quality
+        self.compressLevel = compress_level
+        self.effort = effort
+
+    def describe(self) -> str:
+        return self.format + " " + " ".join(f"{name}={getattr(self, name)}" for name in FORMATS[self.format][3])
+
+def formatForPath(path: str) -> str | None:
+    """Format whose file filter matches the extension of path, if any"""
+    pattern = "*" + os.path.splitext(path)[1].lower()
+    for format, (file_filter, _, _, _) in FORMATS.items():
+        if pattern in file_filter[file_filter.index("(") + 1:-1].split():
+            return format
+    return None
+
+def exportCanvas(compositor: TiledCompositor, path: str, settings: ExportSettings, progress=None, cancelled: threading.Event | None = None):
+    """Write the compositor's canvas to path, calling progress(done, total) after each band
+
+    Deferred layer snapshots are loaded and adjusted first, on the calling thread. Raises
+    ExportCancelled once cancelled is set; the partial file is removed then, as on errors.
+    """
+    for layer in compositor.layers:
+        if cancelled is not None and cancelled.is_set():
+            raise ExportCancelled()
+        layer.prepare()
+    width, height = compositor.rect.width(), compositor.rect.height()
+    if max(width, height) > FORMATS[settings.format][2]:
+        raise ValueError(f"{settings.format} images can be at most {FORMATS[settings.format][2]} pixels wide and high")
+    pillow = settings.format in ("JPEG", "WebP")
+    total = height + (height if pillow else 0)  # Pillow's encode is counted as the second half
+    if settings.format == "PNG":
+        writer = PngWriter(path, width, height, settings.compressLevel)
+    elif settings.format == "TIFF":
+        writer = TiffWriter(path, width, height, compositor.tileSize, settings.compressLevel)
+    else:
+        writer = None
+        pixels = bytearray(width * height * 4)
+    try:
+        with ThreadPoolExecutor(compositor.workers) as executor:
+            for y, band in compositor.bands(executor):
+                if cancelled is not None and cancelled.is_set():
+                    raise ExportCancelled()
+                band = band.convertToFormat(QImage.Format.Format_RGBA8888)
+                bits = band.constBits()
+                bytes_per_line = band.bytesPerLine()
+                if settings.format == "TIFF":
+                    writer.writeTileRow(bits, bytes_per_line, band.height())
+                else:
+                    for row in range(band.height()):
+                        line = bits[row * bytes_per_line:row * bytes_per_line + width * 4]
+                        if writer is not None:
+                            writer.writeRow(line)
+                        else:
+                            pixels[(y + row) * width * 4:(y + row + 1) * width * 4] = line
+                if progress is not None:
+                    progress(y + band.height(), total)
+        if pillow:
+            encodeWithPillow(pixels, width, height, path, settings)
+            if progress is not None:
+                progress(total, total)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    if writer is not None:
+        writer.close()
+
+def encodeWithPillow(pixels: bytearray, width: int, height: int, path: str, settings: ExportSettings):
+    from PIL import Image
+    image = Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+    if settings.format == "JPEG":
+        # JPEG has no alpha channel; flatten onto white like most viewers show transparency
+        flattened = Image.new("RGB", (width, height), (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel("A"))
+        flattened.save(path, "JPEG", quality=settings.quality, optimize=settings.effort >= 4)
+    else:
+        image.save(path, "WEBP", quality=settings.quality, method=settings.effort)
+
+class ExportTask(QRunnable):
+    """Composites and encodes one export on a pool thread"""
+    def __init__(self, compositor: TiledCompositor, path: str, settings: ExportSettings, signals: WorkerSignals, cancelled: threading.Event):
+        super().__init__()
+        self.compositor = compositor
+        self.path = path
+        self.settings = settings
+        self.signals = signals
+        self.cancelled = cancelled
+
+    def run(self):
+        try:
+            exportCanvas(self.compositor, self.path, self.settings, self.signals.progress.emit, self.cancelled)
+        except ExportCancelled:
+            self.signals.finished.emit("")
+        except Exception as e:
+            # Any failure has to finish the export, or its progress dialog would stay open
+            try:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            except OSError:
+                pass
+            self.signals.finished.emit(str(e) or type(e).__name__)
+        else:
+            self.signals.finished.emit("")
+
+class Exporter(QObject):
+    """Exports render layers to a file in the background, leaving the GUI responsive"""
+    progress = Signal(int, int)  # Canvas rows done, total
+    finished = Signal(str)  # Error message, empty on success or cancellation
+
+    def __init__(self, compositor: TiledCompositor, path: str, settings: ExportSettings, parent: QObject | None = None):
+        super().__init__(parent)
+        self.compositor = compositor
+        self.path = path
+        self.settings = settings
+        self.cancelled = threading.Event()
+        self.signals = WorkerSignals()
+        self.signals.progress.connect(self.progress)
+        self.signals.finished.connect(self.finished.emit)  # Error message, empty on success
+        self.pool = exportPool
+
+    def start(self):
+        self.pool.start(ExportTask(self.compositor, self.path, self.settings, self.signals, self.cancelled))
+
+    def cancel(self):
+        """Stop after the band being rendered; the partial file is removed"""
+        self.cancelled.set()
+
+class ExportSettingsDialog(QDialog):
+    """Encoder settings of one format, e.g. quality against file size"""
+    def __init__(self, settings: ExportSettings, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        self.setWindowTitle(f"{settings.format} Export Settings")
+        layout = QFormLayout(self)
+        self.spinBoxes: dict[str, QSpinBox] = {}
+        for name in FORMATS[settings.format][3]:
+            label, minimum, maximum = SETTINGS[name]
+            spin_box = QSpinBox()
+            spin_box.setRange(minimum, maximum)
+            spin_box.setValue(getattr(settings, name))
+            layout.addRow(label, spin_box)
+            self.spinBoxes[name] = spin_box
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def accept(self):
+        for name, spin_box in self.spinBoxes.items():
+            setattr(self.settings, name, spin_box.value())
+        super().accept()
@@ -0,0 +1,134 @@
+"""NumPy implementations of the adjustments in adjustments.py
+
+Kept apart so that NumPy is only loaded once a layer actually has adjustments.
+"""
+from PySide6.QtGui import QImage
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import numpy as np
+
+ADJUSTMENT_TILE_ROWS = 256  # Rows of pixels evaluated per worker task
+
+# Luma weights (Rec. 601), used for saturation and as the Y axis of hue rotation
+LUMA = np.array([0.299, 0.587, 0.114], np.float32)
+
+def brightnessContrast(rgba: np.ndarray, scale: float, brightness: int, contrast: int) -> np.ndarray:
+    rgb = rgba[..., :3]
+    rgb[...] = (rgb - 0.5) * (1 + contrast / 100) + 0.5 + brightness / 100
+    return rgba
+
+def levels(rgba: np.ndarray, scale: float, black: int, white: int, gamma: int) -> np.ndarray:
+    rgb = rgba[..., :3]
+    rgb[...] = np.clip((rgb - black / 255) / max(white - black, 1) * 255, 0, 1) ** (100 / gamma)
+    return rgba
+
+def hueSaturation(rgba: np.ndarray, scale: float, hue: int, saturation: int, lightness: int) -> np.ndarray:
+    rgb = rgba[..., :3]
+    if hue:
+        # Rotate the chroma plane of YIQ, which keeps luma unchanged
+        to_yiq = np.array([LUMA, [0.596, -0.274, -0.322], [0.211, -0.523, 0.312]], np.float32)
+        angle = math.radians(hue)
+        rotate = np.array([[1, 0, 0], [0, math.cos(angle), -math.sin(angle)], [0, math.sin(angle), math.cos(angle)]], np.float32)
+        matrix = np.linalg.inv(to_yiq) @ rotate @ to_yiq
+        rgb[...] = rgb @ matrix.T.astype(np.float32)
+    if saturation:
+        luma = (rgb @ LUMA)[..., None]
+        rgb[...] = luma + (rgb - luma) * (1 + saturation / 100)
+    if lightness > 0:
+        rgb[...] = rgb + (1 - rgb) * (lightness / 100)
+    elif lightness < 0:
+        rgb[...] = rgb * (1 + lightness / 100)
+    return rgba
+
+def gaussianKernel(sigma: float) -> np.ndarray:
+    radius = max(1, math.ceil(3 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1, dtype=np.float32) / sigma) ** 2)
+    return kernel / kernel.sum()
+
+def gaussian(rgba: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur of premultiplied colors, clamping at the edges"""
+    if sigma < 0.3:
+        return rgba.copy()
+    kernel = gaussianKernel(sigma)
+    radius = len(kernel) // 2
+    premultiplied = rgba.copy()
+    premultiplied[..., :3] *= rgba[..., 3:]
+    for axis in (0, 1):
+        padding = [(0, 0)] * 3
+        padding[axis] = (radius, radius)
+        padded = np.pad(premultiplied, padding, mode="edge")
+        length = premultiplied.shape[axis]
+        blurred = np.zeros_like(premultiplied)
+        window = [slice(None)] * 3
+        for offset, weight in enumerate(kernel):
+            window[axis] = slice(offset, offset + length)
+            blurred += weight * padded[tuple(window)]
+        premultiplied = blurred
+    with np.errstate(divide="ignore", invalid="ignore"):
+        premultiplied[..., :3] = np.where(premultiplied[..., 3:] > 0, premultiplied[..., :3] / premultiplied[..., 3:], 0)
+    return premultiplied
+
+def gaussianBlur(rgba: np.ndarray, scale: float, radius: int) -> np.ndarray:
+    return gaussian(rgba, radius * scale / 2)
+
+def sharpen(rgba: np.ndarray, scale: float, amount: int, radius: int) -> np.ndarray:
+    """Unsharp mask: add back the difference from a blurred copy"""
+    blurred = gaussian(rgba, radius * scale / 2)
+    rgba[..., :3] += (rgba[..., :3] - blurred[..., :3]) * (amount / 100)
+    return rgba
+
+# kind -> function(rgba, scale, **params) adjusting straight float RGBA pixels of an image
+# reduced by scale; may work in place
+KERNELS = {
+    "brightness_contrast": brightnessContrast,
+    "levels": levels,
+    "hue_saturation": hueSaturation,
+    "gaussian_blur": gaussianBlur,
+    "sharpen": sharpen,
+}
+
+executor: ThreadPoolExecutor | None = None
+
+def workerPool() -> ThreadPoolExecutor:
+    """Shared pool for tile evaluation; NumPy releases the GIL in the heavy loops"""
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(os.cpu_count() or 1)
+    return executor
+
+def imageToArray(image: QImage) -> np.ndarray:
+    """(height, width, 4) uint8 RGBA copy of an image"""
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    array = np.frombuffer(image.constBits(), np.uint8).reshape(image.height(), image.bytesPerLine() // 4, 4)
+    return array[:, :image.width()].copy()
+
+def arrayToImage(array: np.ndarray) -> QImage:
+    height, width = array.shape[:2]
+    array = np.ascontiguousarray(array)
+    image = QImage(array.data, width, height, width * 4, QImage.Format.Format_RGBA8888)
+    return image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)  # Copies, so the array can go
+
+def applyNode(adjustment, pixels: np.ndarray, scale: float) -> np.ndarray:
+    """Evaluate one node over row tiles in parallel; each tile reads a halo of rows around it"""
+    height = pixels.shape[0]
+    halo = adjustment.halo(scale)
+    output = np.empty_like(pixels)
+
+    def evaluateTile(top: int):
+        bottom = min(top + ADJUSTMENT_TILE_ROWS, height)
+        start, end = max(0, top - halo), min(height, bottom + halo)
+        rgba = pixels[start:end].astype(np.float32) * (1 / 255)
+        rgba = KERNELS[adjustment.kind](rgba, scale, **adjustment.params)
+        output[top:bottom] = np.clip(rgba[top - start:bottom - start] * 255 + 0.5, 0, 255).astype(np.uint8)
+
+    list(workerPool().map(evaluateTile, range(0, height, ADJUSTMENT_TILE_ROWS)))
+    return output
+
+def applyAdjustments(image: QImage, adjustments: list, scale: float) -> QImage:
+    """Adjusted copy of an image, without memoization"""
+    pixels = imageToArray(image)
+    for adjustment in adjustments:
+        pixels = applyNode(adjustment, pixels, scale)
+    return arrayToImage(pixels)
+
@@ -0,0 +1,256 @@
+from PySide6.QtCore import QObject, Signal, Slot
+from abc import ABC, abstractmethod
+from collections import deque
+
+from adjustments import Adjustment
+from layers import Layer
+from scheduler import Dirty
+
+HISTORY_BUDGET_BYTES = 4 * 1024 * 1024
+COMMAND_OVERHEAD = 64  # Rough size of a command object and its bookkeeping
+LAYER_ENTRY_SIZE = 48  # Rough size of one per-layer tuple of small numbers
+
+class Command(ABC):
+    """One undoable step that has already been applied
+
+    Commands keep only what is needed to go back and forth: parameters for transforms,
+    visibility, appearance and adjustments, and layer references for selection and layer lists.
+    """
+    @abstractmethod
+    def undo(self, composition):
+        pass
+
+    @abstractmethod
+    def redo(self, composition):
+        pass
+
+    def size(self) -> int:
+        """Estimated bytes kept alive by the command, counted against the history budget"""
+        return COMMAND_OVERHEAD
+
+    def discard(self, composition):
+        """Called when the command leaves the history for good"""
+        pass
+
+    def forgetLayer(self, layer: Layer) -> bool:
+        """Stop restoring a layer that is gone for good; True if nothing is left to undo"""
+        return False
+
+class TransformCommand(Command):
+    """Position and scale of layers before and after a drag or handle transform"""
+    def __init__(self, changes: list[tuple[Layer, tuple, tuple]]):
+        self.changes = changes  # (layer, (x, y, scale x, scale y) before, same after)
+
+    def apply(self, composition, side: int):
+        for change in self.changes:
+            layer = change[0]
+            x, y, scale_x, scale_y = change[side]
+            layer.setPosition(x, y)
+            if layer.getScale() != (scale_x, scale_y):
+                layer.setScale(scale_x, scale_y)
+        composition.scheduler.markDirty(Dirty.TRANSFORM, [change[0] for change in self.changes])
+
+    def undo(self, composition):
+        self.apply(composition, 1)
+
+    def redo(self, composition):
+        self.apply(composition, 2)
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + LAYER_ENTRY_SIZE * len(self.changes)
+
+class VisibilityCommand(Command):
+    def __init__(self, layer: Layer, visible: bool):
+        self.layer = layer
+        self.visible = visible
+
+    def undo(self, composition):
+        self.layer.setVisible(not self.visible)
+
+    def redo(self, composition):
+        self.layer.setVisible(self.visible)
+
+class AppearanceCommand(Command):
+    """Opacity and blend mode of layers before and after an edit in the layers panel"""
+    def __init__(self, changes: list[tuple[Layer, tuple, tuple]]):
+        self.changes = changes  # (layer, (opacity, blend mode) before, same after)
+
+    def apply(self, side: int):
+        for change in self.changes:
+            opacity, mode = change[side]
+            change[0].setOpacity(opacity)
+            change[0].setBlendMode(mode)
+
+    def undo(self, composition):
+        self.apply(1)
+
+    def redo(self, composition):
+        self.apply(2)
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + LAYER_ENTRY_SIZE * len(self.changes)
+
+class AdjustmentsCommand(Command):
+    """Adjustment stack of a layer before and after an edit"""
+    def __init__(self, layer: Layer, before: list[Adjustment], after: list[Adjustment]):
+        self.layer = layer
+        self.before = before
+        self.after = after
+
+    def undo(self, composition):
+        self.layer.setAdjustments([adjustment.copy() for adjustment in self.before])
+
+    def redo(self, composition):
+        self.layer.setAdjustments([adjustment.copy() for adjustment in self.after])
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + LAYER_ENTRY_SIZE * (len(self.before) + len(self.after))
+
+class SelectionCommand(Command):
+    def __init__(self, before: list[Layer], after: list[Layer]):
+        self.before = before
+        self.after = after
+
+    def undo(self, composition):
+        composition.setSelection(self.before)
+
+    def redo(self, composition):
+        composition.setSelection(self.after)
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + 8 * (len(self.before) + len(self.after))
+
+class LayersCommand(Command):
+    """Layers added to (imported) or removed from the composition, with their stacking indices
+
+    Layers that are out of the composition give up their decoded pixels (spilling them to
+    disk if they have no source file), so the history does not hold images in memory.
+    """
+    def __init__(self, entries: list[tuple[int, Layer]], added: bool):
+        self.entries = sorted(entries, key=lambda entry: entry[0])
+        self.added = added
+
+    def insert(self, composition):
+        for index, layer in self.entries:
+            composition.insertLayer(index, layer)
+
+    def detach(self, composition):
+        for _, layer in reversed(self.entries):
+            composition.detachLayer(layer)
+            layer.evictImage()
+
+    def undo(self, composition):
+        if self.added:
+            self.detach(composition)
+        else:
+            self.insert(composition)
+
+    def redo(self, composition):
+        if self.added:
+            self.insert(composition)
+        else:
+            self.detach(composition)
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + LAYER_ENTRY_SIZE * len(self.entries)
+
+    def discard(self, composition):
+        current = set(composition.layers)
+        for _, layer in self.entries:
+            if layer not in current:
+                layer.release()
+
+    def forgetLayer(self, layer: Layer) -> bool:
+        for index, entry in enumerate(self.entries):
+            if entry[1] is layer:
+                # The layers above it shift down by one, as they would have without it
+                self.entries = self.entries[:index] + [(i - 1, other) for i, other in self.entries[index + 1:]]
+                break
+        return not self.entries
+
+class History(QObject):
+    """Undo/redo stacks of applied commands, trimmed oldest first to a byte budget"""
+    changed = Signal()
+
+    def __init__(self, composition, budget_bytes: int = HISTORY_BUDGET_BYTES, parent: QObject | None = None):
+        super().__init__(parent)
+        self.composition = composition
+        self.budget = budget_bytes
+        self.undoStack: deque[Command] = deque()
+        self.redoStack: list[Command] = []
+        self.used = 0
+        self.applying = False  # Changes made by undo/redo themselves are not recorded
+
+    def push(self, command: Command):
+        if self.applying:
+            return
+        for redone in self.redoStack:
+            self.used -= redone.size()
+            redone.discard(self.composition)
+        self.redoStack.clear()
+        self.undoStack.append(command)
+        self.used += command.size()
+        # Always keep the newest step, even if it is over budget on its own
+        while self.used > self.budget and len(self.undoStack) > 1:
+            oldest = self.undoStack.popleft()
+            self.used -= oldest.size()
+            oldest.discard(self.composition)
+        self.changed.emit()
+
+    def clear(self):
+        for command in list(self.undoStack) + self.redoStack:
+            command.discard(self.composition)
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.used = 0
+        self.changed.emit()
+
+    def forgetLayer(self, layer: Layer):
+        """Drop a removed layer from every step, e.g. a placeholder whose import failed"""
+        for stack in (self.undoStack, self.redoStack):
+            for command in list(stack):
+                self.used -= command.size()
+                if command.forgetLayer(layer):
+                    stack.remove(command)
+                else:
+                    self.used += command.size()
+        self.changed.emit()
+
+    def canUndo(self) -> bool:
+        return bool(self.undoStack)
+
+    def canRedo(self) -> bool:
+        return bool(self.redoStack)
+
+    def undo(self):
+        if not self.undoStack:
+            return
+        command = self.undoStack.pop()
+        self.used -= command.size()
+        self.applying = True
+        try:
+            command.undo(self.composition)
+        finally:
+            self.applying = False
+        self.redoStack.append(command)
+        self.used += command.size()
+        self.changed.emit()
+
+    def redo(self):
+        if not self.redoStack:
+            return
+        command = self.redoStack.pop()
+        self.used -= command.size()
+        self.applying = True
+        try:
+            command.redo(self.composition)
+        finally:
+            self.applying = False
+        self.undoStack.append(command)
+        self.used += command.size()
+        self.changed.emit()
+
+    @Slot()
+    def onVisibilityChanged(self):
+        layer = self.sender()
+        self.push(VisibilityCommand(layer, layer.visible))
@@ -0,0 +1,110 @@
+from PySide6.QtGui import QImage, QImageReader, QImageIOHandler, QColor
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QSize, Signal, Qt
+import threading
+
+from layers import Layer
+from tiles import needsTiling, TILE_SIZE
+from workers import WorkerSignals
+
+PLACEHOLDER_COLOR = QColor(128, 128, 128, 96)
+
+# Shared by all imports and never deleted: an importer goes away with deleteLater once it is
+# finished, and a pool deleted with it would wait for decodes still running after a cancel
+# while holding the GIL those decodes need to return
+decodePool = QThreadPool()
+
+class DecodeTask(QRunnable):
+    """Decodes one image file on a pool thread"""
+    def __init__(self, index: int, path: str, signals: WorkerSignals, cancelled: threading.Event):
+        super().__init__()
+        self.index = index
+        self.path = path
+        self.signals = signals
+        self.cancelled = cancelled
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+        reader = QImageReader(self.path)
+        image = reader.read()
+        if self.cancelled.is_set():
+            return  # The importer may already be gone
+        self.signals.finished.emit((self.index, image, reader.errorString() if image.isNull() else ""))
+
+class ImageImporter(QObject):
+    """Imports image files as layers, decoding them in parallel off the GUI thread
+
+    Each file gets a placeholder layer immediately (sized from the file header) that is
+    filled in with the decoded image as soon as its decode finishes.
+    """
+    layerCreated = Signal(Layer)  # Placeholder layer ready to be added
+    layerLoaded = Signal(Layer)  # Layer now holds its decoded image
+    layerDiscarded = Signal(Layer)  # Decode failed or was cancelled
+    progress = Signal(int, int)  # done, total
+    finished = Signal()
+
+    def __init__(self, paths: list[str], parent: QObject | None = None):
+        super().__init__(parent)
+        self.paths = paths
+        self.pending: dict[int, Layer] = {}
+        self.done = 0
+        self.cancelled = threading.Event()
+        self.signals = WorkerSignals()
+        self.signals.finished.connect(self.onDecoded)
+        self.pool = decodePool
+
+    def start(self):
+        ready = []
+        for index, path in enumerate(self.paths):
+            reader = QImageReader(path)  # Reads only the header
+            if needsTiling(reader.size()) and reader.supportsOption(QImageIOHandler.ImageOption.ClipRect):
+                # Large images that can be decoded region by region need no decode up front
+                layer = Layer(path)
+                ready.append(layer)
+            else:
+                layer = Layer(path, self.placeholderImage(reader.size()))
+                layer.loading = True
+                self.pending[index] = layer
+            self.layerCreated.emit(layer)
+        for index in self.pending:
+            self.pool.start(DecodeTask(index, self.paths[index], self.signals, self.cancelled))
+        for layer in ready:
+            self.layerLoaded.emit(layer)
+        self.done = len(ready)
+        self.progress.emit(self.done, len(self.paths))
+        if not self.pending:
+            self.finished.emit()
+
+    def cancel(self):
+        """Stop decoding; layers that have not been filled in yet are discarded"""
+        if self.cancelled.is_set() or not self.pending:
+            return
+        self.cancelled.set()  # Queued decodes of this import return as soon as they start
+        for index in list(self.pending):
+            self.layerDiscarded.emit(self.pending.pop(index))
+        self.finished.emit()
+
+    def placeholderImage(self, size: QSize) -> QImage:
+        if not size.isValid():
+            size = QSize(1, 1)
+        elif needsTiling(size):
+            # Keep placeholders of huge images small; the layer takes the real size once decoded
+            size = size.scaled(TILE_SIZE, TILE_SIZE, Qt.AspectRatioMode.KeepAspectRatio)
+        image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(PLACEHOLDER_COLOR)
+        return image
+
+    def onDecoded(self, result: tuple[int, QImage, str]):
+        index, image, error = result
+        layer = self.pending.pop(index, None)
+        if layer is None:
+            return  # Result of a decode that was cancelled
+        if image.isNull():
+            self.layerDiscarded.emit(layer)
+        else:
+            layer.setImage(image, from_source=True)
+            self.layerLoaded.emit(layer)
+        self.done += 1
+        self.progress.emit(self.done, len(self.paths))
+        if not self.pending:
+            self.finished.emit()
@@ -0,0 +1,196 @@
+from PySide6.QtGui import QPainter, QColor, QFont
+from PySide6.QtCore import QObject, QEvent, QRectF, Qt, Signal
+from collections import deque
+import functools
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+# (module, class, method, stage name) of the hot paths timed while profiling is enabled
+HOT_PATHS = [
+    ("layers", "Layer", "setScale", "Layer.setScale"),
+    ("preview", "PreviewWindow", "render", "PreviewWindow.render"),
+    ("layers", "LayersWindow", "update", "LayersWindow.update"),
+    ("layers", "LayersWindow", "refreshLayers", "LayersWindow.update"),
+    ("composition", "Composition", "flushUpdates", "Composition.update"),
+]
+PAINT_STAGE = "Qt paint"
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+class Profiler(QObject):
+    """Opt-in timing of the editor's hot paths
+
+    Enabling patches timing wrappers onto the methods in HOT_PATHS and an event filter onto
+    attached preview viewports; disabling restores the originals, so a disabled profiler
+    costs nothing. Time spent in each stage is summed per frame (one viewport paint) and
+    kept in rolling histograms. A trace of every call can be recorded in Chrome trace format.
+    """
+    def __init__(self, history: int = 240):
+        super().__init__()
+        self.enabled = False
+        self.hudVisible = False
+        self.history = history
+        self.originals = []  # (class, method, original attribute or None)
+        self.views = {}  # viewport -> PreviewWindow
+        self.frameStages: dict[str, float] = {}  # ms spent per stage in the current frame
+        self.stageHistory: dict[str, deque] = {}  # per-frame ms per stage
+        self.frameTimes = deque(maxlen=history)  # perf_counter timestamps of painted frames
+        self.trace: list[dict] | None = None
+        self.lock = threading.Lock()
+
+    def enable(self):
+        if self.enabled:
+            return
+        for module_name, class_name, method, stage in HOT_PATHS:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            self.originals.append((cls, method, cls.__dict__.get(method)))
+            setattr(cls, method, self.timed(getattr(cls, method), stage))
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for cls, method, original in reversed(self.originals):
+            if original is None:
+                delattr(cls, method)
+            else:
+                setattr(cls, method, original)
+        self.originals.clear()
+        for viewport in list(self.views):
+            viewport.removeEventFilter(self)
+        self.views.clear()
+        self.enabled = False
+
+    def attachView(self, view):
+        """Time the painting of a PreviewWindow and draw the HUD over it"""
+        if self.enabled and view.viewport() not in self.views:
+            self.views[view.viewport()] = view
+            view.viewport().installEventFilter(self)
+
+    def timed(self, function, stage: str):
+        profiler = self
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(stage, start, time.perf_counter_ns())
+        return wrapper
+
+    def record(self, stage: str, start_ns: int, end_ns: int):
+        with self.lock:
+            self.frameStages[stage] = self.frameStages.get(stage, 0.0) + (end_ns - start_ns) / 1e6
+            if self.trace is not None:
+                self.trace.append({"name": stage, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000,
+                                   "pid": os.getpid(), "tid": threading.get_ident()})
+
+    def endFrame(self):
+        with self.lock:
+            for stage, ms in self.frameStages.items():
+                self.stageHistory.setdefault(stage, deque(maxlen=self.history)).append(ms)
+            self.frameStages = {}
+        self.frameTimes.append(time.perf_counter())
+
+    def fps(self) -> float:
+        if len(self.frameTimes) < 2:
+            return 0.0
+        span = self.frameTimes[-1] - self.frameTimes[0]
+        return (len(self.frameTimes) - 1) / span if span > 0 else 0.0
+
+    def stats(self) -> dict[str, tuple[float, float, float]]:
+        """(p50, p95, max) in ms of the per-frame time of each stage"""
+        result = {}
+        with self.lock:
+            for stage, samples in self.stageHistory.items():
+                ordered = sorted(samples)
+                result[stage] = (percentile(ordered, 0.5), percentile(ordered, 0.95), ordered[-1])
+        return result
+
+    def startTrace(self):
+        with self.lock:
+            self.trace = []
+
+    def stopTrace(self, path: str):
+        """Write the events recorded since startTrace as Chrome trace JSON"""
+        with self.lock:
+            events, self.trace = self.trace or [], None
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        view = self.views.get(watched)
+        if view is None or event.type() != QEvent.Type.Paint:
+            return False
+        # Deliver the paint ourselves so the whole of Qt's painting is timed
+        start = time.perf_counter_ns()
+        view.viewportEvent(event)
+        self.record(PAINT_STAGE, start, time.perf_counter_ns())
+        self.endFrame()
+        if self.hudVisible:
+            self.drawHud(watched)
+        return True
+
+    def drawHud(self, viewport):
+        stats = self.stats()
+        lines = [f"{self.fps():5.1f} FPS"]
+        if stats:
+            slowest = max(stats, key=lambda stage: stats[stage][1])
+            lines.append(f"slowest: {slowest}")
+        for stage, (p50, p95, worst) in sorted(stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{stage:<22} p50 {p50:6.2f}  p95 {p95:6.2f}  max {worst:6.2f} ms")
+        painter = QPainter(viewport)
+        font = QFont("monospace", 9)
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        painter.setFont(font)
+        line_height = painter.fontMetrics().height()
+        width = max(painter.fontMetrics().horizontalAdvance(line) for line in lines) + 16
+        painter.fillRect(QRectF(8, 8, width, line_height * len(lines) + 8), QColor(0, 0, 0, 170))
+        painter.setPen(Qt.GlobalColor.white)
+        for i, line in enumerate(lines):
+            painter.drawText(16, 12 + line_height * (i + 1) - painter.fontMetrics().descent(), line)
+        painter.end()
+
+profiler = Profiler()
+
+class StartupTimer(QObject):
+    """Times the phases of startup up to the first paint of a widget
+
+    Phases are marked as they end, relative to the start time given (taken in main.py
+    before the heavy imports).
+    """
+    painted = Signal()  # The watched widget painted for the first time
+
+    def __init__(self, started: float):
+        super().__init__()
+        self.started = started
+        self.marks: list[tuple[str, float]] = []  # (phase, perf_counter when it ended)
+
+    def mark(self, phase: str, at: float | None = None):
+        self.marks.append((phase, time.perf_counter() if at is None else at))
+
+    def watch(self, widget):
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event) -> bool:
+        if event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first paint")
+            self.painted.emit()
+        return False
+
+    def report(self, target_ms: float = 1000):
+        """Print the time taken by each phase and in total"""
+        lines = []
+        previous = self.started
+        for phase, at in self.marks:
+            lines.append(f"  {phase:<12} {(at - previous) * 1000:7.1f} ms")
+            previous = at
+        total = (previous - self.started) * 1000
+        lines.append(f"  {'total':<12} {total:7.1f} ms ({'within' if total <= target_ms else 'over'} the {target_ms:.0f} ms target)")
+        print("Startup:\n" + "\n".join(lines), file=sys.stderr)
@@ -1,36 +1,258 @@
-from PySide6.QtWidgets import QLabel, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QFrame
-from PySide6.QtGui import QPixmap, QImage, QIcon, QMouseEvent
-from PySide6.QtCore import QSize, QObject, Signal, QPointF, Qt
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QFormLayout, QSlider, QComboBox, QListView, QAbstractItemView, QStyledItemDelegate, QStyleOptionViewItem
+from PySide6.QtGui import QPixmap, QImage, QImageReader, QImageIOHandler, QIcon, QPainter, QColor, QPalette
+from PySide6.QtCore import QSize, QObject, Signal, QPointF, QRect, QRectF, Qt, QEvent, QAbstractListModel, QAbstractItemModel, QModelIndex
+import math
 import os
 
+from adjustments import Adjustment, AdjustmentPipeline, readAdjustedRegion
+from memory import memoryBudget, SpillFile
+from resampler import resampler
+from thumbnails import thumbnailCache
+from tiles import needsTiling, readImageRegion
+
+BLEND_MODES = ("normal", "multiply", "screen", "overlay", "add", "difference")  # Implemented in blending.py
+
 class Layer(QObject):
     visibilityChanged = Signal()
     selectionChanged = Signal()
+    appearanceChanged = Signal()  # Opacity or blend mode
+    adjustmentsChanged = Signal()
+    pixmapReady = Signal()  # A high-quality or newly adjusted display pixmap replaced the one shown
 
-    def __init__(self, imagepath: str):
+    def __init__(self, imagepath: str, image: QImage | None = None, spill=None):
+        """Create a layer from an image file, an already decoded image, or pixels in mapped
+        storage (a SpillFile or a project chunk) that are only paged in when used"""
         super().__init__()
-        self.pixmap = QPixmap.fromImage(QImage(imagepath))
+        self.path = imagepath
+        self.sourceStamp = None  # (mtime, size) of the file the image was decoded from
+        self.clipReadable = False  # Whether regions of the image can be decoded straight from the file
+        if spill is not None:
+            image = spill.image()  # Only looked at for its size and format here
+        elif image is None:
+            reader = QImageReader(imagepath)
+            if needsTiling(reader.size()) and reader.supportsOption(QImageIOHandler.ImageOption.ClipRect):
+                # Too large to decode up front; regions are decoded from the file as they are shown
+                self.clipReadable = True
+                image_size = reader.size()
+                image_has_alpha = reader.imageFormat() != QImage.Format.Format_Invalid and QImage(1, 1, reader.imageFormat()).hasAlphaChannel()
+            else:
+                image = reader.read()  # Decode once; the pixmap is uploaded from the same image
+            self.sourceStamp = self.fileStamp()
+        if image is not None:
+            image_size = image.size()
+            image_has_alpha = image.hasAlphaChannel()
+        # Original image; None while evicted (or never decoded when clip-readable or mapped)
+        self.cachedImage = image if spill is None else None
+        self.cachedPixmap: QPixmap | None = None  # Full-resolution display pixmap, created on first use
+        self.pixmapLive = False  # Whether pixmaps are rebuilt with the fast filter (during a handle drag)
+        self.proxies: dict[int, QPixmap] = {}  # Reduced display pixmaps by level, each half the previous size
+        self.pixmapKeys: dict[int, tuple] = {}  # Level -> pixmapKey its pixmap was made for; older while adjustments are re-evaluated
+        self.spill = spill  # Mapped pixels of an evicted image that has no source file (or a project chunk)
+        self.imageSize = image_size
+        self.imageHasAlpha = image_has_alpha
+        self.tiled = needsTiling(image_size)  # Shown as tiles that are loaded only while on screen
+        self.imageRevision = 0  # Bumped when the pixels change (not when they are reloaded)
+        self.pixmapRevision = 0  # Bumped when the displayed pixmap changes
+        self.loading = False  # Shows an import placeholder until its image is decoded
         self.visible = True
         self.selected = False
-        self.image = QImage(imagepath)  # Store original image for pixel checking
         self.opacity = 1
+        self.blendMode = "normal"  # One of BLEND_MODES
         self.position = {'x': 0, 'y': 0}
         self.name = os.path.basename(imagepath)
-        
+        self.alphaMask = None  # Packed 1-bit alpha mask of the image, built lazily
+        self.alphaMaskKey = None  # imageRevision the mask was built from
+        self.scaleX = 1.0
+        self.scaleY = 1.0
+        self.mipmaps: list[QImage] = []  # Halving pyramid of the image, built lazily
+        self.adjustments: list[Adjustment] = []  # Applied in order whenever the layer is shown or exported
+        self.adjustmentRevision = 0  # Bumped when the adjustments change
+        self.adjustmentsLive = False  # Whether a slider is being dragged, so they are evaluated at half the shown size
+        self.pipeline = AdjustmentPipeline()  # Adjusted mip levels, with each node's output memoized
+        memoryBudget.update(self)
+
+    @property
+    def image(self) -> QImage:
+        """Full-resolution source image, reloaded on demand after eviction"""
+        if self.cachedImage is None:
+            if self.spill is not None:
+                self.cachedImage = self.spill.image()
+            else:
+                self.cachedImage = QImage(self.path)
+            memoryBudget.update(self)
+        else:
+            memoryBudget.touch(self)
+        return self.cachedImage
+
+    @property
+    def pixmap(self) -> QPixmap:
+        """Pixmap at the layer's current scale, recreated on demand after eviction"""
+        if self.cachedPixmap is None or self.pixmapKeys.get(0) != self.pixmapKey(0):
+            self.cachedPixmap = self.buildPixmap(0, self.pixmapLive)
+            memoryBudget.update(self)
+        else:
+            memoryBudget.touch(self)
+        return self.cachedPixmap
+
+    def fileStamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def memoryUsage(self) -> int:
+        """Bytes of decoded pixel data currently held by this layer"""
+        usage = 0
+        if self.cachedImage is not None:
+            usage += self.cachedImage.sizeInBytes()
+        if self.cachedPixmap is not None:
+            usage += self.cachedPixmap.width() * self.cachedPixmap.height() * 4
+        usage += sum(proxy.width() * proxy.height() * 4 for proxy in self.proxies.values())
+        usage += sum(mip.sizeInBytes() for mip in self.mipmaps[1:])
+        usage += self.pipeline.memoryUsage()
+        if self.alphaMask is not None:
+            usage += len(self.alphaMask[0])
+        return usage
+
+    def evictPixmap(self):
+        """Drop the display pixmap and derived caches; they are rebuilt on demand"""
+        self.cachedPixmap = None
+        self.proxies = {}
+        self.pixmapKeys = {}
+        self.mipmaps = []
+        self.pipeline.clear()
+        resampler.cancel(self)
+
+    def evictImage(self, spill: bool = False):
+        """Drop the decoded image too, spilling it to disk if it cannot be re-read from its file
+
+        spill=True spills it even if it could be re-read, so it comes back without decoding.
+        """
+        self.evictPixmap()
+        if self.cachedImage is None:
+            return
+        # Tiled layers that cannot be decoded region by region keep their pixels in a mapped spill
+        # file, so showing a few tiles only pages in those rows instead of re-reading the whole file
+        if self.spill is None and (spill or self.sourceStamp is None or self.sourceStamp != self.fileStamp()
+                                   or (self.tiled and not self.clipReadable)):
+            self.spill = SpillFile(self.cachedImage)
+        self.cachedImage = None
+
+    def release(self):
+        """Forget all pixel data; called when the layer leaves the composition for good"""
+        memoryBudget.untrack(self)
+        resampler.cancel(self)
+        thumbnailCache.forget(self)
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def decodesRegionsFromFile(self) -> bool:
+        """Whether readRegion decodes from the source file instead of a decoded image"""
+        return self.clipReadable and self.cachedImage is None and self.spill is None and self.sourceStamp == self.fileStamp()
+
+    def readRegion(self, rect: QRect, size: QSize, smooth: bool = True) -> QImage:
+        """Pixels of rect (image coordinates) resampled to size, touching as little of the image as possible"""
+        return self.regionReader(smooth)(rect, size)
+
+    def regionReader(self, smooth: bool = True):
+        """readRegion over the pixels the layer has now, as a function of (rect, size)
+
+        It holds on to the decoded image, spill mapping or source file and to a copy of the
+        adjustments, and never touches the memory budget, so it can run on pool threads while
+        the layer is edited or evicted.
+        """
+        if self.decodesRegionsFromFile():
+            path = self.path
+            read = lambda rect, size: readImageRegion(path, rect, size)
+        else:
+            if self.cachedImage is not None:
+                source = self.image
+            elif self.spill is not None:
+                source = self.spill.image()  # Read through the mapping without making the image resident
+            else:
+                source = self.image
+            mode = Qt.TransformationMode.SmoothTransformation if smooth else Qt.TransformationMode.FastTransformation
+            def read(rect: QRect, size: QSize) -> QImage:
+                region = source.copy(rect)
+                if region.size() == size:
+                    return region
+                return region.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio, mode)
+        if not self.adjustments:
+            return read
+        image_size = QSize(self.imageSize)
+        adjustments = [adjustment.copy() for adjustment in self.adjustments]
+        return lambda rect, size: readAdjustedRegion(read, rect, size, image_size, adjustments)
+
     def toggleVisibility(self):
-        self.setSelected(not self.selected)
-        # print(f"Layer {self.name} visibility toggled to {self.visible}")
+        self.setVisible(not self.visible)
+
+    def setVisible(self, visible: bool):
+        if self.visible != visible:
+            self.visible = visible
+            self.visibilityChanged.emit()
     
+    def setOpacity(self, opacity: float):
+        if self.opacity != opacity:
+            self.opacity = opacity
+            self.appearanceChanged.emit()
+
+    def setBlendMode(self, mode: str):
+        if self.blendMode != mode:
+            self.blendMode = mode
+            self.appearanceChanged.emit()
+
+    def setAdjustments(self, adjustments: list[Adjustment]):
+        """Replace the adjustment stack; nodes that are unchanged keep their memoized output"""
+        self.adjustments = adjustments
+        self.adjustmentsEdited(False)
+
+    def setAdjustmentParam(self, index: int, name: str, value: int, live: bool = False):
+        """Change one parameter; with live=True (while its slider is dragged) the layer is
+        shown from a coarser evaluation until the parameter is set again with live=False"""
+        if self.adjustments[index].params[name] != value or self.adjustmentsLive != live:
+            self.adjustments[index].params[name] = value
+            self.adjustmentsEdited(live)
+
+    def adjustmentsEdited(self, live: bool):
+        self.adjustmentsLive = live
+        self.adjustmentRevision += 1
+        # The pixmaps are kept and shown until the adjustments are evaluated again (see buildPixmap)
+        self.pixmapRevision += 1
+        memoryBudget.update(self)
+        self.adjustmentsChanged.emit()
+
     def setSelected(self, selected: bool):
         if self.selected != selected:
             self.selected = selected
             self.selectionChanged.emit()
             # print(f"Layer {self.name} selection changed to {self.selected}")
     
+    def boundingRect(self) -> QRectF:
+        """Bounds of the layer in scene coordinates"""
+        size = self.scaledSize()
+        return QRectF(self.position['x'], self.position['y'], size.width(), size.height())
+
+    def getAlphaMask(self):
+        """Return (bits, bytes_per_line) of the packed alpha mask, or None if the image is opaque"""
+        if not self.imageHasAlpha:
+            return None
+        if self.alphaMaskKey != self.imageRevision:
+            import numpy as np
+            alpha = self.image.convertToFormat(QImage.Format.Format_Alpha8)
+            alpha_bytes = np.frombuffer(alpha.constBits(), np.uint8).reshape(alpha.height(), alpha.bytesPerLine())
+            # One bit per pixel, least significant bit first, set wherever alpha is not zero
+            mask = np.packbits(alpha_bytes[:, :alpha.width()] > 0, axis=1, bitorder="little")
+            self.alphaMask = (mask.tobytes(), mask.shape[1])
+            self.alphaMaskKey = self.imageRevision
+        return self.alphaMask
+
     def containsPoint(self, point: QPointF) -> bool:
         """Check if the given point is within this layer's bounds and on a non-transparent pixel"""
         x, y = self.position['x'], self.position['y']
-        w, h = self.pixmap.width(), self.pixmap.height()
+        size = self.scaledSize()
+        w, h = size.width(), size.height()
         
         # First check if point is within bounds
         if not (x <= point.x() <= x + w and y <= point.y() <= y + h):
@@ -44,71 +266,308 @@ class Layer(QObject):
         if rel_x < 0 or rel_x >= w or rel_y < 0 or rel_y >= h:
             return False
         
-        # Convert pixmap to image to get pixel color
-        pixmap_image = self.pixmap.toImage()
-        pixel_color = pixmap_image.pixelColor(rel_x, rel_y)
+        if not self.imageHasAlpha:
+            return True
+        
+        if self.tiled:
+            # Too large for a full mask; sample the one pixel instead
+            image_x = min(rel_x * self.imageSize.width() // w, self.imageSize.width() - 1)
+            image_y = min(rel_y * self.imageSize.height() // h, self.imageSize.height() - 1)
+            return self.readRegion(QRect(image_x, image_y, 1, 1), QSize(1, 1)).pixelColor(0, 0).alpha() > 0
         
-        # Check if the pixel is non-transparent (alpha > 0)
-        return pixel_color.alpha() > 0
+        mask = self.getAlphaMask()
+        if mask is None:
+            return True
+        
+        # The mask is built from the original image, so it stays valid while the layer is scaled
+        bits, bytes_per_line = mask
+        image_x = rel_x * self.imageSize.width() // w
+        image_y = rel_y * self.imageSize.height() // h
+        return bool((bits[image_y * bytes_per_line + (image_x >> 3)] >> (image_x & 7)) & 1)
     
     def setPosition(self, x: float, y: float):
         """Set the position of the layer"""
         self.position['x'] = int(x)
         self.position['y'] = int(y)
     
-    def setScale(self, scale_x: float, scale_y: float):
-        """Set the scale of the layer"""
-        original_pixmap = QPixmap.fromImage(self.image)
-        new_width = int(original_pixmap.width() * scale_x)
-        new_height = int(original_pixmap.height() * scale_y)
-        self.pixmap = original_pixmap.scaled(new_width, new_height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    def setImage(self, image: QImage, from_source: bool = False):
+        """Replace the source image; derived caches are rebuilt lazily from it
+
+        from_source tells that the image was decoded from self.path, so after eviction it
+        can be re-read from there instead of being spilled to disk.
+        """
+        self.cachedImage = image
+        self.imageSize = image.size()
+        self.imageHasAlpha = image.hasAlphaChannel()
+        self.tiled = needsTiling(self.imageSize)
+        self.imageRevision += 1
+        self.sourceStamp = self.fileStamp() if from_source else None
+        self.clipReadable = from_source and self.clipReadable
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+        self.mipmaps = []
+        self.pipeline.clear()
+        self.loading = False
+        thumbnailCache.forget(self)
+        self.setScale(self.scaleX, self.scaleY)
+
+    def getMipmap(self, width: int, height: int) -> QImage:
+        """Smallest mip level that is still at least width x height, building levels on demand"""
+        if not self.mipmaps:
+            self.mipmaps = [self.image]
+        level = 0
+        while True:
+            mip = self.mipmaps[level]
+            half_width, half_height = mip.width() // 2, mip.height() // 2
+            if half_width < max(width, 1) or half_height < max(height, 1):
+                return mip
+            level += 1
+            if level == len(self.mipmaps):
+                self.mipmaps.append(mip.scaled(half_width, half_height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation))
+                memoryBudget.update(self)
     
-    def getScale(self):
-        """Get the current scale of the layer"""
-        if self.image.width() == 0 or self.image.height() == 0:
-            return 1.0, 1.0
-        scale_x = self.pixmap.width() / self.image.width()
-        scale_y = self.pixmap.height() / self.image.height()
-        return scale_x, scale_y
+    def displayImage(self, width: int, height: int) -> QImage:
+        """Mip level for showing the layer at width x height, with the adjustments applied
+
+        Adjustments are evaluated at the resolution of that mip level, so only showing or
+        exporting the layer at full size pays for evaluating them on every pixel.
+        """
+        if not self.adjustments:
+            return self.getMipmap(width, height)
+        evaluate = self.adjustedImage(width, height)
+        adjusted = evaluate()
+        memoryBudget.update(self)
+        return adjusted
+
+    def adjustedImage(self, width: int, height: int):
+        """displayImage with the adjustments as they are now, as a function that can run on pool threads"""
+        if self.adjustmentsLive:
+            width, height = width // 2, height // 2
+        mip = self.getMipmap(width, height)
+        key = (self.imageRevision, mip.width(), mip.height())
+        adjustments = [adjustment.copy() for adjustment in self.adjustments]
+        pipeline, scale = self.pipeline, mip.width() / self.imageSize.width()
+        return lambda: pipeline.evaluate(key, mip, adjustments, scale)
     
-    def widget(self):
-        def onPressed(event: QMouseEvent):
-            self.selected = not self.selected
-            self.selectionChanged.emit()
-        widget = QWidget()
-        # widget.mousePressEvent = onPressed
-        layout = QHBoxLayout()
-        widget.setLayout(layout)
-        label = QLabel(self.name)
-        layout.addWidget(label)
-        visibility_button = QPushButton()
-        visibility_button.setIcon(QIcon("./assets/eye.png"))
-        visibility_button.clicked.connect(self.toggleVisibility)
-        layout.addStretch()
-        layout.addWidget(visibility_button)
-        
-        # Update widget style based on selection
-        if self.selected:
-            widget.setStyleSheet("QWidget { background-color: #666666; border-radius: 3px; }")
+    def pixmapSize(self, level: int) -> QSize:
+        size = self.scaledSize()
+        return QSize(max(1, size.width() >> level), max(1, size.height() >> level))
+
+    def pixmapKey(self, level: int) -> tuple:
+        """Identifies the pixmap a level should show, so late resampling results can be recognised"""
+        size = self.pixmapSize(level)
+        return self.imageRevision, self.adjustmentRevision, self.adjustmentsLive, size.width(), size.height()
+
+    def buildPixmap(self, level: int, live: bool) -> QPixmap:
+        """Display pixmap at a proxy level, without blocking on a high-quality resample
+
+        With live=True (during a handle drag) it is resampled from the nearest mip level with a
+        fast filter. Otherwise the fast version is returned as a stand-in, and a smooth resample
+        of the same mip level runs on the resampler's pool and replaces it. Adjustments are thus
+        evaluated at no more than twice the shown size; only export evaluates them at full size.
+
+        When only the adjustments changed, the pixmap shown so far is returned as it is, and
+        they are evaluated on the resampler's pool instead (see requestAdjusted).
+        """
+        size = self.pixmapSize(level)
+        held = self.cachedPixmap if level == 0 else self.proxies.get(level)
+        if self.adjustments and held is not None and held.size() == size:
+            self.requestAdjusted(level, size, live)
+            return held
+        interim = self.displayImage(size.width(), size.height())
+        self.pixmapKeys[level] = self.pixmapKey(level)
+        if interim.size() == size:
+            return QPixmap.fromImage(interim)
+        if not live:
+            resampler.request(self, level, self.pixmapKey(level), interim, size)
+        return QPixmap.fromImage(interim.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.FastTransformation))
+
+    def requestAdjusted(self, level: int, size: QSize, live: bool):
+        """Evaluate the adjustments for a proxy level on the resampler's pool
+
+        Only one evaluation per level runs at a time: while a slider is dragged, the next one
+        starts when the previous result is shown (see onResampled), so the preview keeps up
+        with the slider at the pace the adjustments can be evaluated.
+        """
+        if resampler.isPending(self, level):
+            return
+        evaluate = self.adjustedImage(size.width(), size.height())
+        mode = Qt.TransformationMode.FastTransformation if live else Qt.TransformationMode.SmoothTransformation
+        def make() -> QImage:
+            adjusted = evaluate()
+            return adjusted if adjusted.size() == size else adjusted.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio, mode)
+        resampler.submit((self, level), self.pixmapKey(level), make)
+
+    def onResampled(self, level: int, key: tuple, image: QImage):
+        current, shown = self.pixmapKey(level), self.pixmapKeys.get(level)
+        if key != current:
+            # Scale or pixels changed since it was requested, or the adjustments did and it
+            # is older than what is shown
+            if shown is None or key[0] != current[0] or key[3:] != current[3:] or key[1] < shown[1]:
+                return
+        if level == 0:
+            self.cachedPixmap = QPixmap.fromImage(image)
         else:
-            widget.setStyleSheet("")
-        
-        return widget
+            self.proxies[level] = QPixmap.fromImage(image)
+        self.pixmapKeys[level] = key
+        self.pixmapRevision += 1
+        memoryBudget.update(self)
+        self.pixmapReady.emit()  # Repainting requests the current adjustments if these are stale
 
-class LayersWindow(QWidget):
+    def proxyLevel(self, device_scale: float) -> int:
+        """Proxy level to draw with when one scene unit covers device_scale device pixels
 
-    class LayerWidget(QWidget):
-        def __init__(self, layer: Layer):
-            super().__init__()
-            self.layer = layer
-            layout = QHBoxLayout()
-            self.setLayout(layout)
-            self.label = QLabel(layer.name)
-            layout.addWidget(self.label)
-            layout.addStretch()
-        
-        def toggleVisibility(self):
-            self.layer.visible = not self.layer.visible
+        Level n is the display pixmap halved n times, and the level picked is the smallest
+        one that is still at least as large as the layer appears on screen, so level 0
+        (full resolution) is only used from 1:1 upwards.
+        """
+        if device_scale >= 1:
+            return 0
+        size = self.scaledSize()
+        max_level = int(math.log2(min(size.width(), size.height())))
+        return min(int(math.log2(1 / device_scale)), max_level)
+
+    def getProxy(self, level: int) -> QPixmap:
+        """Display pixmap at the given proxy level, resampled from the mip pyramid on first use"""
+        if level == 0:
+            return self.pixmap
+        proxy = self.proxies.get(level)
+        if proxy is None or self.pixmapKeys.get(level) != self.pixmapKey(level):
+            proxy = self.buildPixmap(level, self.pixmapLive)
+            self.proxies[level] = proxy
+            memoryBudget.update(self)
+        else:
+            memoryBudget.touch(self)
+        return proxy
+
+    def setScale(self, scale_x: float, scale_y: float, live: bool = False):
+        """Set the scale of the layer
+
+        Display pixmaps are rebuilt lazily, at the resolution they are drawn at. With live=True
+        (during a handle drag) they are resampled from the nearest mip level with a fast filter;
+        calling again with live=False switches back to high-quality resampling, done off the
+        GUI thread (see buildPixmap).
+        """
+        self.scaleX, self.scaleY = scale_x, scale_y
+        self.pixmapLive = live
+        self.cachedPixmap = None
+        self.proxies = {}
+        self.pixmapKeys = {}
+        self.pixmapRevision += 1
+        memoryBudget.update(self)
+    
+    def scaledSize(self) -> QSize:
+        """Size of the layer in scene coordinates at its current scale"""
+        return QSize(max(1, int(self.imageSize.width() * self.scaleX)), max(1, int(self.imageSize.height() * self.scaleY)))
+
+    def getScale(self):
+        """Get the current scale of the layer"""
+        return self.scaleX, self.scaleY
+
+class LayersModel(QAbstractListModel):
+    """List model over the composition's layers, topmost layer first"""
+    LayerRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, parent: QObject | None = None):
+        super().__init__(parent)
+        self.layers: list[Layer] = []
+        self.rows: dict[Layer, int] = {}
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.layers)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        layer = self.layers[len(self.layers) - 1 - index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return layer.name
+        if role == self.LayerRole:
+            return layer
+        return None
+
+    def setLayers(self, layers: list[Layer]):
+        """Reset the model only when layers were added, removed or reordered"""
+        if self.layers == layers:
+            return
+        self.beginResetModel()
+        self.layers = list(layers)
+        self.rows = {layer: len(layers) - 1 - idx for idx, layer in enumerate(layers)}
+        self.endResetModel()
+
+    def refreshLayers(self, layers):
+        """Repaint just the rows of the given layers"""
+        for layer in layers:
+            row = self.rows.get(layer)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+class LayerDelegate(QStyledItemDelegate):
+    """Paints a layer row (thumbnail, name, eye button, divider) without creating widgets"""
+    layerClicked = Signal(Layer, bool)
+    ROW_HEIGHT = 36
+    EYE_SIZE = 20
+
+    def __init__(self, parent: QObject | None = None):
+        super().__init__(parent)
+        self.eyeIcon = QIcon("./assets/eye.png")  # Loaded once for all rows
+
+    def thumbnailRect(self, row_rect: QRect) -> QRect:
+        side = self.ROW_HEIGHT - 8
+        return QRect(row_rect.left() + 8, row_rect.center().y() - side // 2, side, side)
+
+    def eyeRect(self, row_rect: QRect) -> QRect:
+        return QRect(row_rect.right() - self.EYE_SIZE - 8, row_rect.center().y() - self.EYE_SIZE // 2, self.EYE_SIZE, self.EYE_SIZE)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        layer: Layer = index.data(LayersModel.LayerRole)
+        rect = option.rect
+        painter.save()
+        if layer.selected:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor("#666666"))
+            painter.drawRoundedRect(rect.adjusted(2, 2, -2, -2), 3, 3)
+        # Thumbnails are made in the background; the row is repainted when its thumbnail is ready
+        thumbnail = thumbnailCache.thumbnail(layer)
+        thumbnail_rect = self.thumbnailRect(rect)
+        if thumbnail is not None:
+            size = thumbnail.size().scaled(thumbnail_rect.size(), Qt.AspectRatioMode.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(thumbnail_rect.center())
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawPixmap(target, thumbnail)
+        painter.setPen(option.palette.color(QPalette.ColorRole.Text))
+        text_rect = rect.adjusted(thumbnail_rect.right() + 8 - rect.left(), 0, -(self.EYE_SIZE + 16), 0)
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, layer.name)
+        eye_mode = QIcon.Mode.Normal if layer.visible else QIcon.Mode.Disabled
+        self.eyeIcon.paint(painter, self.eyeRect(rect), Qt.AlignmentFlag.AlignCenter, eye_mode)
+        # Divider after each row except the last one
+        if index.row() < index.model().rowCount() - 1:
+            painter.setPen(option.palette.color(QPalette.ColorRole.Mid))
+            painter.drawLine(rect.left(), rect.bottom(), rect.right(), rect.bottom())
+        painter.restore()
+
+    def editorEvent(self, event: QEvent, model: QAbstractItemModel, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            layer: Layer = index.data(LayersModel.LayerRole)
+            if self.eyeRect(option.rect).contains(event.position().toPoint()):
+                layer.toggleVisibility()
+            else:
+                ctrl_pressed = event.modifiers() == Qt.KeyboardModifier.ControlModifier
+                self.layerClicked.emit(layer, ctrl_pressed)
+            return True
+        return super().editorEvent(event, model, option, index)
+
+class LayersWindow(QWidget):
+    layerClicked = Signal(Layer, bool)
+    opacityChanged = Signal(float, bool)  # New opacity of the selected layers, whether the edit is finished
+    opacityCommitted = Signal()  # The opacity slider was released
+    blendModeChanged = Signal(str)
 
     def __init__(self):
         super().__init__()
@@ -117,23 +576,48 @@ class LayersWindow(QWidget):
         self.layout: QVBoxLayout = QVBoxLayout()
         self.setLayout(self.layout)
 
-    def clearLayout(self):
-        while self.layout.count():
-            child = self.layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
+        # Opacity and blend mode of the selected layers
+        settings = QFormLayout()
+        self.opacitySlider = QSlider(Qt.Orientation.Horizontal)
+        self.opacitySlider.setRange(0, 100)
+        self.opacitySlider.valueChanged.connect(lambda value: self.opacityChanged.emit(value / 100, not self.opacitySlider.isSliderDown()))
+        self.opacitySlider.sliderReleased.connect(self.opacityCommitted)
+        settings.addRow("Opacity", self.opacitySlider)
+        self.blendModeBox = QComboBox()
+        self.blendModeBox.addItems([mode.capitalize() for mode in BLEND_MODES])
+        self.blendModeBox.activated.connect(lambda index: self.blendModeChanged.emit(BLEND_MODES[index]))
+        settings.addRow("Blend", self.blendModeBox)
+        self.layout.addLayout(settings)
+        self.showLayerSettings([])
+
+        self.model = LayersModel(self)
+        self.delegate = LayerDelegate(self)
+        self.delegate.layerClicked.connect(self.layerClicked)
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(self.delegate)
+        self.view.setUniformItemSizes(True)  # Lets the view lay out and paint only visible rows
+        self.view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.layout.addWidget(self.view)
+        thumbnailCache.thumbnailReady.connect(self.onThumbnailReady)
 
     def update(self, layers: list[Layer]):
-        self.clearLayout()
-
-        for idx, layer in enumerate(layers[::-1]):
-            layer_widget = layer.widget()
-            self.layout.addWidget(layer_widget)
-            # Add divider after each widget except the last one
-            if idx < len(layers) - 1:
-                divider = QFrame()
-                divider.setFrameShape(QFrame.Shape.HLine)
-                divider.setFrameShadow(QFrame.Shadow.Sunken)
-                divider.setMaximumHeight(1)
-                self.layout.addWidget(divider)
-        self.layout.addStretch()
\ No newline at end of file
+        self.model.setLayers(layers)
+
+    def refreshLayers(self, layers):
+        self.model.refreshLayers(layers)
+
+    def onThumbnailReady(self, layer: Layer):
+        self.model.refreshLayers((layer,))
+
+    def showLayerSettings(self, selected: list[Layer]):
+        """Show the opacity and blend mode of the first selected layer, without emitting edits"""
+        self.opacitySlider.setEnabled(bool(selected))
+        self.blendModeBox.setEnabled(bool(selected))
+        if not selected or self.opacitySlider.isSliderDown():
+            return
+        self.opacitySlider.blockSignals(True)
+        self.opacitySlider.setValue(round(selected[0].opacity * 100))
+        self.opacitySlider.blockSignals(False)
+        self.blendModeBox.setCurrentIndex(BLEND_MODES.index(selected[0].blendMode))
@@ -1,9 +1,16 @@
+import time
+STARTED = time.perf_counter()  # Startup is timed from here, before the heavy imports
+import argparse
+import os
 import sys
-from PySide6.QtWidgets import QApplication, QMainWindow, QMenuBar, QDockWidget
-from PySide6.QtGui import QGuiApplication
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QMainWindow, QMenuBar, QDockWidget, QFileDialog, QLabel, QInputDialog, QStackedWidget, QTabWidget
+from PySide6.QtGui import QGuiApplication, QIcon, QImageReader, QKeySequence
+from PySide6.QtCore import Qt, QTimer
 
 from composition import Composition
+from instrumentation import StartupTimer, profiler
+from memory import memoryBudget
+IMPORTED = time.perf_counter()
 
 class MainWindow(QMainWindow):
 
@@ -14,22 +21,65 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Photo Editor")
-        self.activeComposition = Composition()
-        self.compositions = [self.activeComposition]
+        self.activeComposition: Composition | None = None
+        self.compositions: list[Composition] = []
 
+        # Menu actions go to whichever composition is active when they are triggered
         mainMenuBar = QMenuBar()
         fileMenu = mainMenuBar.addMenu("File")
-        fileMenu.addAction("Import Image", self.activeComposition.importImage)
-        fileMenu.addAction("Export Image", self.activeComposition.exportImage)
+        fileMenu.addAction("New Composition", QKeySequence.StandardKey.New, self.newComposition)
+        fileMenu.addAction("Open Project...", QKeySequence("Ctrl+O"), lambda: self.runOnActive("openProject"))
+        fileMenu.addAction("Save Project", QKeySequence("Ctrl+S"), lambda: self.runOnActive("saveProject"))
+        fileMenu.addAction("Save Project As...", QKeySequence("Ctrl+Shift+S"), lambda: self.runOnActive("saveProjectAs"))
+        fileMenu.addAction("Close Composition", QKeySequence("Ctrl+W"), lambda: self.closeComposition(self.tabs.currentIndex()))
+        fileMenu.addSeparator()
+        fileMenu.addAction("Import Image", lambda: self.runOnActive("importImage"))
+        fileMenu.addAction("Export Image", lambda: self.runOnActive("exportImage"))
+        editMenu = mainMenuBar.addMenu("Edit")
+        self.undoAction = editMenu.addAction("Undo", QKeySequence.StandardKey.Undo, lambda: self.runOnActive("undo"))
+        self.redoAction = editMenu.addAction("Redo", QKeySequence("Ctrl+Shift+Z"), lambda: self.runOnActive("redo"))
+        editMenu.addSeparator()
+        editMenu.addAction("Delete Layers", QKeySequence.StandardKey.Delete, lambda: self.runOnActive("deleteSelectedLayers"))
+        viewMenu = mainMenuBar.addMenu("View")
+        self.hudAction = viewMenu.addAction("Performance HUD")
+        self.hudAction.setCheckable(True)
+        self.hudAction.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        self.hudAction.toggled.connect(self.setPerformanceHudVisible)
+        self.traceAction = viewMenu.addAction("Record Performance Trace")
+        self.traceAction.setCheckable(True)
+        self.traceAction.toggled.connect(self.setTraceRecording)
+        viewMenu.addSeparator()
+        viewMenu.addAction("Memory Budget...", self.editMemoryBudget)
         self.setMenuBar(mainMenuBar)
 
-        # Layers window
+        # Layers window, one page per composition
         self.layersDockWidget = QDockWidget()
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.layersDockWidget)
         self.layersDockWidget.setWindowTitle("Layers")
+        self.layersStack = QStackedWidget()
+        self.layersDockWidget.setWidget(self.layersStack)
 
-        self.setCentralWidget(self.activeComposition.previewWindow)
-        self.layersDockWidget.setWidget(self.activeComposition.layersWindow)
+        # Adjustments window
+        self.adjustmentsDockWidget = QDockWidget()
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.adjustmentsDockWidget)
+        self.adjustmentsDockWidget.setWindowTitle("Adjustments")
+        self.adjustmentsStack = QStackedWidget()
+        self.adjustmentsDockWidget.setWidget(self.adjustmentsStack)
+
+        # One tab per open composition; only the current one keeps its view and pixels in memory
+        self.tabs = QTabWidget()
+        self.tabs.setDocumentMode(True)
+        self.tabs.setTabsClosable(True)
+        self.tabs.tabCloseRequested.connect(self.closeComposition)
+        self.tabs.currentChanged.connect(lambda index: self.setActiveComposition(self.compositions[index]) if index >= 0 else None)
+        self.setCentralWidget(self.tabs)
+        self.newComposition()
+
+        # Decoded pixel memory against the budget
+        self.memoryLabel = QLabel()
+        self.statusBar().addPermanentWidget(self.memoryLabel)
+        memoryBudget.usageChanged.connect(self.showMemoryUsage)
+        self.showMemoryUsage(memoryBudget.used, memoryBudget.budget)
 
         screen_geometry = QGuiApplication.primaryScreen().availableGeometry()
         screen_width = screen_geometry.width()
@@ -41,13 +91,122 @@ class MainWindow(QMainWindow):
         y_pos = int((screen_height - initial_window_height) / 2)
         self.setGeometry(x_pos, y_pos, initial_window_width, initial_window_height)
 
+        if os.environ.get("PHOTO_EDITOR_PROFILE"):
+            self.hudAction.setChecked(True)
+
+    def newComposition(self):
+        composition = Composition()
+        self.compositions.append(composition)
+        self.layersStack.addWidget(composition.layersWindow)
+        self.adjustmentsStack.addWidget(composition.adjustmentsWindow)
+        self.tabs.addTab(composition.previewWindow, composition.title())
+        self.tabs.setCurrentWidget(composition.previewWindow)
+
+    def closeComposition(self, index: int):
+        if len(self.compositions) == 1:
+            self.newComposition()  # Keep one composition open
+        composition = self.compositions.pop(index)
+        if composition is self.activeComposition:
+            composition.history.changed.disconnect(self.updateUndoActions)
+            self.activeComposition = None
+        self.tabs.removeTab(index)
+        self.layersStack.removeWidget(composition.layersWindow)
+        self.adjustmentsStack.removeWidget(composition.adjustmentsWindow)
+        composition.close()
+
     def setActiveComposition(self, composition: Composition):
+        previous = self.activeComposition
+        if previous is composition:
+            return
+        if previous is not None:
+            previous.history.changed.disconnect(self.updateUndoActions)
+            previous.hibernate()
+            if previous.thumbnail is not None:
+                self.tabs.setTabIcon(self.compositions.index(previous), QIcon(previous.thumbnail))
         self.activeComposition = composition
-        self.setCentralWidget(self.activeComposition.previewWindow)
-        self.layersDockWidget.setWidget(self.activeComposition.layersWindow)
+        composition.wake()
+        self.tabs.setTabIcon(self.compositions.index(composition), QIcon())
+        self.tabs.setCurrentWidget(composition.previewWindow)
+        self.layersStack.setCurrentWidget(composition.layersWindow)
+        self.adjustmentsStack.setCurrentWidget(composition.adjustmentsWindow)
+        composition.history.changed.connect(self.updateUndoActions)
+        self.updateUndoActions()
+        self.updateProfiler()
+
+    def openFiles(self, paths: list[str]):
+        """Open projects in tabs of their own and import images as layers of the active composition"""
+        images = [path for path in paths if not path.endswith(".pep")]
+        if images:
+            self.activeComposition.importFiles(images)
+        for path in paths:
+            if path.endswith(".pep"):
+                if self.activeComposition.layers or self.activeComposition.project is not None:
+                    self.newComposition()
+                self.runOnActive("loadProject", path)
+
+    def runOnActive(self, method: str, *args):
+        """Call a Composition method on the active composition, e.g. from a menu action"""
+        if self.activeComposition is None:
+            return
+        getattr(self.activeComposition, method)(*args)
+        self.tabs.setTabText(self.tabs.currentIndex(), self.activeComposition.title())
+
+    def updateUndoActions(self):
+        history = self.activeComposition.history
+        self.undoAction.setEnabled(history.canUndo())
+        self.redoAction.setEnabled(history.canRedo())
+
+    def showMemoryUsage(self, used: int, budget: int):
+        self.memoryLabel.setText(f"Memory: {used / 2**20:,.0f} / {budget / 2**20:,.0f} MB")
+
+    def editMemoryBudget(self):
+        budget_mb, ok = QInputDialog.getInt(self, "Memory Budget", "Decoded image memory budget (MB):",
+                                            memoryBudget.budget // 2**20, 64, 1024 * 1024, 256)
+        if ok:
+            memoryBudget.setBudget(budget_mb * 2**20)
+
+    def updateProfiler(self):
+        """Profiling only runs while the HUD is shown or a trace is being recorded"""
+        if self.hudAction.isChecked() or self.traceAction.isChecked():
+            profiler.enable()
+            profiler.attachView(self.activeComposition.previewWindow)
+        else:
+            profiler.disable()
+        self.activeComposition.previewWindow.viewport().update()
+
+    def setPerformanceHudVisible(self, visible: bool):
+        profiler.hudVisible = visible
+        self.updateProfiler()
+
+    def setTraceRecording(self, recording: bool):
+        if recording:
+            self.updateProfiler()
+            profiler.startTrace()
+            return
+        save_path, _ = QFileDialog.getSaveFileName(self, "Save Performance Trace", "trace.json", "Chrome Trace Files (*.json)")
+        if save_path:
+            profiler.stopTrace(save_path)
+        else:
+            profiler.trace = None
+        self.updateProfiler()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Photo editor")
+    parser.add_argument("files", nargs="*", help="images to import as layers, or .pep projects to open")
+    parser.add_argument("--startup-report", action="store_true", help="print how long each phase of startup took")
+    args, qt_args = parser.parse_known_args()
+    startup = StartupTimer(STARTED)
+    startup.mark("imports", IMPORTED)
+    app = QApplication(sys.argv[:1] + qt_args)
+    # Images over Qt's default 256 MB decode limit are shown as tiled layers rather than refused
+    QImageReader.setAllocationLimit(0)
+    startup.mark("Qt setup")
     window = MainWindow()
+    startup.mark("window")
     window.show()
+    # Files are streamed in once the empty window is on screen
+    startup.painted.connect(lambda: QTimer.singleShot(0, lambda: window.openFiles(args.files)))
+    if args.startup_report:
+        startup.painted.connect(startup.report)
+    startup.watch(window.activeComposition.previewWindow.viewport())
     sys.exit(app.exec())
\ No newline at end of file
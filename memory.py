@@ -0,0 +1,123 @@
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QObject, QTimer, Signal
+from collections import OrderedDict
+import mmap
+import os
+import tempfile
+
+DEFAULT_BUDGET_MB = 2048
+USAGE_REPORT_INTERVAL = 100  # ms; usage changes on every move of a transform, the label need not
+
+class SpillFile():
+    """Raw pixels of an image in an unlinked temporary file, mapped back in on demand"""
+    def __init__(self, image: QImage):
+        self.width = image.width()
+        self.height = image.height()
+        self.bytesPerLine = image.bytesPerLine()
+        self.format = image.format()
+        self.file = tempfile.TemporaryFile()
+        self.file.write(image.constBits())
+        self.file.flush()
+        # Copy-on-write mapping: pages are read lazily and writes never reach the file
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    def image(self) -> QImage:
+        return QImage(self.map, self.width, self.height, self.bytesPerLine, self.format)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # An image still points into the mapping; it is unmapped once that image is gone
+        self.file.close()
+
+class MemoryBudget(QObject):
+    """Tracks decoded pixel memory per layer and evicts caches when over budget
+
+    Layers are kept in least-recently-touched order. Under pressure, hidden layers go first,
+    then layers outside every registered preview, oldest first; their pixmaps and derived
+    caches are dropped before their images. Layers visible on screen are never evicted,
+    except tiled layers, which read their on-screen tiles from a spill file or the source.
+    """
+    usageChanged = Signal("qint64", "qint64")  # bytes used, budget in bytes
+
+    def __init__(self, budget_bytes: int | None = None):
+        super().__init__()
+        if budget_bytes is None:
+            budget_bytes = int(os.environ.get("PHOTO_EDITOR_MEMORY_BUDGET_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024
+        self.budget = budget_bytes
+        self.layers: OrderedDict = OrderedDict()  # layer -> bytes, least recently touched first
+        self.used = 0
+        self.views = []  # PreviewWindows deciding what is on screen
+        self.reported = None  # (used, budget) last emitted by usageChanged
+        self.reportTimer = QTimer(self)
+        self.reportTimer.setSingleShot(True)
+        self.reportTimer.setInterval(USAGE_REPORT_INTERVAL)
+        self.reportTimer.timeout.connect(self.reportUsage)
+
+    def setBudget(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self.enforce()
+        self.reportUsage()
+
+    def addView(self, view):
+        self.views.append(view)
+
+    def removeView(self, view):
+        if view in self.views:
+            self.views.remove(view)
+
+    def touch(self, layer):
+        if layer in self.layers:
+            self.layers.move_to_end(layer)
+
+    def update(self, layer):
+        """Re-measure a layer after its caches changed, evicting others if needed"""
+        usage = layer.memoryUsage()
+        self.used += usage - self.layers.get(layer, 0)
+        self.layers[layer] = usage
+        self.layers.move_to_end(layer)
+        self.enforce(protected=layer)
+        self.scheduleReport()
+
+    def untrack(self, layer):
+        self.used -= self.layers.pop(layer, 0)
+        self.scheduleReport()
+
+    def scheduleReport(self):
+        """Report usage at most once per interval, however often it changes"""
+        if (self.used, self.budget) != self.reported and not self.reportTimer.isActive():
+            self.reportTimer.start()
+
+    def reportUsage(self):
+        self.reportTimer.stop()
+        if (self.used, self.budget) != self.reported:
+            self.reported = (self.used, self.budget)
+            self.usageChanged.emit(self.used, self.budget)
+
+    def isOnScreen(self, layer, visible_rects: list) -> bool:
+        if not layer.visible:
+            return False
+        bounds = layer.boundingRect()
+        return any(layer in view.layerItems and rect.intersects(bounds) for view, rect in visible_rects)
+
+    def enforce(self, protected=None):
+        if self.used <= self.budget:
+            return
+        visible_rects = [(view, view.visibleSceneRect()) for view in self.views if view.isVisible()]
+        # Hidden layers first, then off-screen ones; least recently touched first within each
+        candidates = [layer for layer in self.layers if layer is not protected and not layer.visible]
+        candidates += [layer for layer in self.layers if layer is not protected and layer.visible
+                       and not self.isOnScreen(layer, visible_rects)]
+        candidates += [layer for layer in self.layers if layer is not protected and layer.visible and layer.tiled
+                       and self.isOnScreen(layer, visible_rects)]
+        for evict in ("evictPixmap", "evictImage"):
+            for layer in candidates:
+                if self.used <= self.budget:
+                    return
+                getattr(layer, evict)()
+                usage = layer.memoryUsage()
+                self.used += usage - self.layers[layer]
+                self.layers[layer] = usage
+
+memoryBudget = MemoryBudget()
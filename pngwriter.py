@@ -0,0 +1,48 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_CHUNK_SIZE = 1 << 16
+
+class PngWriter():
+    """Writes an 8-bit RGBA PNG row by row, so the whole image never has to be in memory"""
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 6):
+        self.width = width
+        self.height = height
+        self.rowsWritten = 0
+        self.file = open(path, "wb")
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = bytearray()
+        self.file.write(PNG_SIGNATURE)
+        # Bit depth 8, color type 6 (RGBA), default compression, filter and interlace methods
+        self.writeChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def writeChunk(self, chunk_type: bytes, data: bytes):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def flushPending(self, final: bool = False):
+        while len(self.pending) >= IDAT_CHUNK_SIZE or (final and self.pending):
+            self.writeChunk(b"IDAT", bytes(self.pending[:IDAT_CHUNK_SIZE]))
+            del self.pending[:IDAT_CHUNK_SIZE]
+
+    def writeRow(self, row: bytes):
+        """Append one scanline of width * 4 RGBA bytes"""
+        self.pending += self.compressor.compress(b"\x00")  # Filter type None
+        self.pending += self.compressor.compress(row)
+        self.rowsWritten += 1
+        self.flushPending()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.pending += self.compressor.flush()
+        self.flushPending(final=True)
+        self.writeChunk(b"IEND", b"")
+        self.file.close()
+
+    def abort(self):
+        """Close without finishing the image, e.g. after a failed or cancelled export"""
+        self.file.close()
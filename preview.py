@@ -1,8 +1,17 @@
-from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsRectItem, QGraphicsEllipseItem
-from PySide6.QtGui import QPainter, QPainter, QKeySequence, QShortcut, QMouseEvent, QPen, QBrush
-from PySide6.QtCore import Qt, Signal, QPointF, QRectF
+from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsPixmapItem, QGraphicsRectItem, QGraphicsEllipseItem, QStyleOptionGraphicsItem
+from PySide6.QtGui import QPainter, QPainter, QKeySequence, QShortcut, QMouseEvent, QPen, QBrush, QImage, QPixmap, QTransform
+from PySide6.QtCore import Qt, Signal, QPointF, QRect, QRectF, QSize, QTimer
+import math
 
+from compositor import RenderLayer, TileCache
+from importer import PLACEHOLDER_COLOR
 from layers import Layer
+from resampler import resampler
+from snapping import SNAP_DISTANCE, SnapIndex
+from spatial import GridIndex
+from tiles import tileGrid
+
+HANDLE_Z_VALUE = 1e9
 
 class TransformHandle(QGraphicsEllipseItem):
     """A circular handle for transforming layers"""
@@ -16,21 +25,278 @@ class TransformHandle(QGraphicsEllipseItem):
         self.setFlag(QGraphicsEllipseItem.GraphicsItemFlag.ItemIsMovable, False)
         self.setFlag(QGraphicsEllipseItem.GraphicsItemFlag.ItemIsSelectable, False)
         self.setCursor(Qt.CursorShape.SizeAllCursor)
+        self.setZValue(HANDLE_Z_VALUE)  # Always above layer items
+        # Keep a constant on-screen size regardless of the view's zoom
+        self.setFlag(QGraphicsEllipseItem.GraphicsItemFlag.ItemIgnoresTransformations, True)
+
+class LayerItem(QGraphicsItem):
+    """Retained scene item for a single layer, updated in place from the layer's state
+
+    The item paints the layer's pixmap directly instead of holding its own copy, so a
+    pixmap evicted by the memory budget is really freed and is only recreated when the
+    item is painted again. When zoomed out it paints a reduced proxy of the layer that
+    matches its on-screen size, so only 1:1 and closer views use the full resolution.
+    """
+    def __init__(self, layer: Layer):
+        super().__init__()
+        self.layer = layer
+        self.size = QSize()  # Scene size of the layer as of the last sync
+        self.pixmapRevision = None  # Layer.pixmapRevision currently shown
+        self.composited = False  # Drawn by the CompositeItem instead; only the selection outline shows
+        self.setData(0, "layer")
+
+        # Selection outline follows the item but is not faded by the layer opacity
+        self.selectionRect = QGraphicsRectItem(self)
+        self.selectionRect.setPen(QPen(Qt.GlobalColor.blue, 2))
+        self.selectionRect.setBrush(QBrush(Qt.GlobalColor.transparent))
+        self.selectionRect.setData(0, "ui_element")
+        self.selectionRect.setFlag(QGraphicsRectItem.GraphicsItemFlag.ItemIgnoresParentOpacity, True)
+        self.selectionRect.setVisible(False)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.size.width(), self.size.height())
+
+    def paint(self, painter: QPainter, option, widget=None):
+        # Device pixels per scene unit, including the zoom and the screen's device pixel ratio
+        device_scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()) * painter.device().devicePixelRatioF()
+        level = self.layer.proxyLevel(device_scale)
+        if level == 0:
+            painter.drawPixmap(0, 0, self.layer.pixmap)
+        else:
+            proxy = self.layer.getProxy(level)
+            painter.drawPixmap(self.boundingRect(), proxy, QRectF(proxy.rect()))
+
+    def sync(self, z: int):
+        """Bring the item in line with its layer, touching only what changed"""
+        layer = self.layer
+        self.setVisible(layer.visible)
+        if not layer.visible:
+            return
+
+        size = layer.scaledSize()
+        if size != self.size:
+            self.prepareGeometryChange()
+            self.size = size
+            self.selectionRect.setRect(0, 0, size.width(), size.height())
+        if layer.pixmapRevision != self.pixmapRevision:
+            self.pixmapRevision = layer.pixmapRevision
+            self.update()
+
+        # These setters are no-ops when the value is unchanged
+        self.setPos(layer.position['x'], layer.position['y'])
+        self.setOpacity(0 if self.composited else layer.opacity)
+        self.setZValue(z)
+        self.selectionRect.setVisible(layer.selected)
+
+class TiledLayerItem(LayerItem):
+    """Scene item for a layer too large for one pixmap, drawn by a grid of tile items
+
+    Only tiles overlapping the viewport exist. They are decoded at the proxy level matching
+    the zoom as they come into view and dropped as soon as they leave it, so memory use
+    follows the visible area rather than the size of the image. Decoding runs on the
+    resampler's pool; until a tile's pixels arrive it shows a placeholder, or its previous
+    pixels when only the adjustments changed.
+    """
+    def __init__(self, layer: Layer):
+        super().__init__(layer)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemHasNoContents, True)
+        self.selectionRect.setZValue(1)  # Above the tiles
+        self.tiles: dict[tuple[int, int, int], tuple[QGraphicsPixmapItem, QRect]] = {}  # (level, column, row) -> tile, image rect
+        self.tilesRevision = (layer.imageRevision, layer.adjustmentRevision)  # Pixels the tiles were read with
+        self.placeholder = QPixmap(1, 1)  # Stretched over tiles still being decoded
+        self.placeholder.fill(PLACEHOLDER_COLOR)
+
+    def paint(self, painter: QPainter, option, widget=None):
+        pass  # The tiles paint the layer
+
+    def clearTiles(self):
+        resampler.cancel(self)
+        for tile, _ in self.tiles.values():
+            self.scene().removeItem(tile)
+        self.tiles.clear()
+
+    def dropTile(self, key: tuple[int, int, int]):
+        resampler.cancel(self, key)
+        self.scene().removeItem(self.tiles.pop(key)[0])
+
+    def sync(self, z: int):
+        super().sync(z)
+        revision = (self.layer.imageRevision, self.layer.adjustmentRevision)
+        if self.layer.visible and self.tilesRevision != revision and self.tilesRevision[0] == revision[0]:
+            # Only the adjustments changed: the tiles keep their pixels until they are decoded again
+            self.tilesRevision = revision
+            read = self.layer.regionReader(smooth=not self.layer.pixmapLive)
+            for key in self.tiles:
+                if not resampler.isPending(self, key):
+                    self.decodeTile(key, read)
+        elif not self.layer.visible or self.tilesRevision != revision:
+            self.clearTiles()
+            self.tilesRevision = revision
+
+    def updateTiles(self, scene_rect: QRectF, device_scale: float):
+        """Create the tiles overlapping scene_rect, drop the others and place them for the current scale"""
+        layer = self.layer
+        if not layer.visible:
+            return
+        image_width, image_height = layer.imageSize.width(), layer.imageSize.height()
+        scale_x = self.size.width() / image_width
+        scale_y = self.size.height() / image_height
+        # Levels of tiles halve image pixels, while proxy levels halve the scaled display size
+        level = layer.proxyLevel(device_scale * max(scale_x, scale_y))
+        local = self.mapRectFromScene(scene_rect)
+        image_rect = QRectF(local.x() / scale_x, local.y() / scale_y, local.width() / scale_x, local.height() / scale_y).toAlignedRect()
+        needed = {(level, col, row): rect for col, row, rect in tileGrid(image_width, image_height, level, image_rect)}
+
+        for key in [key for key in self.tiles if key not in needed]:
+            self.dropTile(key)
+
+        read = None
+        for key, rect in needed.items():
+            if key not in self.tiles:
+                if read is None:
+                    read = layer.regionReader(smooth=not layer.pixmapLive)
+                tile = QGraphicsPixmapItem(self.placeholder, self)
+                tile.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+                tile.setData(0, "tile")
+                self.tiles[key] = (tile, rect)
+                self.decodeTile(key, read)
+            self.placeTile(key)
+
+    def decodeTile(self, key: tuple[int, int, int], read):
+        """Decode a tile on the resampler's pool with read, a Layer.regionReader"""
+        level, rect = key[0], self.tiles[key][1]
+        size = QSize(max(1, math.ceil(rect.width() / (1 << level))), max(1, math.ceil(rect.height() / (1 << level))))
+        resampler.submit((self, key), self.tilesRevision, lambda: read(rect, size))
+
+    def placeTile(self, key: tuple[int, int, int]):
+        """Stretch a tile's pixmap, placeholder or decoded, over its image rect at the current scale"""
+        tile, rect = self.tiles[key]
+        scale_x = self.size.width() / self.layer.imageSize.width()
+        scale_y = self.size.height() / self.layer.imageSize.height()
+        pixmap_size = tile.pixmap().size()
+        tile.setPos(rect.x() * scale_x, rect.y() * scale_y)
+        tile.setTransform(QTransform.fromScale(rect.width() * scale_x / pixmap_size.width(), rect.height() * scale_y / pixmap_size.height()))
+
+    def onResampled(self, key: tuple[int, int, int], revision: tuple, image: QImage):
+        if revision[0] != self.tilesRevision[0] or key not in self.tiles:
+            return  # Dropped, or decoded from pixels that have changed since
+        self.tiles[key][0].setPixmap(QPixmap.fromImage(image))
+        self.placeTile(key)
+        if revision != self.tilesRevision:
+            # Decoded with earlier adjustments, which still beats the older pixels; now the current ones
+            self.decodeTile(key, self.layer.regionReader(smooth=not self.layer.pixmapLive))
+
+class CompositeItem(QGraphicsItem):
+    """Paints the layers that involve blend modes, composited by the export compositor
+
+    Holds every visible layer from the bottom up to the topmost one with a blend mode other
+    than normal; the layers above it stay ordinary items. Composited tiles are cached at the
+    zoom's proxy level, and a change to a layer only drops the tiles under its old and new
+    bounds.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.setZValue(-1)
+        self.setData(0, "composite")
+        self.layers: list[Layer] = []
+        self.states: dict[Layer, tuple] = {}  # What each layer looked like when its tiles were rendered
+        self.bounds = QRectF()
+        self.cache = TileCache()
+
+    def layerState(self, layer: Layer, z: int) -> tuple:
+        return layer.boundingRect(), layer.opacity, layer.blendMode, layer.imageRevision, layer.adjustmentRevision, z
+
+    def setLayers(self, layers: list[Layer]):
+        """Composite these layers from now on, dropping the tiles of any that changed"""
+        states = {layer: self.layerState(layer, z) for z, layer in enumerate(layers)}
+        for layer in set(self.states) | set(states):
+            old, new = self.states.get(layer), states.get(layer)
+            if old != new:
+                if old is not None:
+                    self.cache.invalidate(old[0])
+                if new is not None:
+                    self.cache.invalidate(new[0])
+        bounds = QRectF()
+        for layer in layers:
+            bounds = bounds.united(layer.boundingRect())
+        if bounds != self.bounds:
+            self.prepareGeometryChange()
+            self.bounds = bounds
+        self.layers = list(layers)
+        self.states = states
+        self.update()
+
+    def updateLayers(self, layers):
+        """Like setLayers when only these layers changed, and not in stacking order or blend mode"""
+        for layer in layers:
+            old = self.states.get(layer)
+            if old is None:
+                continue
+            new = self.layerState(layer, old[5])
+            if new != old:
+                self.cache.invalidate(old[0])
+                self.cache.invalidate(new[0])
+                self.states[layer] = new
+                if not self.bounds.contains(new[0]):
+                    self.prepareGeometryChange()
+                    self.bounds = self.bounds.united(new[0])
+        self.update()
+
+    def boundingRect(self) -> QRectF:
+        return self.bounds
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget=None):
+        device_scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()) * painter.device().devicePixelRatioF()
+        level = 0 if device_scale >= 1 else int(math.log2(1 / device_scale))
+        span = self.cache.tileSize << level
+        exposed = option.exposedRect.intersected(self.bounds)
+        render_layers = None  # Only snapshotted when a tile has to be rendered
+        for row in range(math.floor(exposed.top() / span), math.ceil(exposed.bottom() / span)):
+            for col in range(math.floor(exposed.left() / span), math.ceil(exposed.right() / span)):
+                key = (level, col, row)
+                if key not in self.cache.tiles and render_layers is None:
+                    render_layers = [RenderLayer.fromLayer(layer, 1 / (1 << level)) for layer in self.layers]
+                painter.drawImage(self.cache.canvasRect(key), self.cache.tile(key, render_layers))
 
 class PreviewWindow(QGraphicsView):
     layerClicked = Signal(Layer, bool)
     layerTransformed = Signal()  # Signal to notify when layers have been moved
+    transformCommitted = Signal(list)  # (layer, (x, y, scale x, scale y) before, after) for each layer a gesture changed
 
     def __init__(self):
         super().__init__()
         self.scene: QGraphicsScene = QGraphicsScene()
         self.setScene(self.scene)
         self.layers = []  # Store reference to layers for click detection
+        self.layerItems: dict[Layer, LayerItem] = {}  # Retained scene items, one per layer
+        self.transformHandles: list[TransformHandle] = []
+        self.selectedVisibleLayers: set[Layer] = set()
+        self.selectedBounds: QRectF | None = None  # Cached result of getSelectedLayersBounds
+        self.handleBounds = QRectF()  # Bounds the handles are currently placed around
+        self.layerIndex = GridIndex()  # Bounds of visible layers, for click hit-testing
+        self.layerZ: dict[Layer, int] = {}  # Stacking order of each layer
+        self.tiledItems: set[TiledLayerItem] = set()
+        self.compositeItem = CompositeItem()  # Shown while any visible layer uses a blend mode
+        self.compositeItem.setVisible(False)
+        self.scene.addItem(self.compositeItem)
+        
+        # Tiles follow the viewport once it settles, not at every intermediate step of a zoom
+        self.tileTimer = QTimer(self)
+        self.tileTimer.setSingleShot(True)
+        self.tileTimer.timeout.connect(self.updateVisibleTiles)
+        
+        # Flattened unselected layers below/above the selection while a drag or transform runs
+        self.backdropItems: list[QGraphicsPixmapItem] = []
+        self.flattenedLayers: set[Layer] = set()
         
         # Drag state variables
         self.isDragging = False
         self.dragStartPosition = QPointF()
         self.selectedLayersStartPositions = {}  # Store original positions of selected layers
+        self.dragStartBounds = QRectF()  # Bounds of the dragged layers when the drag started
+        self.snapIndex: SnapIndex | None = None  # Lines the dragged layers snap to, built per drag
+        self.snapGuides: tuple[list[float], list[float]] = ([], [])  # x and y lines the drag is snapped to
         
         # Transform state variables
         self.isTransforming = False
@@ -43,9 +309,12 @@ class PreviewWindow(QGraphicsView):
         # Zoom tracking
         self.currentZoom = 1.0  # Track current zoom level
         
+        self.createTransformHandles()
+        
         # Enable zooming with mouse wheel
         self.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
+        self.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)  # Proxies are drawn at up to twice their on-screen size
 
         # Add zoom shortcuts
         self.zoom_in_shortcut = QShortcut(QKeySequence("Ctrl+="), self)
@@ -62,24 +331,28 @@ class PreviewWindow(QGraphicsView):
         self.reset_zoom_shortcut.activated.connect(self.resetZoom)
     
     def zoomIn(self):
+        self.endGestureBackdrops()  # Backdrops are only valid for the view they were rendered in
         zoom_factor = 1.25
         self.scale(zoom_factor, zoom_factor)
         self.currentZoom *= zoom_factor
-        self.refreshTransformHandles()  # Refresh handles after zoom
+        self.tileTimer.start()
     
     def zoomOut(self):
+        self.endGestureBackdrops()  # Backdrops are only valid for the view they were rendered in
         zoom_factor = 0.8
         self.scale(zoom_factor, zoom_factor)
         self.currentZoom *= zoom_factor
-        self.refreshTransformHandles()  # Refresh handles after zoom
+        self.tileTimer.start()
     
     def resetZoom(self):
+        self.endGestureBackdrops()  # Backdrops are only valid for the view they were rendered in
         self.resetTransform()
         self.currentZoom = 1.0
-        self.refreshTransformHandles()  # Refresh handles after zoom
+        self.tileTimer.start()
 
     def fitToWindow(self):
         if self.scene.sceneRect().isValid():
+            self.endGestureBackdrops()
             # Get the current transform before fitting
             old_transform = self.transform()
             
@@ -89,96 +362,173 @@ class PreviewWindow(QGraphicsView):
             # Calculate the new zoom level based on the transform change
             new_transform = self.transform()
             self.currentZoom = new_transform.m11()
-            self.refreshTransformHandles()  # Refresh handles after zoom
-    
+            self.tileTimer.start()
+        
     def getSelectedLayersBounds(self) -> QRectF:
         """Get the bounding rectangle of all selected layers"""
-        if not any(layer.selected for layer in self.layers):
-            return QRectF()
+        # Cached until a selected layer changes; only the selected layers are scanned
+        if self.selectedBounds is not None:
+            return self.selectedBounds
         
         min_x = min_y = float('inf')
         max_x = max_y = float('-inf')
         
-        for layer in self.layers:
-            if layer.selected and layer.visible:
-                x = layer.position['x']
-                y = layer.position['y']
-                w = layer.pixmap.width()
-                h = layer.pixmap.height()
-                
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                max_x = max(max_x, x + w)
-                max_y = max(max_y, y + h)
+        for layer in self.selectedVisibleLayers:
+            bounds = layer.boundingRect()
+            min_x = min(min_x, bounds.left())
+            min_y = min(min_y, bounds.top())
+            max_x = max(max_x, bounds.right())
+            max_y = max(max_y, bounds.bottom())
         
         if min_x == float('inf'):
-            return QRectF()
-        
-        return QRectF(min_x, min_y, max_x - min_x, max_y - min_y)
+            self.selectedBounds = QRectF()
+        else:
+            self.selectedBounds = QRectF(min_x, min_y, max_x - min_x, max_y - min_y)
+        return self.selectedBounds
     
-    def createTransformHandles(self, bounds: QRectF):
-        """Create transform handles around the given bounds"""
-        if bounds.isEmpty():
-            return
-        
-        # Get the current view scale to make handles constant size
-        handle_scale = 1.0 / self.currentZoom  # Inverse scale to counteract zoom
-        
+    def createTransformHandles(self):
+        """Create the persistent set of transform handles, hidden until something is selected"""
         # Corner handles
-        corner_positions = [
-            ('top_left', bounds.topLeft()),
-            ('top_right', bounds.topRight()),
-            ('bottom_left', bounds.bottomLeft()),
-            ('bottom_right', bounds.bottomRight())
-        ]
-        
-        # Edge handles
-        edge_positions = [
-            ('top', QPointF(bounds.center().x(), bounds.top())),
-            ('bottom', QPointF(bounds.center().x(), bounds.bottom())),
-            ('left', QPointF(bounds.left(), bounds.center().y())),
-            ('right', QPointF(bounds.right(), bounds.center().y()))
-        ]
-        
-        # Create corner handles
-        for handle_type, pos in corner_positions:
+        for handle_type in ['top_left', 'top_right', 'bottom_left', 'bottom_right']:
             handle = TransformHandle('corner', None)
-            handle.setPos(pos)
-            handle.setScale(handle_scale)  # Apply inverse scale
             handle.setData(1, handle_type)  # Store handle position type
-            self.scene.addItem(handle)
+            self.transformHandles.append(handle)
         
-        # Create edge handles
-        for handle_type, pos in edge_positions:
+        # Edge handles
+        for handle_type in ['top', 'bottom', 'left', 'right']:
             handle = TransformHandle('edge', None)
-            handle.setPos(pos)
-            handle.setScale(handle_scale)  # Apply inverse scale
             handle.setData(1, handle_type)  # Store handle position type
             # Set appropriate cursor for edge handles
             if handle_type in ['top', 'bottom']:
                 handle.setCursor(Qt.CursorShape.SizeVerCursor)
             else:
                 handle.setCursor(Qt.CursorShape.SizeHorCursor)
+            self.transformHandles.append(handle)
+        
+        for handle in self.transformHandles:
+            handle.setVisible(False)
             self.scene.addItem(handle)
     
-    def refreshTransformHandles(self):
-        """Refresh transform handles with current zoom level"""
-        # Only refresh if there are selected layers
-        if any(layer.selected for layer in self.layers):
-            # Remove existing transform handles
-            items_to_remove = []
-            for item in self.scene.items():
-                if isinstance(item, TransformHandle):
-                    items_to_remove.append(item)
-            
-            for item in items_to_remove:
-                self.scene.removeItem(item)
-            
-            # Recreate handles with current zoom
-            bounds = self.getSelectedLayersBounds()
-            if not bounds.isEmpty():
-                self.createTransformHandles(bounds)
+    def updateTransformHandles(self):
+        """Move the handles to the selection bounds; nothing to do if the bounds are unchanged"""
+        bounds = self.getSelectedLayersBounds()
+        if bounds == self.handleBounds:
+            return
+        self.handleBounds = bounds
+        if bounds.isEmpty():
+            for handle in self.transformHandles:
+                handle.setVisible(False)
+            return
+        
+        positions = {
+            'top_left': bounds.topLeft(),
+            'top_right': bounds.topRight(),
+            'bottom_left': bounds.bottomLeft(),
+            'bottom_right': bounds.bottomRight(),
+            'top': QPointF(bounds.center().x(), bounds.top()),
+            'bottom': QPointF(bounds.center().x(), bounds.bottom()),
+            'left': QPointF(bounds.left(), bounds.center().y()),
+            'right': QPointF(bounds.right(), bounds.center().y())
+        }
+        for handle in self.transformHandles:
+            handle.setPos(positions[handle.data(1)])
+            handle.setVisible(True)
+    
+    def flattenLayers(self, layers: list[Layer], scene_rect: QRectF, z: float) -> QGraphicsPixmapItem:
+        """Render the given layers, as currently shown in the viewport, into one pixmap item"""
+        hidden_items = [item for item in self.scene.items() if item.isVisible() and item.parentItem() is None
+                        and not (isinstance(item, LayerItem) and item.layer in layers)]
+        for item in hidden_items:
+            item.setVisible(False)
+        
+        viewport_size = self.viewport().size()
+        device_pixel_ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(viewport_size * device_pixel_ratio)
+        pixmap.setDevicePixelRatio(device_pixel_ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHints(self.renderHints())
+        self.scene.render(painter, QRectF(0, 0, viewport_size.width(), viewport_size.height()), scene_rect, Qt.AspectRatioMode.IgnoreAspectRatio)
+        painter.end()
+        
+        for item in hidden_items:
+            item.setVisible(True)
+        
+        backdrop = QGraphicsPixmapItem(pixmap)
+        backdrop.setData(0, "backdrop")
+        backdrop.setPos(scene_rect.topLeft())
+        backdrop.setScale(scene_rect.width() / viewport_size.width())
+        backdrop.setZValue(z)
+        return backdrop
+    
+    def beginGestureBackdrops(self):
+        """Flatten the unselected layers below and above the selection for the length of a gesture
+
+        Only the selected layers (and any unselected layers stacked between them) stay live,
+        so each mouse move repaints those items over two cached bitmaps.
+        """
+        self.endGestureBackdrops()
+        selected_z = [self.layerZ[layer] for layer in self.selectedVisibleLayers]
+        if not selected_z or self.compositeItem.isVisible():
+            return  # Composited layers are not drawn by their items, so they cannot be flattened
+        lowest, highest = min(selected_z), max(selected_z)
+        scene_rect = self.visibleSceneRect()
+        for group, z in ((self.layers[:lowest], lowest - 0.5), (self.layers[highest + 1:], highest + 0.5)):
+            group = [layer for layer in group if layer.visible]
+            if len(group) < 2:
+                continue  # Nothing to gain from flattening a single layer
+            backdrop = self.flattenLayers(group, scene_rect, z)
+            self.scene.addItem(backdrop)
+            self.backdropItems.append(backdrop)
+            for layer in group:
+                self.layerItems[layer].setVisible(False)
+                self.flattenedLayers.add(layer)
+    
+    def endGestureBackdrops(self):
+        """Drop the gesture backdrops and show the flattened layers again"""
+        for backdrop in self.backdropItems:
+            self.scene.removeItem(backdrop)
+        self.backdropItems.clear()
+        for layer in self.flattenedLayers:
+            item = self.layerItems.get(layer)
+            if item is not None:
+                item.setVisible(layer.visible)
+        self.flattenedLayers.clear()
+    
+    def visibleSceneRect(self) -> QRectF:
+        """Part of the scene currently shown in the viewport"""
+        return self.mapToScene(self.viewport().rect()).boundingRect()
+    
+    def scrollContentsBy(self, dx: int, dy: int):
+        self.endGestureBackdrops()
+        super().scrollContentsBy(dx, dy)
+        self.tileTimer.start()
     
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.tileTimer.start()
+    
+    def deviceScale(self) -> float:
+        """Device pixels per scene unit at the current zoom"""
+        return QStyleOptionGraphicsItem.levelOfDetailFromTransform(self.transform()) * self.devicePixelRatioF()
+    
+    def updateVisibleTiles(self):
+        """Load the tiles of tiled layers that came into view and drop those that left it"""
+        if not self.tiledItems:
+            return
+        scene_rect = self.visibleSceneRect()
+        device_scale = self.deviceScale()
+        for item in self.tiledItems:
+            item.updateTiles(scene_rect, device_scale)
+    
+    def layerAt(self, scene_pos: QPointF) -> Layer | None:
+        """Topmost visible layer with a non-transparent pixel at the given scene position"""
+        candidates = self.layerIndex.query(scene_pos.x(), scene_pos.y())
+        for layer in sorted(candidates, key=lambda layer: self.layerItems[layer].zValue(), reverse=True):
+            if layer.containsPoint(scene_pos):
+                return layer
+        return None
+
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == Qt.MouseButton.LeftButton:
             # Convert mouse position to scene coordinates
@@ -207,6 +557,7 @@ class PreviewWindow(QGraphicsView):
                 # Calculate bounding rect of selected layers
                 self.transformBounds = self.getSelectedLayersBounds()
                 self.setDragMode(QGraphicsView.DragMode.NoDrag)
+                self.beginGestureBackdrops()
                 return
             
             # Check if Ctrl is pressed
@@ -214,11 +565,7 @@ class PreviewWindow(QGraphicsView):
             
             # Find topmost layer containing the click position
             # Check layers in reverse order (top to bottom)
-            clicked_layer = None
-            for layer in reversed(self.layers):
-                if layer.visible and layer.containsPoint(scene_pos):
-                    clicked_layer = layer
-                    break
+            clicked_layer = self.layerAt(scene_pos)
             
             # If we clicked on a selected layer, prepare for dragging
             if clicked_layer and clicked_layer.selected:
@@ -232,14 +579,43 @@ class PreviewWindow(QGraphicsView):
                             'x': layer.position['x'],
                             'y': layer.position['y']
                         }
+                self.beginSnapping()
                 # Disable rubber band drag during layer dragging
                 self.setDragMode(QGraphicsView.DragMode.NoDrag)
+                self.beginGestureBackdrops()
             else:
                 # Handle layer selection
                 self.layerClicked.emit(clicked_layer, ctrl_pressed)
         
         super().mousePressEvent(event)
     
+    def beginSnapping(self):
+        """Index the edges and centers of the layers that are not dragged, and the bounds they span"""
+        self.dragStartBounds = self.getSelectedLayersBounds()
+        rects = [layer.boundingRect() for layer in self.layers if layer.visible and not layer.selected]
+        canvas = QRectF()
+        for rect in rects:
+            canvas = canvas.united(rect)
+        self.snapIndex = SnapIndex(rects, canvas)
+
+    def setSnapGuides(self, guides_x: list[float], guides_y: list[float]):
+        if (guides_x, guides_y) != self.snapGuides:
+            self.snapGuides = (guides_x, guides_y)
+            self.viewport().update()  # Guides span the whole view, beyond the moved items
+
+    def drawForeground(self, painter: QPainter, rect: QRectF):
+        super().drawForeground(painter, rect)
+        guides_x, guides_y = self.snapGuides
+        if not guides_x and not guides_y:
+            return
+        pen = QPen(Qt.GlobalColor.magenta, 1)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        for x in guides_x:
+            painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+        for y in guides_y:
+            painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+
     def mouseMoveEvent(self, event: QMouseEvent):
         if self.isTransforming and event.buttons() & Qt.MouseButton.LeftButton:
             # Calculate transform based on handle type
@@ -312,7 +688,7 @@ class PreviewWindow(QGraphicsView):
                     original_scale = self.selectedLayersStartScales[layer]
                     new_scale_x = original_scale['x'] * scale_x
                     new_scale_y = original_scale['y'] * scale_y
-                    layer.setScale(new_scale_x, new_scale_y)
+                    layer.setScale(new_scale_x, new_scale_y, live=True)
                     
                     # Adjust position based on scaling anchor point (opposite corner/edge)
                     original_pos = self.selectedLayersStartPositions[layer]
@@ -329,12 +705,19 @@ class PreviewWindow(QGraphicsView):
                     layer.setPosition(new_x, new_y)
             
             # Re-render the preview to show the updated transforms
-            self.render(self.layers)
+            self.render(self.layers, self.selectedLayersStartScales)
             
         elif self.isDragging and event.buttons() & Qt.MouseButton.LeftButton:
             # Calculate the drag offset
             current_pos = self.mapToScene(event.position().toPoint())
             offset = current_pos - self.dragStartPosition
+            # Hold Alt to move freely
+            if self.snapIndex is not None and not event.modifiers() & Qt.KeyboardModifier.AltModifier:
+                dx, dy, guides_x, guides_y = self.snapIndex.snap(self.dragStartBounds.translated(offset), SNAP_DISTANCE / self.transform().m11())
+                offset += QPointF(dx, dy)
+                self.setSnapGuides(guides_x, guides_y)
+            else:
+                self.setSnapGuides([], [])
             
             # Move all selected layers by the offset
             for layer, start_pos in self.selectedLayersStartPositions.items():
@@ -342,7 +725,7 @@ class PreviewWindow(QGraphicsView):
                 layer.setPosition(new_pos.x(), new_pos.y())
             
             # Re-render the preview to show the updated positions
-            self.render(self.layers)
+            self.render(self.layers, self.selectedLayersStartPositions)
         
         super().mouseMoveEvent(event)
     
@@ -350,68 +733,183 @@ class PreviewWindow(QGraphicsView):
         if event.button() == Qt.MouseButton.LeftButton:
             if self.isTransforming:
                 self.isTransforming = False
+                # Replace the live previews with a single high-quality resample
+                for layer in self.selectedLayersStartScales:
+                    layer.setScale(*layer.getScale())
+                self.commitTransform()
                 self.transformHandle = None
                 self.transformHandleType = ""  # Clear stored handle type
                 self.selectedLayersStartScales.clear()
                 self.selectedLayersStartPositions.clear()
                 # Re-enable rubber band drag
                 self.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
+                self.endGestureBackdrops()
+                self.endGesture()
                 # Emit signal to notify that layers have been transformed
                 self.layerTransformed.emit()
             elif self.isDragging:
                 self.isDragging = False
+                self.commitTransform()
                 self.selectedLayersStartPositions.clear()
+                self.snapIndex = None
+                self.setSnapGuides([], [])
                 # Re-enable rubber band drag
                 self.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
+                self.endGestureBackdrops()
+                self.endGesture()
                 # Emit signal to notify that layers have been moved
                 self.layerTransformed.emit()
         
         super().mouseReleaseEvent(event)
     
-    def render(self, layers: list[Layer]):
+    def releaseScene(self):
+        """Drop the layer items and cached composite tiles; the next full render recreates them"""
+        self.endGestureBackdrops()
+        for item in self.layerItems.values():
+            self.scene.removeItem(item)
+            resampler.cancel(item)
+        self.layerItems.clear()
+        self.tiledItems.clear()
+        self.compositeItem.cache.clear()
+    
+    def thumbnail(self, size: int) -> QPixmap:
+        """The visible part of the scene rendered into a size x size pixmap"""
+        pixmap = QPixmap(size, size)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        source = self.visibleSceneRect().intersected(self.scene.sceneRect())
+        if not source.isEmpty():
+            painter = QPainter(pixmap)
+            painter.setRenderHints(self.renderHints())
+            self.scene.render(painter, QRectF(pixmap.rect()), source)
+            painter.end()
+        return pixmap
+    
+    def updateComposite(self, layers: list[Layer]):
+        """Hand the layers up to the topmost visible blended one to the composite item"""
+        top = max((z for z, layer in enumerate(layers) if layer.visible and layer.blendMode != "normal"), default=-1)
+        composited = [layer for layer in layers[:top + 1] if layer.visible]
+        if composited or self.compositeItem.layers:
+            self.compositeItem.setLayers(composited)
+            self.compositeItem.setVisible(bool(composited))
+        composited = set(composited)
+        for layer, item in self.layerItems.items():
+            if item.composited != (layer in composited):
+                item.composited = layer in composited
+                item.setOpacity(0 if item.composited else layer.opacity)
+
+    def commitTransform(self):
+        """Report the parameters the finished gesture changed, as recorded when it started"""
+        changes = []
+        for layer, start_pos in self.selectedLayersStartPositions.items():
+            start_scale = self.selectedLayersStartScales.get(layer)
+            scale_x, scale_y = layer.getScale()
+            before = (start_pos['x'], start_pos['y'], start_scale['x'] if start_scale else scale_x, start_scale['y'] if start_scale else scale_y)
+            after = (layer.position['x'], layer.position['y'], scale_x, scale_y)
+            if before != after:
+                changes.append((layer, before, after))
+        if changes:
+            self.transformCommitted.emit(changes)
+    
+    def render(self, layers: list[Layer], changed=None):
+        """Sync the retained scene with the layers; only the `changed` layers when given"""
         # Store layers reference for click detection
         self.layers = layers
-        self.scene.clear()
 
-        # Calculate bounding rect for all layers
-        min_x = min_y = float('inf')
-        max_x = max_y = float('-inf')   
-        
-        # Track if any layers are selected
-        has_selected_layers = False
+        # Changes to flattened layers make the gesture backdrops stale
+        if self.flattenedLayers and (changed is None or any(layer in self.flattenedLayers for layer in changed)):
+            self.endGestureBackdrops()
 
-        for layer in layers:
-            if layer.visible:
-                item = QGraphicsPixmapItem(layer.pixmap)
-                item.setPos(layer.position['x'], layer.position['y'])
-                item.setOpacity(layer.opacity)
-                item.setData(0, "layer")
+        if changed is None:
+            # Drop items of layers that are no longer part of the composition
+            if len(self.layerItems) != len(layers) or any(layer not in self.layerItems for layer in layers):
+                current_layers = set(layers)
+                for layer in list(self.layerItems):
+                    if layer not in current_layers:
+                        item = self.layerItems.pop(layer)
+                        self.scene.removeItem(item)
+                        resampler.cancel(item)
+                        self.tiledItems.discard(item)
+                        self.layerIndex.remove(layer)
+                        if layer in self.selectedVisibleLayers:
+                            self.selectedVisibleLayers.discard(layer)
+                            self.selectedBounds = None
+            self.layerZ = {layer: z for z, layer in enumerate(layers)}
+            changed = layers
+
+        for layer in changed:
+            z = self.layerZ.get(layer)
+            if z is None:
+                continue  # Removed before the update was flushed
+            item = self.layerItems.get(layer)
+            if item is not None and isinstance(item, TiledLayerItem) != layer.tiled:
+                # The image was replaced by one on the other side of the tiling threshold
+                self.scene.removeItem(item)
+                resampler.cancel(item)
+                self.tiledItems.discard(item)
+                item = None
+            if item is None:
+                if layer.tiled:
+                    item = TiledLayerItem(layer)
+                    self.tiledItems.add(item)
+                else:
+                    item = LayerItem(layer)
+                self.layerItems[layer] = item
                 self.scene.addItem(item)
+            item.sync(z)
+            if layer.tiled:
+                item.updateTiles(self.visibleSceneRect(), self.deviceScale())
+
+            if not layer.visible:
+                self.layerIndex.remove(layer)
+            else:
+                self.layerIndex.update(layer, layer.boundingRect())
 
-                x = layer.position['x']
-                y = layer.position['y']
-                w = layer.pixmap.width()
-                h = layer.pixmap.height()
+            # Any change to a layer that is or was selected can move the selection bounds
+            if layer.selected and layer.visible:
+                self.selectedVisibleLayers.add(layer)
+                self.selectedBounds = None
+            elif layer in self.selectedVisibleLayers:
+                self.selectedVisibleLayers.discard(layer)
+                self.selectedBounds = None
 
-                if layer.selected:
-                    has_selected_layers = True
-                    # Draw a selection rectangle around the layer
-                    selection_rect = QGraphicsRectItem(x, y, w, h)
-                    selection_rect.setPen(QPen(Qt.GlobalColor.blue, 2))
-                    selection_rect.setBrush(QBrush(Qt.GlobalColor.transparent))
-                    selection_rect.setData(0, "ui_element")
-                    self.scene.addItem(selection_rect)
-                
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                max_x = max(max_x, x + w)
-                max_y = max(max_y, y + h)
+        if (self.isDragging or self.isTransforming) and changed is not layers:
+            # Mouse moves of a gesture only touch the moved layers; the rest is redone on release
+            self.updateGestureLayers(changed)
+        else:
+            self.updateComposite(layers)
+            self.updateSceneRect(layers)
         
-        # Add transform handles if there are selected layers
-        if has_selected_layers:
-            bounds = self.getSelectedLayersBounds()
-            if not bounds.isEmpty():
-                self.createTransformHandles(bounds)
+        # Place transform handles around the selected layers, if any
+        self.updateTransformHandles()
+
+    def updateSceneRect(self, layers: list[Layer]):
+        """Fit the scene rect to the visible layers"""
+        min_x = min_y = float('inf')
+        max_x = max_y = float('-inf')   
+        
+        for layer in layers:
+            if layer.visible:
+                bounds = layer.boundingRect()
+                min_x = min(min_x, bounds.left())
+                min_y = min(min_y, bounds.top())
+                max_x = max(max_x, bounds.right())
+                max_y = max(max_y, bounds.bottom())
         
         if min_x != float('inf'):
-            self.scene.setSceneRect(min_x, min_y, max_x - min_x, max_y - min_y)
\ No newline at end of file
+            self.scene.setSceneRect(min_x, min_y, max_x - min_x, max_y - min_y)
+
+    def updateGestureLayers(self, changed):
+        """Grow the scene rect and update the composite for just the layers a gesture moved"""
+        scene_rect = self.scene.sceneRect()
+        for layer in changed:
+            if layer.visible:
+                scene_rect = scene_rect.united(layer.boundingRect())
+        if scene_rect != self.scene.sceneRect():
+            self.scene.setSceneRect(scene_rect)
+        if self.compositeItem.isVisible():
+            self.compositeItem.updateLayers(changed)
+
+    def endGesture(self):
+        """Bring the scene rect and composite up to date after a gesture's incremental updates"""
+        self.updateComposite(self.layers)
+        self.updateSceneRect(self.layers)
\ No newline at end of file
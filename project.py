@@ -0,0 +1,184 @@
+"""Native project files
+
+A project file stores the layer list together with the decoded pixels of each layer:
+
+    header  magic (8 bytes), index offset (8), index length (8), little endian
+    chunks  raw QImage scanlines of one layer each, starting on a page boundary
+    index   JSON with the layer metadata and the chunk holding each layer's pixels
+
+Opening reads only the header and index and maps the rest of the file, so pixels are paged
+in as layers are shown. Saving to the same file again appends chunks for the layers whose
+pixels changed and a new index, then points the header at it; the file is rewritten from
+scratch once more than half of it is no longer referenced.
+"""
+from PySide6.QtGui import QImage
+import json
+import mmap
+import os
+import struct
+
+from adjustments import Adjustment
+from layers import Layer
+
+PROJECT_MAGIC = b"PEPROJ01"
+HEADER = struct.Struct("<8sQQ")
+CHUNK_ALIGNMENT = mmap.PAGESIZE
+
+class MappedImage():
+    """Pixels of one layer in a mapped project file; stands in for a SpillFile on the layer"""
+    def __init__(self, map: mmap.mmap, offset: int, width: int, height: int, bytes_per_line: int, format: QImage.Format):
+        self.map = map
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.bytesPerLine = bytes_per_line
+        self.format = format
+
+    def image(self) -> QImage:
+        data = memoryview(self.map)[self.offset:self.offset + self.bytesPerLine * self.height]
+        return QImage(data, self.width, self.height, self.bytesPerLine, self.format)
+
+    def close(self):
+        pass  # The mapping is shared by all layers of the project
+
+class ProjectFile():
+    """Reads and incrementally writes one project file"""
+    def __init__(self, path: str):
+        self.path = path
+        self.map: mmap.mmap | None = None
+        self.chunks: dict[Layer, tuple[int, int]] = {}  # layer -> (imageRevision saved, chunk offset)
+        self.fileSize = 0  # Size of the file as last written or read by us
+        self.missing: list[str] = []  # Source files of layers stored by reference that are gone
+
+    def load(self) -> list[Layer]:
+        """Read the index and return the layers, bottom to top, with their pixels mapped"""
+        with open(self.path, "rb") as file:
+            magic, index_offset, index_length = HEADER.unpack(file.read(HEADER.size).ljust(HEADER.size, b"\0"))
+            if magic != PROJECT_MAGIC:
+                raise ValueError(f"{self.path} is not a project file")
+            file.seek(index_offset)
+            index = json.loads(file.read(index_length))
+            # Copy-on-write so the mapped images can be handed to QImage; writes never reach the file
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+            self.fileSize = os.fstat(file.fileno()).st_size
+
+        layers = []
+        self.chunks.clear()
+        self.missing.clear()
+        for entry in index["layers"]:
+            chunk = entry.get("chunk")
+            if chunk is None:
+                # Stored by reference; see save()
+                if not os.path.exists(entry["path"]):
+                    self.missing.append(entry["path"])
+                    continue
+                layer = Layer(entry["path"])
+            else:
+                mapped = MappedImage(self.map, chunk["offset"], chunk["width"], chunk["height"],
+                                     chunk["bytesPerLine"], QImage.Format(chunk["format"]))
+                layer = Layer(entry["path"], spill=mapped)
+                self.chunks[layer] = (layer.imageRevision, chunk["offset"])
+            layer.name = entry["name"]
+            layer.visible = entry["visible"]
+            layer.opacity = entry["opacity"]
+            layer.blendMode = entry.get("blendMode", "normal")
+            layer.adjustments = [Adjustment(node["kind"], node["params"]) for node in entry.get("adjustments", [])]
+            layer.setPosition(entry["position"]["x"], entry["position"]["y"])
+            layer.setScale(entry["scale"][0], entry["scale"][1])
+            layers.append(layer)
+        return layers
+
+    def save(self, layers: list[Layer]):
+        """Write the layers, appending only the pixels that changed since the last save"""
+        reused = {layer: self.chunks[layer][1] for layer in layers
+                  if layer in self.chunks and self.chunks[layer][0] == layer.imageRevision}
+        # Huge layers shown straight from their source file are stored by reference, not decoded
+        by_reference = {layer for layer in layers if layer not in reused and layer.decodesRegionsFromFile()}
+        written = [layer for layer in layers if layer not in reused and layer not in by_reference]
+
+        live_bytes = sum(self.chunkSize(layer) for layer in reused)
+        new_bytes = sum(self.chunkSize(layer) for layer in written)
+        appendable = (self.map is not None and os.path.exists(self.path)
+                      and os.path.getsize(self.path) == self.fileSize)
+        if not appendable or self.fileSize + new_bytes > 2 * (live_bytes + new_bytes):
+            # Start over: every chunk is written again into a fresh file
+            reused = {}
+            written = [layer for layer in layers if layer not in by_reference]
+
+        offsets = dict(reused)
+        if reused:
+            file = open(self.path, "r+b")
+            file.seek(0, os.SEEK_END)
+            target = self.path
+        else:
+            target = self.path + ".tmp"
+            file = open(target, "wb")
+            file.write(HEADER.pack(PROJECT_MAGIC, 0, 0))
+        try:
+            for layer in written:
+                file.write(b"\0" * (-file.tell() % CHUNK_ALIGNMENT))
+                offsets[layer] = file.tell()
+                file.write(self.sourceImage(layer).constBits())
+            index = json.dumps({"version": 1, "layers": [self.layerEntry(layer, offsets.get(layer)) for layer in layers]}).encode()
+            index_offset = file.tell()
+            file.write(index)
+            file.flush()
+            os.fsync(file.fileno())
+            # The header is written last, so an interrupted save leaves the previous index in effect
+            file.seek(0)
+            file.write(HEADER.pack(PROJECT_MAGIC, index_offset, len(index)))
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.close()
+            if target != self.path:
+                os.remove(target)
+            raise
+        file.close()
+        if target != self.path:
+            os.replace(target, self.path)
+
+        # Layers now read their pixels back from the project instead of a spill or source file
+        with open(self.path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+            self.fileSize = os.fstat(file.fileno()).st_size
+        self.chunks = {layer: (layer.imageRevision, offset) for layer, offset in offsets.items()}
+        for layer, offset in offsets.items():
+            image = self.sourceImage(layer)
+            mapped = MappedImage(self.map, offset, image.width(), image.height(), image.bytesPerLine(), image.format())
+            del image  # Must not keep a previous spill mapping exported while it is closed
+            spill, layer.spill = layer.spill, mapped
+            if spill is not None:
+                spill.close()
+
+    def chunkSize(self, layer: Layer) -> int:
+        size = layer.imageSize
+        return size.width() * size.height() * 4 + CHUNK_ALIGNMENT
+
+    def sourceImage(self, layer: Layer) -> QImage:
+        """Decoded pixels of the layer, read through its spill mapping when it is evicted"""
+        if layer.cachedImage is None and layer.spill is not None:
+            return layer.spill.image()
+        return layer.image
+
+    def layerEntry(self, layer: Layer, offset: int | None) -> dict:
+        entry = {
+            "name": layer.name,
+            "path": layer.path,
+            "visible": layer.visible,
+            "opacity": layer.opacity,
+            "blendMode": layer.blendMode,
+            "adjustments": [{"kind": adjustment.kind, "params": adjustment.params} for adjustment in layer.adjustments],
+            "position": dict(layer.position),
+            "scale": [layer.scaleX, layer.scaleY],
+        }
+        if offset is not None:
+            image = self.sourceImage(layer)
+            entry["chunk"] = {
+                "offset": offset,
+                "width": image.width(),
+                "height": image.height(),
+                "bytesPerLine": image.bytesPerLine(),
+                "format": image.format().value,
+            }
+        return entry
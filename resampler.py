@@ -0,0 +1,70 @@
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QSize, Qt
+
+from workers import WorkerSignals
+
+class ResampleTask(QRunnable):
+    """One display image made on a pool thread, by a resample or a region decode"""
+    def __init__(self, slot: tuple, key: tuple, make, service: "Resampler"):
+        super().__init__()
+        self.slot = slot
+        self.key = key
+        self.make = make  # () -> QImage; runs on the pool thread
+        self.service = service
+
+    def superseded(self) -> bool:
+        return self.service.pending.get(self.slot) != self.key
+
+    def run(self):
+        if self.superseded():
+            return  # A newer request for the same image was made while this one was queued
+        image = self.make()
+        if not self.superseded():
+            self.service.signals.finished.emit((self.slot, self.key, image))
+
+class Resampler(QObject):
+    """Display images made off the GUI thread: smooth resamples of layer pixmaps and tiles
+
+    Requests are made per slot, an (owner, part) pair such as (layer, proxy level) or
+    (tiled layer item, tile), and only the newest request of each is kept: older ones are
+    skipped if they have not started yet, and their results are dropped if they have.
+    Results are handed to owner.onResampled(part, key, image) on the GUI thread.
+    """
+    def __init__(self):
+        super().__init__()
+        self.pool = QThreadPool(self)
+        self.signals = WorkerSignals()
+        self.signals.finished.connect(self.onResampled)
+        self.pending: dict[tuple, tuple] = {}  # (owner, part) -> key of the newest request
+
+    def request(self, layer, level: int, key: tuple, source: QImage, size: QSize):
+        """Smooth resample of source to size, for the pixmap of a layer at a proxy level"""
+        self.submit((layer, level), key, lambda: source.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation))
+
+    def submit(self, slot: tuple, key: tuple, make):
+        """Run make() on the pool for a slot, unless a request with the same key is pending
+
+        make must not touch objects the GUI thread changes, so callers capture what it needs.
+        """
+        if self.pending.get(slot) == key:
+            return
+        self.pending[slot] = key
+        self.pool.start(ResampleTask(slot, key, make, self))
+
+    def isPending(self, owner, part) -> bool:
+        return (owner, part) in self.pending
+
+    def cancel(self, owner, part=None):
+        """Drop pending requests of an owner, or of one of its parts, e.g. when its pixmaps are evicted"""
+        for slot in [slot for slot in self.pending if slot[0] is owner and (part is None or slot[1] == part)]:
+            del self.pending[slot]
+
+    def onResampled(self, result: tuple[tuple, tuple, QImage]):
+        slot, key, image = result  # (owner, part), key of the request, resulting image
+        if self.pending.get(slot) != key:
+            return
+        del self.pending[slot]
+        owner, part = slot
+        owner.onResampled(part, key, image)
+
+resampler = Resampler()
@@ -0,0 +1,61 @@
+from PySide6.QtCore import QObject, QTimer, Slot
+from enum import Flag, auto
+
+class Dirty(Flag):
+    """What changed since the last flush"""
+    NONE = 0
+    SELECTION = auto()
+    TRANSFORM = auto()  # Position or scale
+    VISIBILITY = auto()
+    CONTENT = auto()  # Pixel data, e.g. an import finished decoding
+    LAYERS = auto()  # Layers added, removed or reordered
+    APPEARANCE = auto()  # Opacity or blend mode
+    ALL = SELECTION | TRANSFORM | VISIBILITY | CONTENT | LAYERS | APPEARANCE
+
+class UpdateScheduler(QObject):
+    """Coalesces change notifications and flushes them once per event-loop turn
+
+    The flush callback receives the union of dirty flags and the set of layers that
+    changed, so subsystems can update just those parts.
+    """
+    def __init__(self, flush_callback, interval: int = 0, parent: QObject | None = None):
+        super().__init__(parent)
+        self.flushCallback = flush_callback
+        self.dirty = Dirty.NONE
+        self.dirtyLayers = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)  # 0 flushes on the next event-loop turn, ~16 once per frame
+        self.timer.timeout.connect(self.flush)
+
+    def markDirty(self, dirty: Dirty, layers=()):
+        self.dirty |= dirty
+        self.dirtyLayers.update(layers)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    @Slot()
+    def onSelectionChanged(self):
+        self.markDirty(Dirty.SELECTION, (self.sender(),))
+
+    @Slot()
+    def onVisibilityChanged(self):
+        self.markDirty(Dirty.VISIBILITY, (self.sender(),))
+
+    @Slot()
+    def onContentChanged(self):
+        self.markDirty(Dirty.CONTENT, (self.sender(),))
+
+    @Slot()
+    def onAppearanceChanged(self):
+        self.markDirty(Dirty.APPEARANCE, (self.sender(),))
+
+    def flush(self):
+        """Deliver pending changes now; also used by callers that need an up-to-date view"""
+        self.timer.stop()
+        if self.dirty == Dirty.NONE:
+            return
+        dirty, layers = self.dirty, self.dirtyLayers
+        self.dirty = Dirty.NONE
+        self.dirtyLayers = set()
+        self.flushCallback(dirty, layers)
@@ -0,0 +1,56 @@
+from PySide6.QtCore import QRectF
+import bisect
+
+SNAP_DISTANCE = 8  # Screen pixels within which a moving edge or center snaps
+
+def rectLines(rect: QRectF) -> tuple[tuple[float, ...], tuple[float, ...]]:
+    """(left, center, right), (top, center, bottom) of a rect"""
+    return ((rect.left(), rect.center().x(), rect.right()),
+            (rect.top(), rect.center().y(), rect.bottom()))
+
+class SnapIndex():
+    """Sorted edge and center coordinates of the layers a drag can snap to
+
+    Built once when a drag starts, so each mouse move only bisects the sorted lists; the
+    cost of a move grows with log n rather than with the number of layers.
+    """
+    def __init__(self, rects: list[QRectF], canvas: QRectF | None = None):
+        xs, ys = [], []
+        for rect in rects + ([canvas] if canvas is not None and not canvas.isEmpty() else []):
+            rect_xs, rect_ys = rectLines(rect)
+            xs.extend(rect_xs)
+            ys.extend(rect_ys)
+        self.xs = sorted(xs)
+        self.ys = sorted(ys)
+
+    @staticmethod
+    def nearest(lines: list[float], value: float) -> float | None:
+        """Line closest to value, found by bisection"""
+        index = bisect.bisect_left(lines, value)
+        candidates = lines[max(0, index - 1):index + 1]
+        return min(candidates, key=lambda line: abs(line - value)) if candidates else None
+
+    @classmethod
+    def snapAxis(cls, lines: list[float], values: tuple[float, ...], tolerance: float) -> tuple[float, list[float]]:
+        """Shift that snaps the closest of values onto a line, and the lines values then lie on"""
+        best = None
+        for value in values:
+            line = cls.nearest(lines, value)
+            if line is not None and abs(line - value) <= tolerance and (best is None or abs(line - value) < abs(best)):
+                best = line - value
+        if best is None:
+            return 0.0, []
+        guides = []
+        for value in values:
+            line = cls.nearest(lines, value + best)
+            if line is not None and abs(line - value - best) < 1e-6:
+                guides.append(line)
+        return best, guides
+
+    def snap(self, rect: QRectF, tolerance: float) -> tuple[float, float, list[float], list[float]]:
+        """(dx, dy) that snap rect's edges or centers to the nearest lines within tolerance,
+        and the x and y guide lines they then touch"""
+        rect_xs, rect_ys = rectLines(rect)
+        dx, guides_x = self.snapAxis(self.xs, rect_xs, tolerance)
+        dy, guides_y = self.snapAxis(self.ys, rect_ys, tolerance)
+        return dx, dy, guides_x, guides_y
@@ -0,0 +1,49 @@
+from PySide6.QtCore import QRectF
+
+class GridIndex():
+    """Uniform grid over item bounds, so point queries only look at nearby items"""
+    def __init__(self, cell_size: int = 512):
+        self.cellSize = cell_size
+        self.cells: dict[tuple[int, int], set] = {}
+        self.itemCells: dict[object, tuple[int, int, int, int]] = {}  # item -> covered cell range
+
+    def cellRange(self, rect: QRectF) -> tuple[int, int, int, int]:
+        size = self.cellSize
+        return (int(rect.left() // size), int(rect.top() // size),
+                int(rect.right() // size), int(rect.bottom() // size))
+
+    def update(self, item, rect: QRectF):
+        """Insert or move an item; cheap when the covered cells did not change"""
+        if rect.isEmpty():
+            self.remove(item)
+            return
+        cell_range = self.cellRange(rect)
+        if self.itemCells.get(item) == cell_range:
+            return
+        self.remove(item)
+        self.itemCells[item] = cell_range
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(item)
+
+    def remove(self, item):
+        cell_range = self.itemCells.pop(item, None)
+        if cell_range is None:
+            return
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(item)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    def query(self, x: float, y: float) -> set:
+        """Items whose cells cover the point; callers still test exact bounds"""
+        return self.cells.get((int(x // self.cellSize), int(y // self.cellSize)), set())
+
+    def clear(self):
+        self.cells.clear()
+        self.itemCells.clear()
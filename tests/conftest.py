@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QColor, QImage, QPainter
+from PySide6.QtCore import Qt
+
+@pytest.fixture(scope="session")
+def app():
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture
+def ellipsePath(tmp_path):
+    """A 300x200 PNG holding an opaque ellipse on a transparent background"""
+    image = QImage(300, 200, QImage.Format.Format_ARGB32)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    painter.setPen(Qt.PenStyle.NoPen)
+    painter.setBrush(QColor(0, 160, 0))
+    painter.drawEllipse(100, 50, 100, 100)
+    painter.end()
+    path = str(tmp_path / "ellipse.png")
+    image.save(path)
+    return path
@@ -0,0 +1,62 @@
+import threading
+
+from PySide6.QtGui import QColor, QImage
+
+from adjustments import Adjustment
+from layers import Layer
+from resampler import resampler
+
+def test_pixmap_evaluates_adjustments_below_full_resolution(app):
+    image = QImage(1600, 1200, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(100, 150, 200))
+    layer = Layer("unused.png", image)
+    layer.setAdjustments([Adjustment("gaussian_blur", {"radius": 4})])
+    layer.setScale(0.3, 0.3)
+    pixmap = layer.buildPixmap(0, False)
+    assert (pixmap.width(), pixmap.height()) == (480, 360)
+    evaluated_widths = [key[1] for key in layer.pipeline.outputs]
+    assert evaluated_widths and max(evaluated_widths) < 2 * 480
+
+def adjustedLayer(app) -> Layer:
+    image = QImage(200, 100, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(100, 100, 100))
+    layer = Layer("unused.png", image)
+    layer.setAdjustments([Adjustment("brightness_contrast")])
+    layer.pixmap  # Shown once, so there is a previous result
+    return layer
+
+def finishEvaluations(app):
+    resampler.pool.waitForDone()
+    app.processEvents()
+
+def brightness(layer: Layer) -> int:
+    return layer.pixmap.toImage().pixelColor(10, 10).red()
+
+def test_slider_edits_are_evaluated_off_the_gui_thread(app, monkeypatch):
+    layer = adjustedLayer(app)
+    held = layer.pixmap
+    evaluate = layer.pipeline.evaluate
+    threads = []
+    monkeypatch.setattr(layer.pipeline, "evaluate", lambda *args: threads.append(threading.current_thread()) or evaluate(*args))
+    ready = []
+    layer.pixmapReady.connect(lambda: ready.append(True))
+
+    layer.setAdjustmentParam(0, "brightness", 50, live=True)
+    assert layer.pixmap is held  # The previous result is shown until the evaluation completes
+    finishEvaluations(app)
+    assert ready and layer.pixmap is not held
+    assert brightness(layer) > 100
+    assert threads and threading.main_thread() not in threads
+
+def test_results_of_earlier_edits_are_shown_while_dragging(app):
+    layer = adjustedLayer(app)
+    layer.setAdjustmentParam(0, "brightness", 30, live=True)
+    layer.pixmap  # Starts evaluating brightness 30
+    layer.setAdjustmentParam(0, "brightness", 60, live=True)
+    layer.pixmap  # Waits for the evaluation already running instead of superseding it
+    finishEvaluations(app)
+    first = brightness(layer)  # Brightness 30; showing it asks for the current value
+    assert first > 100
+    finishEvaluations(app)
+    assert brightness(layer) > first
+    assert layer.pixmapKeys[0] == layer.pixmapKey(0)
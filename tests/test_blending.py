@@ -0,0 +1,48 @@
+import pytest
+from PySide6.QtGui import QColor, QImage, QPainter
+
+from blending import blendInto
+
+def solidImage(color: QColor) -> QImage:
+    image = QImage(4, 4, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(color)
+    return image
+
+def blended(backdrop: QColor, source: QColor, mode: str, opacity: float = 1.0) -> QColor:
+    image = solidImage(backdrop)
+    blendInto(image, solidImage(source), mode, opacity, image.rect())
+    return image.pixelColor(1, 1)
+
+def channels(color: QColor) -> tuple[int, int, int, int]:
+    return color.red(), color.green(), color.blue(), color.alpha()
+
+@pytest.mark.parametrize("opacity", [1.0, 0.6])
+def test_normal_matches_source_over(app, opacity):
+    backdrop, source = QColor(200, 100, 50, 200), QColor(20, 180, 240, 150)
+    expected = solidImage(backdrop)
+    painter = QPainter(expected)
+    painter.setOpacity(opacity)
+    painter.drawImage(0, 0, solidImage(source))
+    painter.end()
+    for ours, qt in zip(channels(blended(backdrop, source, "normal", opacity)), channels(expected.pixelColor(1, 1))):
+        assert abs(ours - qt) <= 2
+
+@pytest.mark.parametrize("mode, expected", [
+    ("multiply", (100, 51, 0)),
+    ("screen", (228, 179, 255)),
+    ("overlay", (200, 102, 0)),
+    ("add", (255, 230, 255)),
+    ("difference", (72, 26, 255)),
+])
+def test_modes_on_opaque_pixels(app, mode, expected):
+    result = blended(QColor(200, 102, 0), QColor(128, 128, 255), mode)
+    assert abs(result.red() - expected[0]) <= 1
+    assert abs(result.green() - expected[1]) <= 1
+    assert abs(result.blue() - expected[2]) <= 1
+    assert result.alpha() == 255
+
+def test_only_rect_is_blended(app):
+    image = solidImage(QColor(255, 255, 255))
+    blendInto(image, solidImage(QColor(0, 0, 0)), "multiply", 1.0, image.rect().adjusted(0, 0, -2, 0))
+    assert image.pixelColor(0, 0) == QColor(0, 0, 0)
+    assert image.pixelColor(3, 0) == QColor(255, 255, 255)
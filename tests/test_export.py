@@ -0,0 +1,53 @@
+import numpy as np
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect
+
+from adjustments import Adjustment
+from compositor import RenderLayer, TiledCompositor
+from layers import Layer
+
+def canvasPixels(render_layers: list[RenderLayer]) -> np.ndarray:
+    tile = TiledCompositor(render_layers).renderTile(QRect(0, 0, 400, 300))
+    return np.frombuffer(tile.constBits(), np.uint8).copy()
+
+def test_deferred_snapshots_match_immediate_ones(app, ellipsePath):
+    adjusted = Layer(ellipsePath)
+    adjusted.setAdjustments([Adjustment("gaussian_blur", {"radius": 6}), Adjustment("hue_saturation", {"hue": 40})])
+    adjusted.setScale(0.5, 0.5)
+    evicted = Layer(ellipsePath)
+    evicted.setPosition(40, 20)
+    evicted.setBlendMode("multiply")
+    evicted.evictImage()
+    spilled = Layer(ellipsePath)
+    spilled.setPosition(80, 60)
+    spilled.evictImage(spill=True)
+    layers = [adjusted, evicted, spilled]
+
+    deferred = [RenderLayer.deferred(layer) for layer in layers]
+    assert all(render_layer.image is None for render_layer in deferred)  # No pixels touched yet
+    assert isinstance(deferred[1].source, str)
+    immediate = canvasPixels([RenderLayer.fromLayer(layer) for layer in layers])
+    for render_layer in deferred:
+        render_layer.prepare()
+    assert np.array_equal(canvasPixels(deferred), immediate)
+
+def test_failed_export_finishes_with_an_error(app, tmp_path, monkeypatch):
+    import exporter
+    from PySide6.QtCore import QEventLoop, QTimer
+
+    def failingEncode(*args):
+        raise RuntimeError("encoder crashed")
+    monkeypatch.setattr(exporter, "encodeWithPillow", failingEncode)
+    image = QImage(40, 30, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(0xff336699)
+    path = str(tmp_path / "out.jpg")
+    export = exporter.Exporter(TiledCompositor([RenderLayer(image, 0, 0, 40, 30)]), path, exporter.ExportSettings("JPEG"))
+    errors = []
+    loop = QEventLoop()
+    export.finished.connect(errors.append)
+    export.finished.connect(loop.quit)
+    QTimer.singleShot(5000, loop.quit)
+    export.start()
+    loop.exec()
+    assert errors == ["encoder crashed"]
+    assert not (tmp_path / "out.jpg").exists()
@@ -0,0 +1,68 @@
+from PySide6.QtGui import QColor, QImage
+
+from composition import Composition
+from history import History, TransformCommand
+from layers import Layer
+
+def compositionWithLayers(count: int) -> Composition:
+    result = Composition()
+    for index in range(count):
+        image = QImage(32, 32, QImage.Format.Format_ARGB32)
+        image.fill(QColor(index * 40, 0, 0))
+        result.addLayer(Layer(f"layer{index}.png", image=image))
+    result.scheduler.flush()
+    return result
+
+def test_transform_undo_redo(app):
+    comp = compositionWithLayers(1)
+    layer = comp.layers[0]
+    layer.setPosition(10, 20)
+    layer.setScale(2, 2)
+    comp.history.push(TransformCommand([(layer, (0, 0, 1.0, 1.0), (10, 20, 2.0, 2.0))]))
+    comp.undo()
+    assert layer.position == {'x': 0, 'y': 0} and layer.getScale() == (1.0, 1.0)
+    assert comp.history.canRedo()
+    comp.redo()
+    assert layer.position == {'x': 10, 'y': 20} and layer.getScale() == (2.0, 2.0)
+
+def test_visibility_and_selection_are_recorded(app):
+    comp = compositionWithLayers(2)
+    bottom, top = comp.layers
+    comp.selectLayer(top, False)
+    bottom.toggleVisibility()
+    comp.undo()
+    assert bottom.visible
+    comp.undo()
+    assert comp.selectedLayers == [] and not top.selected
+    comp.redo()
+    comp.redo()
+    assert comp.selectedLayers == [top] and not bottom.visible
+
+def test_deleted_layers_come_back_in_place(app):
+    comp = compositionWithLayers(3)
+    layers = list(comp.layers)
+    comp.selectLayer(layers[1], False)
+    comp.deleteSelectedLayers()
+    assert comp.layers == [layers[0], layers[2]]
+    comp.undo()
+    assert comp.layers == layers
+    assert layers[1].image.pixelColor(0, 0) == QColor(40, 0, 0)  # Restored from where it was evicted to
+
+def test_new_step_clears_redo(app):
+    comp = compositionWithLayers(1)
+    layer = comp.layers[0]
+    layer.toggleVisibility()
+    comp.undo()
+    layer.toggleVisibility()
+    assert not comp.history.canRedo()
+
+def test_oldest_steps_are_trimmed_to_budget(app):
+    comp = compositionWithLayers(1)
+    layer = comp.layers[0]
+    history = History(comp, budget_bytes=300)
+    for x in range(10):
+        history.push(TransformCommand([(layer, (x, 0, 1.0, 1.0), (x + 1, 0, 1.0, 1.0))]))
+    assert history.used <= 300
+    assert len(history.undoStack) == 300 // history.undoStack[-1].size()
+    history.undo()
+    assert layer.position == {'x': 9, 'y': 0}
@@ -0,0 +1,66 @@
+import shutil
+import sys
+
+import pytest
+from PySide6.QtTest import QTest
+
+from composition import Composition
+from importer import ImageImporter
+
+@pytest.fixture
+def slotErrors(monkeypatch):
+    """Exceptions raised in Qt slots, which PySide reports through sys.excepthook"""
+    errors = []
+    monkeypatch.setattr(sys, "excepthook", lambda kind, value, traceback: errors.append(value))
+    return errors
+
+def startImport(comp: Composition, paths: list[str]) -> ImageImporter:
+    comp.importFiles(paths)
+    return comp.previewWindow.findChild(ImageImporter)
+
+def deleteLayer(comp: Composition, layer):
+    comp.selectLayer(layer, False)
+    comp.deleteSelectedLayers()
+
+def test_delete_loading_placeholder_then_cancel(app, ellipsePath, tmp_path, slotErrors):
+    other = str(tmp_path / "other.png")
+    shutil.copy(ellipsePath, other)
+    comp = Composition()
+    importer = startImport(comp, [ellipsePath, other])
+    placeholder = comp.layers[0]
+    assert placeholder.loading
+    deleteLayer(comp, placeholder)
+    importer.cancel()
+    QTest.qWait(20)
+    assert slotErrors == []
+    assert comp.layers == []
+    while comp.history.canUndo():
+        comp.undo()
+    assert placeholder not in comp.layers  # Not brought back as a placeholder that never loads
+
+def test_delete_loading_placeholder_whose_decode_fails(app, tmp_path, slotErrors):
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    comp = Composition()
+    importer = startImport(comp, [str(broken)])
+    placeholder = comp.layers[0]
+    deleteLayer(comp, placeholder)
+    importer.pool.waitForDone()
+    QTest.qWait(20)
+    assert slotErrors == []
+    while comp.history.canUndo():
+        comp.undo()
+    assert comp.layers == []
+
+def test_deleted_placeholder_comes_back_decoded(app, ellipsePath, slotErrors):
+    comp = Composition()
+    importer = startImport(comp, [ellipsePath])
+    placeholder = comp.layers[0]
+    deleteLayer(comp, placeholder)
+    importer.pool.waitForDone()
+    QTest.qWait(20)
+    comp.undo()
+    assert comp.layers == [placeholder]
+    assert not placeholder.loading
+    assert placeholder.image.size().width() == 300
+    assert slotErrors == []
@@ -0,0 +1,44 @@
+from PySide6.QtGui import QColor, QImage
+
+from layers import Layer
+from memory import MemoryBudget
+
+LAYER_BYTES = 100 * 100 * 4
+
+def solidLayer(name: str, color: QColor) -> Layer:
+    image = QImage(100, 100, QImage.Format.Format_ARGB32)
+    image.fill(color)
+    return Layer(name, image=image)
+
+def trackedLayers(budget: MemoryBudget, count: int) -> list[Layer]:
+    layers = [solidLayer(f"layer{index}.png", QColor(index * 80, 0, 0)) for index in range(count)]
+    for layer in layers:
+        budget.update(layer)
+    return layers
+
+def test_least_recently_touched_layer_is_spilled(app):
+    budget = MemoryBudget(int(2.5 * LAYER_BYTES))
+    a, b = trackedLayers(budget, 2)
+    budget.touch(a)
+    c = solidLayer("c.png", QColor(0, 0, 255))
+    budget.update(c)
+    assert b.cachedImage is None and b.spill is not None  # No source file, so it was spilled
+    assert a.cachedImage is not None and c.cachedImage is not None
+    assert budget.used == 2 * LAYER_BYTES <= budget.budget
+    assert b.image.pixelColor(50, 50) == QColor(80, 0, 0)  # Mapped back in from the spill file
+
+def test_hidden_layers_go_first(app):
+    budget = MemoryBudget(int(2.5 * LAYER_BYTES))
+    a, b = trackedLayers(budget, 2)
+    b.visible = False
+    budget.update(solidLayer("c.png", QColor(0, 0, 255)))
+    assert a.cachedImage is not None
+    assert b.cachedImage is None
+
+def test_lowering_the_budget_evicts_until_it_fits(app):
+    budget = MemoryBudget(4 * LAYER_BYTES)
+    a, b, c = trackedLayers(budget, 3)
+    budget.setBudget(LAYER_BYTES)
+    assert budget.used <= LAYER_BYTES
+    assert [layer.cachedImage is None for layer in (a, b, c)] == [True, True, False]
+    assert a.image.pixelColor(0, 0) == QColor(0, 0, 0)
@@ -0,0 +1,26 @@
+from PySide6.QtCore import QPointF
+
+from layers import Layer
+from preview import PreviewWindow
+
+def test_transparent_pixel_is_not_hit(app, ellipsePath):
+    layer = Layer(ellipsePath)
+    assert not layer.containsPoint(QPointF(10, 10))
+    assert not layer.containsPoint(QPointF(105, 55))  # Inside the ellipse's bounds, outside the ellipse
+    assert layer.containsPoint(QPointF(150, 100))
+
+def test_mask_follows_position_and_scale(app, ellipsePath):
+    layer = Layer(ellipsePath)
+    layer.setPosition(1000, 500)
+    layer.setScale(2, 2)
+    assert layer.containsPoint(QPointF(1300, 700))
+    assert not layer.containsPoint(QPointF(1210, 610))
+
+def test_layer_at_picks_topmost_opaque_layer(app, ellipsePath):
+    view = PreviewWindow()
+    bottom, top = Layer(ellipsePath), Layer(ellipsePath)
+    top.setPosition(60, 0)
+    view.render([bottom, top])
+    assert view.layerAt(QPointF(220, 100)) is top
+    assert view.layerAt(QPointF(120, 100)) is bottom  # Transparent in the top layer
+    assert view.layerAt(QPointF(10, 10)) is None
@@ -0,0 +1,54 @@
+from PySide6.QtGui import QMouseEvent
+from PySide6.QtCore import QEvent, QPointF, QRectF, Qt
+
+from composition import Composition
+from layers import Layer
+
+def sendMouse(view, kind: QEvent.Type, scene_pos: QPointF, modifiers=Qt.KeyboardModifier.NoModifier):
+    pos = QPointF(view.mapFromScene(scene_pos))
+    button = Qt.MouseButton.NoButton if kind == QEvent.Type.MouseMove else Qt.MouseButton.LeftButton
+    buttons = Qt.MouseButton.NoButton if kind == QEvent.Type.MouseButtonRelease else Qt.MouseButton.LeftButton
+    event = QMouseEvent(kind, pos, pos, button, buttons, modifiers)
+    handler = {QEvent.Type.MouseButtonPress: view.mousePressEvent, QEvent.Type.MouseMove: view.mouseMoveEvent,
+               QEvent.Type.MouseButtonRelease: view.mouseReleaseEvent}[kind]
+    handler(event)
+
+def drag(view, start: QPointF, end: QPointF, modifiers=Qt.KeyboardModifier.NoModifier):
+    sendMouse(view, QEvent.Type.MouseButtonPress, start)
+    sendMouse(view, QEvent.Type.MouseMove, end, modifiers)
+    sendMouse(view, QEvent.Type.MouseButtonRelease, end)
+
+def composition(paths_and_positions) -> Composition:
+    result = Composition()
+    result.previewWindow.resize(800, 600)
+    for path, (x, y) in paths_and_positions:
+        layer = Layer(path)
+        layer.setPosition(x, y)
+        result.addLayer(layer)
+    result.scheduler.flush()
+    return result
+
+def test_scene_rect_fits_layers_after_a_drag(app, ellipsePath):
+    comp = composition([(ellipsePath, (0, 0)), (ellipsePath, (400, 0))])
+    view = comp.previewWindow
+    moved = comp.layers[1]
+    comp.selectLayer(moved, False)
+    comp.scheduler.flush()
+    sendMouse(view, QEvent.Type.MouseButtonPress, QPointF(550, 100))
+    sendMouse(view, QEvent.Type.MouseMove, QPointF(1550, 100), Qt.KeyboardModifier.AltModifier)
+    assert view.scene.sceneRect().contains(moved.boundingRect())  # Grown while dragging
+    sendMouse(view, QEvent.Type.MouseMove, QPointF(550, 600), Qt.KeyboardModifier.AltModifier)
+    sendMouse(view, QEvent.Type.MouseButtonRelease, QPointF(550, 600))
+    assert moved.position == {'x': 400, 'y': 500}
+    assert view.scene.sceneRect() == QRectF(0, 0, 700, 700)  # Fitted again on release
+
+def test_drag_snaps_to_other_layers_unless_alt_is_held(app, ellipsePath):
+    comp = composition([(ellipsePath, (0, 0)), (ellipsePath, (400, 0))])
+    view = comp.previewWindow
+    moved = comp.layers[1]
+    comp.selectLayer(moved, False)
+    comp.scheduler.flush()
+    drag(view, QPointF(550, 100), QPointF(455, 103))
+    assert moved.position == {'x': 300, 'y': 0}  # Left edge onto the other's right edge, tops aligned
+    drag(view, QPointF(450, 100), QPointF(455, 103), Qt.KeyboardModifier.AltModifier)
+    assert moved.position == {'x': 305, 'y': 3}
@@ -0,0 +1,48 @@
+import os
+
+from PySide6.QtGui import QColor, QImage
+
+from layers import Layer
+from project import ProjectFile
+
+def solidLayer(name: str, color: QColor) -> Layer:
+    image = QImage(64, 48, QImage.Format.Format_ARGB32)
+    image.fill(color)
+    return Layer(name, image=image)
+
+def test_save_and_load(app, tmp_path):
+    red, blue = solidLayer("red.png", QColor(255, 0, 0)), solidLayer("blue.png", QColor(0, 0, 255, 128))
+    blue.setPosition(30, 20)
+    blue.setScale(2, 0.5)
+    blue.opacity = 0.5
+    blue.blendMode = "multiply"
+    path = str(tmp_path / "test.pep")
+    ProjectFile(path).save([red, blue])
+
+    loaded = ProjectFile(path).load()
+    assert [layer.name for layer in loaded] == ["red.png", "blue.png"]
+    assert loaded[0].image.pixelColor(5, 5) == QColor(255, 0, 0)
+    assert loaded[1].image.pixelColor(5, 5) == blue.image.pixelColor(5, 5)
+    assert loaded[1].position == {'x': 30, 'y': 20}
+    assert loaded[1].getScale() == (2, 0.5)
+    assert (loaded[1].opacity, loaded[1].blendMode) == (0.5, "multiply")
+
+def test_save_again_appends_only_changed_layers(app, tmp_path):
+    red, blue = solidLayer("red.png", QColor(255, 0, 0)), solidLayer("blue.png", QColor(0, 0, 255))
+    path = str(tmp_path / "test.pep")
+    project = ProjectFile(path)
+    project.save([red, blue])
+    size = os.path.getsize(path)
+    red_offset, blue_offset = project.chunks[red][1], project.chunks[blue][1]
+
+    green = QImage(64, 48, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    blue.setImage(green)
+    project.save([red, blue])
+    assert project.chunks[red][1] == red_offset  # Reused in place
+    assert project.chunks[blue][1] > size > blue_offset  # Appended after what was there
+    assert os.path.getsize(path) < 2 * size
+
+    loaded = ProjectFile(path).load()
+    assert loaded[0].image.pixelColor(0, 0) == QColor(255, 0, 0)
+    assert loaded[1].image.pixelColor(0, 0) == QColor(0, 255, 0)
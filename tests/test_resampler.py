@@ -0,0 +1,56 @@
+from PySide6.QtGui import QColor, QImage
+from PySide6.QtCore import QSize
+
+from resampler import Resampler
+
+class FakeLayer():
+    def __init__(self):
+        self.results = []
+
+    def onResampled(self, level: int, key: tuple, image: QImage):
+        self.results.append((level, key, image.size()))
+
+def solidImage(color: QColor) -> QImage:
+    image = QImage(400, 300, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(color)
+    return image
+
+def deliver(app, resampler: Resampler):
+    resampler.pool.waitForDone()
+    app.processEvents()
+
+def test_only_newest_request_is_delivered(app):
+    resampler = Resampler()
+    layer = FakeLayer()
+    resampler.request(layer, 1, ("old",), solidImage(QColor(255, 0, 0)), QSize(200, 150))
+    resampler.request(layer, 1, ("new",), solidImage(QColor(0, 255, 0)), QSize(100, 75))
+    deliver(app, resampler)
+    assert layer.results == [(1, ("new",), QSize(100, 75))]
+    assert resampler.pending == {}
+
+def test_result_finished_before_a_newer_request_is_dropped(app):
+    resampler = Resampler()
+    layer = FakeLayer()
+    resampler.request(layer, 1, ("old",), solidImage(QColor(255, 0, 0)), QSize(200, 150))
+    resampler.pool.waitForDone()  # Finished and queued, but not yet delivered
+    resampler.request(layer, 1, ("new",), solidImage(QColor(0, 255, 0)), QSize(100, 75))
+    deliver(app, resampler)
+    assert layer.results == [(1, ("new",), QSize(100, 75))]
+
+def test_cancelled_requests_are_not_delivered(app):
+    resampler = Resampler()
+    layer, other = FakeLayer(), FakeLayer()
+    resampler.request(layer, 1, ("a",), solidImage(QColor(255, 0, 0)), QSize(200, 150))
+    resampler.request(other, 1, ("b",), solidImage(QColor(255, 0, 0)), QSize(200, 150))
+    resampler.cancel(layer)
+    deliver(app, resampler)
+    assert layer.results == []
+    assert other.results == [(1, ("b",), QSize(200, 150))]
+
+def test_levels_of_a_layer_are_independent(app):
+    resampler = Resampler()
+    layer = FakeLayer()
+    resampler.request(layer, 1, ("a",), solidImage(QColor(255, 0, 0)), QSize(200, 150))
+    resampler.request(layer, 2, ("b",), solidImage(QColor(255, 0, 0)), QSize(100, 75))
+    deliver(app, resampler)
+    assert sorted(layer.results) == [(1, ("a",), QSize(200, 150)), (2, ("b",), QSize(100, 75))]
@@ -0,0 +1,44 @@
+from PySide6.QtGui import QColor, QImage
+from PySide6.QtTest import QTest
+
+from composition import Composition
+from layers import Layer
+from scheduler import Dirty, UpdateScheduler
+
+def test_changes_in_one_turn_flush_once(app):
+    flushes = []
+    scheduler = UpdateScheduler(lambda dirty, layers: flushes.append((dirty, layers)))
+    scheduler.markDirty(Dirty.SELECTION, ["a"])
+    scheduler.markDirty(Dirty.VISIBILITY, ["b"])
+    scheduler.markDirty(Dirty.SELECTION, ["a"])
+    assert flushes == []
+    QTest.qWait(20)
+    assert flushes == [(Dirty.SELECTION | Dirty.VISIBILITY, {"a", "b"})]
+    assert scheduler.dirty == Dirty.NONE and scheduler.dirtyLayers == set()
+    QTest.qWait(20)
+    assert len(flushes) == 1  # Nothing left to deliver
+
+def test_explicit_flush_delivers_pending_changes_once(app):
+    flushes = []
+    scheduler = UpdateScheduler(lambda dirty, layers: flushes.append((dirty, layers)))
+    scheduler.markDirty(Dirty.CONTENT, ["a"])
+    scheduler.flush()
+    scheduler.flush()
+    QTest.qWait(20)
+    assert flushes == [(Dirty.CONTENT, {"a"})]
+
+def test_layer_edits_render_the_preview_once(app):
+    comp = Composition()
+    for index in range(3):
+        image = QImage(32, 32, QImage.Format.Format_ARGB32)
+        image.fill(QColor(index * 40, 0, 0))
+        comp.addLayer(Layer(f"layer{index}.png", image=image))
+    comp.scheduler.flush()
+    renders = []
+    render = comp.previewWindow.render
+    comp.previewWindow.render = lambda layers, changed=None: (renders.append(changed), render(layers, changed))
+    comp.selectLayer(comp.layers[0], False)
+    comp.layers[1].toggleVisibility()
+    comp.layers[2].setOpacity(0.5)
+    QTest.qWait(20)
+    assert renders == [set(comp.layers)]
@@ -0,0 +1,29 @@
+from PySide6.QtCore import QRectF
+
+from snapping import SnapIndex
+
+def test_snaps_nearest_edge_within_tolerance():
+    index = SnapIndex([QRectF(0, 0, 100, 100)])
+    dx, dy, guides_x, guides_y = index.snap(QRectF(103, 2, 50, 50), 8)
+    assert (dx, dy) == (-3, -2)
+    assert guides_x == [100]
+    assert guides_y == [0, 50]  # Top edge and the moved rect's bottom meet the other's center
+
+def test_closest_line_wins():
+    index = SnapIndex([QRectF(0, 0, 100, 100), QRectF(0, 0, 106, 100)])
+    dx, _, guides_x, _ = index.snap(QRectF(105, 200, 50, 50), 8)
+    assert dx == 1
+    assert guides_x == [106]
+
+def test_nothing_within_tolerance():
+    index = SnapIndex([QRectF(0, 0, 100, 100)])
+    assert index.snap(QRectF(120, 120, 10, 10), 8) == (0.0, 0.0, [], [])
+
+def test_canvas_bounds_are_snap_lines():
+    index = SnapIndex([], QRectF(0, 0, 400, 300))
+    dx, dy, guides_x, guides_y = index.snap(QRectF(390, 291, 5, 5), 8)
+    assert (dx, dy) == (5, 4)
+    assert (guides_x, guides_y) == ([400], [300])
+
+def test_nearest_in_empty_index():
+    assert SnapIndex.nearest([], 10) is None
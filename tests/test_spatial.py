@@ -0,0 +1,28 @@
+from PySide6.QtCore import QRectF
+
+from spatial import GridIndex
+
+def test_query_finds_items_in_the_cell():
+    index = GridIndex(cell_size=100)
+    index.update("a", QRectF(0, 0, 50, 50))
+    index.update("b", QRectF(150, 50, 100, 100))
+    assert index.query(10, 10) == {"a"}
+    assert index.query(160, 60) == {"b"}
+    assert index.query(260, 160) == {"b"}
+    assert index.query(110, 10) == {"b"}  # Cells hold candidates; exact bounds are the caller's test
+    assert index.query(500, 500) == set()
+
+def test_moved_and_removed_items_leave_their_cells():
+    index = GridIndex(cell_size=100)
+    index.update("a", QRectF(0, 0, 50, 50))
+    index.update("a", QRectF(300, 300, 50, 50))
+    assert index.query(10, 10) == set()
+    assert index.query(310, 310) == {"a"}
+    index.remove("a")
+    assert index.cells == {} and index.itemCells == {}
+
+def test_empty_rect_removes_item():
+    index = GridIndex(cell_size=100)
+    index.update("a", QRectF(0, 0, 50, 50))
+    index.update("a", QRectF())
+    assert index.query(10, 10) == set()
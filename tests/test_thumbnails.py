@@ -0,0 +1,101 @@
+import os
+
+from PySide6.QtGui import QColor, QImage
+from PySide6.QtCore import QEventLoop, QTimer
+
+from layers import Layer
+import thumbnails
+from thumbnails import ThumbnailCache
+
+def cachedThumbnails(cache_dir) -> list[str]:
+    return [name for name in os.listdir(cache_dir) if name.endswith(".png")] if os.path.exists(cache_dir) else []
+
+def waitForThumbnail(cache: ThumbnailCache, layer: Layer):
+    loop = QEventLoop()
+    cache.thumbnailReady.connect(loop.quit)
+    QTimer.singleShot(5000, loop.quit)
+    if cache.thumbnail(layer) is None:
+        loop.exec()
+    return cache.thumbnail(layer)
+
+def test_placeholder_is_never_cached(app, tmp_path):
+    path = str(tmp_path / "green.png")
+    green = QImage(40, 30, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    green.save(path)
+    placeholder = QImage(40, 30, QImage.Format.Format_ARGB32_Premultiplied)
+    placeholder.fill(QColor(128, 128, 128, 96))
+    layer = Layer(path, placeholder)
+    layer.loading = True
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    assert cache.thumbnail(layer) is None
+    assert not cache.pending  # Nothing is made while the import placeholder shows
+
+    layer.setImage(QImage(path), from_source=True)
+    thumbnail = waitForThumbnail(cache, layer)
+    assert thumbnail.toImage().pixelColor(5, 5).name() == "#00ff00"
+    cached = [QImage(str(tmp_path / "cache" / name)) for name in cachedThumbnails(tmp_path / "cache")]
+    assert [image.pixelColor(5, 5).name() for image in cached] == ["#00ff00"]
+
+def test_image_not_from_file_is_not_cached(app, tmp_path):
+    path = str(tmp_path / "green.png")
+    green = QImage(40, 30, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    green.save(path)
+    red = QImage(40, 30, QImage.Format.Format_ARGB32)
+    red.fill(QColor(255, 0, 0))
+    layer = Layer(path, red)
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    assert waitForThumbnail(cache, layer).toImage().pixelColor(5, 5).name() == "#ff0000"
+    assert cachedThumbnails(tmp_path / "cache") == []
+
+def test_cached_thumbnail_of_the_file_is_not_shown_for_other_pixels(app, tmp_path):
+    path = str(tmp_path / "green.png")
+    green = QImage(40, 30, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    green.save(path)
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    assert waitForThumbnail(cache, Layer(path)).toImage().pixelColor(5, 5).name() == "#00ff00"
+    assert len(cachedThumbnails(tmp_path / "cache")) == 1
+
+    red = QImage(40, 30, QImage.Format.Format_ARGB32)
+    red.fill(QColor(255, 0, 0))
+    assert waitForThumbnail(cache, Layer(path, red)).toImage().pixelColor(5, 5).name() == "#ff0000"
+
+def test_spilled_layer_uses_its_own_pixels(app, tmp_path):
+    path = str(tmp_path / "green.png")
+    green = QImage(40, 30, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    green.save(path)
+    red = QImage(40, 30, QImage.Format.Format_ARGB32)
+    red.fill(QColor(255, 0, 0))
+    layer = Layer(path, red)
+    layer.evictImage()
+    os.remove(path)  # Like the source file of a project layer that has since gone
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    assert waitForThumbnail(cache, layer).toImage().pixelColor(5, 5).name() == "#ff0000"
+    assert layer.cachedImage is None  # Not made resident for its thumbnail
+
+def test_unchanged_files_are_not_hashed_again(app, tmp_path, monkeypatch):
+    path = str(tmp_path / "green.png")
+    green = QImage(40, 30, QImage.Format.Format_ARGB32)
+    green.fill(QColor(0, 255, 0))
+    green.save(path)
+    hashed = []
+    monkeypatch.setattr(thumbnails, "fileDigest", lambda path, digest=thumbnails.fileDigest: hashed.append(path) or digest(path))
+    waitForThumbnail(ThumbnailCache(str(tmp_path / "cache")), Layer(path))
+    assert len(hashed) == 1
+
+    # A new session finds the hash and the thumbnail on disk
+    thumbnail = waitForThumbnail(ThumbnailCache(str(tmp_path / "cache")), Layer(path))
+    assert thumbnail.toImage().pixelColor(5, 5).name() == "#00ff00"
+    assert len(hashed) == 1
+
+    red = QImage(40, 30, QImage.Format.Format_ARGB32)
+    red.fill(QColor(255, 0, 0))
+    red.save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # Changed within the mtime resolution too
+    thumbnail = waitForThumbnail(ThumbnailCache(str(tmp_path / "cache")), Layer(path))
+    assert thumbnail.toImage().pixelColor(5, 5).name() == "#ff0000"
+    assert len(hashed) == 2
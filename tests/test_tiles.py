@@ -0,0 +1,94 @@
+from PySide6.QtGui import QColor, QImage
+from PySide6.QtCore import QRect, QRectF
+
+from adjustments import Adjustment
+from composition import Composition
+from layers import Layer
+from preview import TiledLayerItem
+from resampler import resampler
+from scheduler import Dirty
+from tiles import TILE_SIZE, tileGrid
+
+def test_grid_clips_edge_tiles_to_the_image():
+    tiles = tileGrid(2500, 1100, 0, QRect(0, 0, 2500, 1100))
+    assert [(col, row) for col, row, _ in tiles] == [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1)]
+    assert tiles[2][2] == QRect(2048, 0, 452, 1024)
+    assert tiles[5][2] == QRect(2048, 1024, 452, 76)
+
+def test_grid_of_exact_multiples_has_no_sliver_tiles():
+    tiles = tileGrid(2 * TILE_SIZE, TILE_SIZE, 0, QRect(0, 0, 2 * TILE_SIZE, TILE_SIZE))
+    assert [rect for _, _, rect in tiles] == [QRect(0, 0, TILE_SIZE, TILE_SIZE), QRect(TILE_SIZE, 0, TILE_SIZE, TILE_SIZE)]
+    # A rect ending right at a tile boundary does not reach into the next tile
+    assert [(col, row) for col, row, _ in tileGrid(4 * TILE_SIZE, TILE_SIZE, 0, QRect(0, 0, TILE_SIZE, 10))] == [(0, 0)]
+
+def test_grid_at_a_reduced_level_covers_more_pixels_per_tile():
+    tiles = tileGrid(5000, 100, 1, QRect(2100, 0, 10, 10))
+    assert [(col, row, rect) for col, row, rect in tiles] == [(1, 0, QRect(2 * TILE_SIZE, 0, 2 * TILE_SIZE, 100))]
+    assert tileGrid(5000, 100, 0, QRect(6000, 0, 10, 10)) == []
+
+def tiledItem(app) -> tuple[Composition, TiledLayerItem]:
+    image = QImage(9000, 100, QImage.Format.Format_ARGB32)
+    image.fill(QColor(200, 0, 0))
+    layer = Layer("wide.png", image)
+    comp = Composition()
+    comp.addLayer(layer)
+    comp.scheduler.flush()
+    comp.previewWindow.tileTimer.stop()  # The tests pick the visible area themselves
+    return comp, comp.previewWindow.layerItems[layer]
+
+def finishDecodes(app):
+    resampler.pool.waitForDone()
+    app.processEvents()
+
+def test_tiles_are_decoded_off_the_gui_thread_behind_placeholders(app):
+    comp, item = tiledItem(app)
+    item.updateTiles(QRectF(0, 0, 500, 100), 1.0)
+    assert list(item.tiles) == [(0, 0, 0)]
+    tile = item.tiles[(0, 0, 0)][0]
+    assert tile.pixmap().size().width() == 1  # The placeholder, until the decode comes back
+    assert tile.sceneBoundingRect() == QRectF(0, 0, TILE_SIZE, 100)
+    finishDecodes(app)
+    assert tile.pixmap().size().width() == TILE_SIZE
+    assert tile.pixmap().toImage().pixelColor(10, 10) == QColor(200, 0, 0)
+    assert tile.sceneBoundingRect() == QRectF(0, 0, TILE_SIZE, 100)
+
+def test_tiles_leaving_the_viewport_are_dropped(app):
+    comp, item = tiledItem(app)
+    scene = item.scene()
+    item.updateTiles(QRectF(0, 0, 1500, 100), 1.0)
+    assert sorted(item.tiles) == [(0, 0, 0), (0, 1, 0)]
+    old_tiles = [tile for tile, _ in item.tiles.values()]
+    item.updateTiles(QRectF(4200, 0, 500, 100), 1.0)
+    assert sorted(item.tiles) == [(0, 4, 0)]
+    assert all(tile.scene() is None for tile in old_tiles)
+    assert not any(slot[0] is item and slot[1] != (0, 4, 0) for slot in resampler.pending)
+    finishDecodes(app)
+    assert [tile.scene() for tile, _ in item.tiles.values()] == [scene]
+    assert item.tiles[(0, 4, 0)][0].pixmap().width() == TILE_SIZE
+
+def test_decodes_of_stale_pixels_are_not_shown(app):
+    comp, item = tiledItem(app)
+    layer = item.layer
+    item.updateTiles(QRectF(0, 0, 500, 100), 1.0)
+    replacement = QImage(9000, 100, QImage.Format.Format_ARGB32)
+    replacement.fill(QColor(0, 0, 200))
+    layer.setImage(replacement)
+    comp.scheduler.markDirty(Dirty.CONTENT, (layer,))
+    comp.scheduler.flush()
+    comp.previewWindow.tileTimer.stop()
+    item.updateTiles(QRectF(0, 0, 500, 100), 1.0)
+    finishDecodes(app)
+    assert item.tiles[(0, 0, 0)][0].pixmap().toImage().pixelColor(10, 10) == QColor(0, 0, 200)
+
+def test_tiles_keep_their_pixels_while_adjustments_are_evaluated(app):
+    comp, item = tiledItem(app)
+    layer = item.layer
+    item.updateTiles(QRectF(0, 0, 500, 100), 1.0)
+    finishDecodes(app)
+    layer.setAdjustments([Adjustment("brightness_contrast", {"brightness": 50})])
+    comp.scheduler.flush()
+    tile = item.tiles[(0, 0, 0)][0]
+    assert tile.pixmap().toImage().pixelColor(10, 10) == QColor(200, 0, 0)  # Not a placeholder
+    finishDecodes(app)
+    assert item.tiles[(0, 0, 0)][0] is tile
+    assert tile.pixmap().toImage().pixelColor(10, 10).red() > 200
@@ -0,0 +1,39 @@
+import pytest
+from PIL import Image
+
+from pngwriter import PngWriter
+from tiffwriter import TiffWriter
+
+def rgbaPixels(width: int, height: int) -> bytes:
+    """A pattern that differs in every channel of every pixel"""
+    return bytes((x * 7 + y * 13 + channel * 61) % 256 for y in range(height) for x in range(width) for channel in range(4))
+
+@pytest.mark.parametrize("compress_level", [0, 6])
+def test_png_reads_back(tmp_path, compress_level):
+    width, height = 300, 90  # More than one IDAT chunk when uncompressed
+    pixels = rgbaPixels(width, height)
+    path = str(tmp_path / "out.png")
+    writer = PngWriter(path, width, height, compress_level)
+    for y in range(height):
+        writer.writeRow(pixels[y * width * 4:(y + 1) * width * 4])
+    writer.close()
+    with Image.open(path) as image:
+        assert image.mode == "RGBA" and image.size == (width, height)
+        assert image.tobytes() == pixels
+
+@pytest.mark.parametrize("compress_level", [0, 6])
+@pytest.mark.parametrize("width, height", [(40, 35), (10, 10)])  # Padded edge tiles; a single tile
+def test_tiff_reads_back(tmp_path, compress_level, width, height):
+    tile_size = 16
+    pixels = rgbaPixels(width, height)
+    path = str(tmp_path / "out.tif")
+    writer = TiffWriter(path, width, height, tile_size, compress_level)
+    for top in range(0, height, tile_size):
+        rows = min(tile_size, height - top)
+        writer.writeTileRow(pixels[top * width * 4:(top + rows) * width * 4], width * 4, rows)
+    writer.close()
+    with open(path, "rb") as file:
+        assert file.read(4) == b"II\x2b\x00"  # BigTIFF
+    with Image.open(path) as image:
+        assert image.mode == "RGBA" and image.size == (width, height)
+        assert image.tobytes() == pixels
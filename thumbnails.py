@@ -0,0 +1,219 @@
+"""Layer thumbnails for the Layers panel, made off the GUI thread and cached on disk
+
+A thumbnail comes from the first of: the disk cache, the EXIF thumbnail embedded in the file,
+the layer's already decoded image, or a reduced decode of the file. Cache entries are named
+after a hash of the file's contents and its mtime, so they survive renames and moves and are
+never shown for a file that changed. The hashes are remembered by path, size and mtime, so
+a file is only read again once it changed. Layers whose pixels did not come from their file
+as it is now (edited images, project layers) are reduced from their own pixels instead, and
+neither read nor write the cache.
+"""
+from PySide6.QtGui import QImage, QImageReader, QPixmap
+from PySide6.QtCore import QObject, QRunnable, QStandardPaths, QThreadPool, Qt, Signal
+import hashlib
+import json
+import os
+import threading
+
+from workers import WorkerSignals
+
+CACHE_VERSION = 2  # Part of every cache file name; bumped to ignore entries older versions wrote
+HASH_INDEX_SIZE = 4096  # Files whose content hashes are remembered, most recently hashed kept
+THUMBNAIL_SIZE = 64  # Longest side in pixels, enough for the row icon on high-DPI screens
+EXIF_THUMBNAIL_OFFSET = 0x0201  # JPEGInterchangeFormat in IFD1
+EXIF_THUMBNAIL_LENGTH = 0x0202  # JPEGInterchangeFormatLength
+
+def defaultCacheDir() -> str:
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation),
+                        "photo-editor", "thumbnails")
+
+def fileDigest(path: str) -> str | None:
+    """Hash of the file's contents, or None if it cannot be read"""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+class HashIndex():
+    """Content hashes of files by path, size and mtime, stored next to the cached thumbnails
+
+    Shared by the thumbnail tasks of one cache, so it is locked; the file is loaded on first
+    use and rewritten whenever a file had to be hashed.
+    """
+    def __init__(self, cache_dir: str):
+        self.path = os.path.join(cache_dir, "hashes.json")
+        self.lock = threading.Lock()
+        self.entries: dict[str, list] | None = None  # path -> [size, mtime_ns, digest], oldest first
+
+    def load(self) -> dict[str, list]:
+        if self.entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = dict(json.load(f))
+            except (OSError, ValueError, TypeError):
+                self.entries = {}
+        return self.entries
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            pass  # Files are just hashed again next time
+
+    def contentKey(self, path: str) -> str | None:
+        """Cache key from the file's content hash and mtime, or None if it cannot be read"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        path = os.path.abspath(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            entry = self.load().get(path)
+        if entry is not None and entry[:2] == stamp:
+            digest = entry[2]
+        else:
+            digest = fileDigest(path)
+            if digest is None:
+                return None
+            try:
+                after = os.stat(path)
+            except OSError:
+                after = None
+            # A file that changed while it was hashed may have been hashed half old, half new
+            if after is not None and [after.st_size, after.st_mtime_ns] == stamp:
+                with self.lock:
+                    entries = self.load()
+                    entries.pop(path, None)
+                    entries[path] = stamp + [digest]
+                    while len(entries) > HASH_INDEX_SIZE:
+                        del entries[next(iter(entries))]
+                    self.save()
+        return f"v{CACHE_VERSION}-{digest}-{stat.st_mtime_ns}"
+
+def exifThumbnail(path: str) -> QImage | None:
+    """The JPEG thumbnail cameras embed in a file's EXIF data, without decoding the image"""
+    from PIL import ExifTags, Image
+    try:
+        with Image.open(path) as image:
+            raw = image.info.get("exif")
+            ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    offset, length = ifd1.get(EXIF_THUMBNAIL_OFFSET), ifd1.get(EXIF_THUMBNAIL_LENGTH)
+    if not raw or offset is None or not length:
+        return None
+    if raw.startswith(b"Exif\x00\x00"):
+        raw = raw[6:]  # Offsets count from the TIFF header that follows
+    thumbnail = QImage.fromData(raw[offset:offset + length])
+    return None if thumbnail.isNull() else thumbnail
+
+def reducedImage(image: QImage) -> QImage:
+    return image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+class ThumbnailTask(QRunnable):
+    """Finds or makes the thumbnail of one layer on a pool thread"""
+    def __init__(self, layer, request: int, path: str, image: QImage | None, image_from_file: bool, cache_dir: str, hashes: HashIndex, signals: WorkerSignals):
+        super().__init__()
+        self.layer = layer
+        self.request = request
+        self.path = path
+        self.image = image  # The layer's decoded or mapped image, if it has one
+        self.imageFromFile = image_from_file  # Whether the layer shows the pixels of the file as it is now
+        self.cacheDir = cache_dir
+        self.hashes = hashes
+        self.signals = signals
+
+    def run(self):
+        if not self.imageFromFile:
+            # Neither the file nor anything cached for it shows these pixels
+            thumbnail = reducedImage(self.image) if self.image is not None and not self.image.isNull() else QImage()
+            self.signals.finished.emit((self.layer, self.request, thumbnail))
+            return
+        key = self.hashes.contentKey(self.path)
+        cache_path = os.path.join(self.cacheDir, key + ".png") if key is not None else None
+        if cache_path is not None and os.path.exists(cache_path):
+            thumbnail = QImage(cache_path)
+            if not thumbnail.isNull():
+                self.signals.finished.emit((self.layer, self.request, thumbnail))
+                return
+        thumbnail = exifThumbnail(self.path) if key is not None else None
+        if thumbnail is None:
+            thumbnail = self.image
+        if thumbnail is None and key is not None:
+            reader = QImageReader(self.path)
+            size = reader.size()
+            if size.isValid():
+                reader.setScaledSize(size.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio))
+            thumbnail = reader.read()
+        if thumbnail is None or thumbnail.isNull():
+            self.signals.finished.emit((self.layer, self.request, QImage()))
+            return
+        thumbnail = reducedImage(thumbnail)
+        if cache_path is not None:
+            try:
+                os.makedirs(self.cacheDir, exist_ok=True)
+                # Written under a temporary name so other instances never read a partial file
+                temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+                if thumbnail.save(temporary_path, "PNG"):
+                    os.replace(temporary_path, cache_path)
+            except OSError:
+                pass  # Without a cache the thumbnail is just made again next time
+        self.signals.finished.emit((self.layer, self.request, thumbnail))
+
+class ThumbnailCache(QObject):
+    """Thumbnails of layers, requested as their rows are painted
+
+    thumbnail() returns at once: either the thumbnail, or None after queueing a task that
+    makes it, in which case thumbnailReady is emitted for the layer when it is done. Layers
+    still showing an import placeholder get no thumbnail until their image is decoded.
+    """
+    thumbnailReady = Signal(object)  # layer
+
+    def __init__(self, cache_dir: str | None = None):
+        super().__init__()
+        self.cacheDir = cache_dir if cache_dir is not None else defaultCacheDir()
+        self.hashes = HashIndex(self.cacheDir)
+        self.pool = QThreadPool(self)
+        self.signals = WorkerSignals()
+        self.signals.finished.connect(self.onMade)
+        self.thumbnails: dict[object, QPixmap | None] = {}  # layer -> thumbnail, None if it has none
+        self.pending: dict[object, int] = {}  # layer -> newest request
+        self.requests = 0
+
+    def thumbnail(self, layer) -> QPixmap | None:
+        if layer in self.thumbnails:
+            return self.thumbnails[layer]
+        if layer not in self.pending and not layer.loading:
+            self.requests += 1
+            self.pending[layer] = self.requests
+            # The decoded image is only used if the layer already has one; it is never decoded for this
+            image_from_file = layer.sourceStamp is not None and layer.sourceStamp == layer.fileStamp()
+            image = layer.cachedImage
+            if image is None and not image_from_file and layer.spill is not None:
+                image = layer.spill.image()  # Evicted pixels are paged in as the task reduces them
+            self.pool.start(ThumbnailTask(layer, self.requests, layer.path, image, image_from_file, self.cacheDir, self.hashes, self.signals))
+        return None
+
+    def forget(self, layer):
+        """Drop a layer's thumbnail, e.g. when its image changes or it leaves the composition"""
+        self.thumbnails.pop(layer, None)
+        self.pending.pop(layer, None)
+
+    def onMade(self, result: tuple[object, int, QImage]):
+        layer, request, thumbnail = result  # The thumbnail is null if none could be made
+        if self.pending.get(layer) != request:
+            return  # Forgotten while the task ran
+        del self.pending[layer]
+        self.thumbnails[layer] = QPixmap.fromImage(thumbnail) if not thumbnail.isNull() else None
+        self.thumbnailReady.emit(layer)
+
+thumbnailCache = ThumbnailCache()
@@ -0,0 +1,84 @@
+import struct
+import zlib
+
+# TIFF field types
+SHORT = 3
+LONG = 4
+LONG8 = 16
+
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = 8
+
+class TiffWriter():
+    """Writes an 8-bit RGBA BigTIFF in square tiles, one row of tiles at a time
+
+    Like PngWriter, the whole image never has to be in memory. BigTIFF uses 64-bit offsets,
+    so the file can grow past 4 GB, and tiles let readers decode just the part they show.
+    """
+    def __init__(self, path: str, width: int, height: int, tile_size: int = 512, compress_level: int = 6):
+        self.width = width
+        self.height = height
+        self.tileSize = tile_size
+        self.compressLevel = compress_level  # 0 stores the tiles uncompressed
+        self.rowsWritten = 0
+        self.offsets: list[int] = []
+        self.byteCounts: list[int] = []
+        self.file = open(path, "wb")
+        # Little-endian BigTIFF header; the offset of the directory is filled in by close()
+        self.file.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, 0))
+
+    def writeTileRow(self, rows: bytes, bytes_per_line: int, row_count: int):
+        """Append the next tile_size scanlines (fewer for the last row of tiles) of width * 4 RGBA bytes"""
+        tile_size = self.tileSize
+        tile_bytes = tile_size * 4
+        for x in range(0, self.width, tile_size):
+            start = x * 4
+            end = min(self.width, x + tile_size) * 4
+            tile = bytearray(tile_size * tile_bytes)  # Edge tiles are padded to full size
+            for y in range(row_count):
+                line = rows[y * bytes_per_line + start:y * bytes_per_line + end]
+                tile[y * tile_bytes:y * tile_bytes + len(line)] = line
+            data = zlib.compress(tile, self.compressLevel) if self.compressLevel else bytes(tile)
+            self.offsets.append(self.file.tell())
+            self.byteCounts.append(len(data))
+            self.file.write(data)
+        self.rowsWritten += row_count
+
+    def writeArray(self, values: list[int]) -> int:
+        offset = self.file.tell()
+        self.file.write(struct.pack(f"<{len(values)}Q", *values))
+        return offset
+
+    def close(self):
+        if self.file.closed:
+            return
+        if len(self.offsets) == 1:
+            offsets, byte_counts = self.offsets[0], self.byteCounts[0]  # Fit in the entries themselves
+        else:
+            offsets, byte_counts = self.writeArray(self.offsets), self.writeArray(self.byteCounts)
+        entries = [
+            (256, LONG, 1, struct.pack("<I", self.width)),  # ImageWidth
+            (257, LONG, 1, struct.pack("<I", self.height)),  # ImageLength
+            (258, SHORT, 4, struct.pack("<4H", 8, 8, 8, 8)),  # BitsPerSample
+            (259, SHORT, 1, struct.pack("<H", COMPRESSION_DEFLATE if self.compressLevel else COMPRESSION_NONE)),
+            (262, SHORT, 1, struct.pack("<H", 2)),  # PhotometricInterpretation: RGB
+            (277, SHORT, 1, struct.pack("<H", 4)),  # SamplesPerPixel
+            (284, SHORT, 1, struct.pack("<H", 1)),  # PlanarConfiguration: interleaved
+            (322, LONG, 1, struct.pack("<I", self.tileSize)),  # TileWidth
+            (323, LONG, 1, struct.pack("<I", self.tileSize)),  # TileLength
+            (324, LONG8, len(self.offsets), struct.pack("<Q", offsets)),  # TileOffsets
+            (325, LONG8, len(self.byteCounts), struct.pack("<Q", byte_counts)),  # TileByteCounts
+            (338, SHORT, 1, struct.pack("<H", 2)),  # ExtraSamples: unassociated alpha
+        ]
+        directory = self.file.tell()
+        self.file.write(struct.pack("<Q", len(entries)))
+        for tag, field_type, count, value in entries:
+            self.file.write(struct.pack("<HHQ", tag, field_type, count) + value.ljust(8, b"\0"))
+        self.file.write(struct.pack("<Q", 0))  # No further directories
+        self.file.seek(8)
+        self.file.write(struct.pack("<Q", directory))
+        self.file.close()
+
+    def abort(self):
+        """Close without finishing the image, e.g. after a failed or cancelled export"""
+        self.file.close()
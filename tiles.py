@@ -0,0 +1,38 @@
+from PySide6.QtGui import QImage, QImageReader
+from PySide6.QtCore import QRect, QSize
+
+TILE_SIZE = 1024  # Edge of a preview tile in pixels of its (reduced) level
+TILED_LAYER_MIN_SIZE = 8192  # Layers wider or taller than this are shown as tiles
+
+def needsTiling(size: QSize) -> bool:
+    return size.width() > TILED_LAYER_MIN_SIZE or size.height() > TILED_LAYER_MIN_SIZE
+
+def tileGrid(width: int, height: int, level: int, rect: QRect) -> list[tuple[int, int, QRect]]:
+    """(column, row, image rect) of the tiles at a level that overlap rect, all in image coordinates
+
+    A tile at level n covers TILE_SIZE << n image pixels per edge and is shown at TILE_SIZE
+    pixels, so the number of tiles on screen stays about the same at every zoom.
+    """
+    span = TILE_SIZE << level
+    rect = rect.intersected(QRect(0, 0, width, height))
+    if rect.isEmpty():
+        return []
+    tiles = []
+    for row in range(rect.top() // span, rect.bottom() // span + 1):
+        for col in range(rect.left() // span, rect.right() // span + 1):
+            x, y = col * span, row * span
+            tiles.append((col, row, QRect(x, y, min(span, width - x), min(span, height - y))))
+    return tiles
+
+def readImageRegion(path: str, rect: QRect, size: QSize) -> QImage:
+    """Decode only rect of the image file, scaled to size
+
+    Safe to call from worker threads. Formats without clip support in their Qt plugin are
+    decoded whole by QImageReader, so callers only use this for files where
+    QImageIOHandler.ImageOption.ClipRect is supported (JPEG).
+    """
+    reader = QImageReader(path)
+    reader.setClipRect(rect)
+    if size != rect.size():
+        reader.setScaledSize(size)
+    return reader.read()
@@ -0,0 +1,11 @@
+from PySide6.QtCore import QObject, Signal
+
+class WorkerSignals(QObject):
+    """How QRunnable tasks report back to the object that started them
+
+    QRunnable is not a QObject, so tasks emit through one of these instead. It is created on
+    the GUI thread and lives there, which makes emissions from pool threads queued: the
+    connected slots run on the GUI thread, where they can touch layers and widgets.
+    """
+    finished = Signal(object)  # The task's result; a tuple when it has several parts
+    progress = Signal(int, int)  # done, total